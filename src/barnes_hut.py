@@ -0,0 +1,328 @@
+"""
+@file barnes_hut.py
+@brief Solveur gravitationnel de Barnes-Hut (arbre quaternaire) pour les grandes populations.
+
+Ce fichier contient la classe BarnesHutSolver, utilisable à la place de DirectSolver
+dans un NBodySystem. L'arbre est construit niveau par niveau à partir des clés de Morton
+des corps triés, et parcouru en parallèle pour un bloc de corps cibles à la fois :
+chaque itération traite toutes les paires (cible, nœud) en cours avec NumPy.
+
+Un nœud est remplacé par son centre de masse lorsque taille / distance < theta
+et que la cible n'est pas contenue dans le nœud. Les corps de masse nulle
+(particules tests) subissent la gravité mais ne sont pas insérés dans l'arbre.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import time
+
+import numpy as np
+
+from nbody import G
+
+MAX_DEPTH = 30  # 2 x 30 bits par clé de Morton, dans un entier 64 bits
+
+
+def _spread_bits(v):
+    """
+    @brief Intercale un bit nul entre chaque bit d'un entier (32 bits utiles).
+
+    @param v: Tableau d'entiers uint64.
+    @return: Tableau uint64 dont les bits de v occupent les positions paires.
+    """
+    v = v & np.uint64(0xFFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def _expand(starts, counts):
+    """
+    @brief Développe des intervalles [start, start + count) en une liste d'indices.
+
+    @param starts: Début de chaque intervalle.
+    @param counts: Longueur de chaque intervalle.
+    @return: (numéro de l'intervalle, indice) pour chaque élément produit.
+    """
+    owner = np.repeat(np.arange(len(counts)), counts)
+    offsets = np.arange(len(owner)) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(starts, counts) + offsets
+
+
+class QuadTree:
+    """
+    @class QuadTree
+    @brief Arbre quaternaire linéaire construit à partir des clés de Morton.
+
+    Les nœuds d'un même niveau sont contigus et triés par clé, si bien que
+    les enfants d'un nœud forment un intervalle [child_first, child_first + n_children).
+
+    @param positions Positions des corps sources, tableau (N, 2).
+    @param masses Masses des corps sources, tableau (N,).
+    @param leaf_size Nombre maximal de corps dans une feuille.
+    """
+    def __init__(self, positions, masses, leaf_size=8):
+        self.leaf_size = leaf_size
+        lo = positions.min(axis=0)
+        hi = positions.max(axis=0)
+        self.side = max(float((hi - lo).max()), 1.0) * (1 + 1e-9)
+        self.origin = lo
+        self.depth = MAX_DEPTH
+
+        keys = self.keys(positions)[0]
+        self.order = np.argsort(keys, kind="stable")
+        self.keys_sorted = keys[self.order]
+        self.positions = positions[self.order]
+        self.masses = masses[self.order]
+        self._build()
+
+    def keys(self, positions):
+        """
+        @brief Calcule les clés de Morton de positions quelconques.
+
+        @param positions: Tableau (N, 2) de positions.
+        @return: (clés uint64, masque des positions situées dans la boîte racine).
+        """
+        cells = 1 << self.depth
+        scaled = (positions - self.origin) / self.side * cells
+        inside = np.all((scaled >= 0) & (scaled < cells), axis=1)
+        ij = np.clip(scaled, 0, cells - 1).astype(np.uint64)
+        keys = _spread_bits(ij[:, 0]) | (_spread_bits(ij[:, 1]) << np.uint64(1))
+        return keys, inside
+
+    def _build(self):
+        """
+        @brief Construit les nœuds niveau par niveau jusqu'à ce que tous soient des feuilles.
+        """
+        n = len(self.masses)
+        weighted = self.positions * self.masses[:, np.newaxis]
+        levels = []
+        active = np.arange(n)  # corps appartenant à des nœuds à subdiviser
+        level = 0
+        while len(active):
+            shift = np.uint64(2 * (self.depth - level))
+            prefix = self.keys_sorted[active] >> shift
+            first = np.flatnonzero(np.concatenate(([True], prefix[1:] != prefix[:-1])))
+            starts = active[first]
+            counts = np.diff(np.append(first, len(active)))
+            mass = np.add.reduceat(self.masses[active], first)
+            com = np.add.reduceat(weighted[active], first) / mass[:, np.newaxis]
+            split = (counts > self.leaf_size) & (level < self.depth)
+            levels.append((prefix[first], starts, counts, mass, com, split))
+            active = _expand(starts[split], counts[split])[1]
+            level += 1
+
+        sizes = [len(lv[0]) for lv in levels]
+        offsets = np.concatenate(([0], np.cumsum(sizes)))
+        self.level = np.repeat(np.arange(len(levels)), sizes)
+        self.prefix = np.concatenate([lv[0] for lv in levels])
+        self.start = np.concatenate([lv[1] for lv in levels])
+        self.count = np.concatenate([lv[2] for lv in levels])
+        self.mass = np.concatenate([lv[3] for lv in levels])
+        self.com = np.concatenate([lv[4] for lv in levels])
+        self.size = self.side / (2.0 ** self.level)
+        self.child_first = np.zeros(len(self.prefix), dtype=np.int64)
+        self.n_children = np.zeros(len(self.prefix), dtype=np.int64)
+
+        for lv in range(len(levels) - 1):
+            split = levels[lv][5]
+            parents = levels[lv][0][split]
+            child_parent = levels[lv + 1][0] >> np.uint64(2)
+            left = np.searchsorted(child_parent, parents, side="left")
+            right = np.searchsorted(child_parent, parents, side="right")
+            ids = offsets[lv] + np.flatnonzero(split)
+            self.child_first[ids] = offsets[lv + 1] + left
+            self.n_children[ids] = right - left
+
+    def __len__(self):
+        return len(self.prefix)
+
+
+class BarnesHutSolver:
+    """
+    @class BarnesHutSolver
+    @brief Calcul approché des accélérations en O(N log N) par l'algorithme de Barnes-Hut.
+
+    @param theta Angle d'ouverture : plus il est petit, plus le résultat est précis et lent
+    (0 redonne la sommation directe).
+    @param leaf_size Nombre maximal de corps dans une feuille de l'arbre.
+    @param chunk_size Nombre de corps cibles traités ensemble (borne la mémoire utilisée).
+    """
+    def __init__(self, theta=0.5, leaf_size=8, chunk_size=4096):
+        self.theta = theta
+        self.leaf_size = leaf_size
+        self.chunk_size = chunk_size
+        self.tree = None
+        self.interactions = 0  # Nombre de paires (cible, nœud ou corps) évaluées au dernier appel
+
+    def __getstate__(self):
+        """
+        @brief État enregistré par pickle (points de contrôle) : les réglages seuls, sans l'arbre du dernier appel.
+        """
+        return dict(self.__dict__, tree=None, interactions=0)
+
+    def accelerations(self, positions, masses, softening, out, targets=None):
+        """
+        @brief Calcule les accélérations avec l'arbre quaternaire.
+
+        @param positions: Positions en mètres, tableau (N, 2).
+        @param masses: Masses en kilogrammes, tableau (N,).
+        @param softening: Longueur d'adoucissement en mètres.
+        @param out: Tableau (N, 2) qui reçoit les accélérations en m/s².
+        @param targets: Indices des corps dont on veut l'accélération (tous par défaut) ;
+        les autres lignes de out ne sont pas modifiées.
+        @return: Le tableau out.
+        """
+        if targets is None:
+            targets = np.arange(len(masses))
+        out[targets] = 0.0
+        self.interactions = 0
+        sources = np.flatnonzero(masses > 0)
+        if len(sources) == 0:
+            return out
+        self.tree = QuadTree(positions[sources], masses[sources], self.leaf_size)
+        source_ids = sources[self.tree.order]
+
+        # Les cibles sont parcourues dans l'ordre de Morton : un bloc reste compact dans l'espace
+        target_keys, target_inside = self.tree.keys(positions[targets])
+        ordered = np.argsort(target_keys, kind="stable")
+        for begin in range(0, len(ordered), self.chunk_size):
+            local = ordered[begin:begin + self.chunk_size]
+            block = targets[local]
+            out[block] = self._walk(positions[block], target_keys[local], target_inside[local],
+                                    block, source_ids, softening)
+        return out
+
+    def _walk(self, points, keys, inside_root, ids, source_ids, softening):
+        """
+        @brief Parcourt l'arbre pour un bloc de cibles.
+
+        @param points: Positions des cibles, tableau (B, 2).
+        @param keys: Clés de Morton des cibles.
+        @param inside_root: Masque des cibles situées dans la boîte racine.
+        @param ids: Indices globaux des cibles (pour exclure l'auto-interaction).
+        @param source_ids: Indice global de chaque corps de l'arbre, dans l'ordre de l'arbre.
+        @param softening: Longueur d'adoucissement en mètres.
+        @return: Tableau (B, 2) des accélérations.
+        """
+        tree = self.tree
+        b = len(points)
+        acc_x = np.zeros(b)
+        acc_y = np.zeros(b)
+        eps2 = softening ** 2
+        theta2 = self.theta ** 2
+
+        def accumulate(t, dx, dy, m):
+            r2 = dx * dx + dy * dy + eps2
+            f = G * m / (r2 * np.sqrt(r2))
+            acc_x[:] += np.bincount(t, weights=f * dx, minlength=b)
+            acc_y[:] += np.bincount(t, weights=f * dy, minlength=b)
+
+        t = np.arange(b)
+        node = np.zeros(b, dtype=np.int64)
+        while len(t):
+            self.interactions += len(t)
+            d = tree.com[node] - points[t]
+            r2 = d[:, 0] ** 2 + d[:, 1] ** 2
+            shift = (2 * (tree.depth - tree.level[node])).astype(np.uint64)
+            contains = inside_root[t] & ((keys[t] >> shift) == tree.prefix[node])
+            accept = ~contains & (tree.size[node] ** 2 < theta2 * r2)
+            accumulate(t[accept], d[accept, 0], d[accept, 1], tree.mass[node[accept]])
+
+            opened = ~accept
+            leaf = opened & (tree.n_children[node] == 0)
+            if leaf.any():
+                owner, j = _expand(tree.start[node[leaf]], tree.count[node[leaf]])
+                tj = t[leaf][owner]
+                keep = source_ids[j] != ids[tj]
+                tj, j = tj[keep], j[keep]
+                dj = tree.positions[j] - points[tj]
+                self.interactions += len(j)
+                accumulate(tj, dj[:, 0], dj[:, 1], tree.masses[j])
+
+            inner = opened & ~leaf
+            owner, node = _expand(tree.child_first[node[inner]], tree.n_children[node[inner]])
+            t = t[inner][owner]
+        return np.column_stack((acc_x, acc_y))
+
+
+def accuracy_report(n=20000, thetas=(0.3, 0.5, 0.7, 1.0), n_check=1000, seed=0):
+    """
+    @brief Compare précision et vitesse de Barnes-Hut au calcul exact en O(N²).
+
+    Les corps forment un disque auto-gravitant (type ceinture d'astéroïdes) autour d'une
+    étoile centrale. Le calcul exact est fait sur n_check cibles tirées au hasard, et son
+    temps pour N cibles est extrapolé linéairement.
+
+    @param n: Nombre de corps.
+    @param thetas: Angles d'ouverture à tester.
+    @param n_check: Nombre de cibles utilisées pour mesurer l'erreur.
+    @param seed: Graine du générateur aléatoire.
+    @return: Liste de dictionnaires (theta, temps, gain, erreurs relatives médiane, p99 et max).
+    """
+    rng = np.random.default_rng(seed)
+    r = rng.uniform(2.0e11, 5.0e11, n)
+    angle = rng.uniform(0, 2 * np.pi, n)
+    positions = np.column_stack((r * np.cos(angle), r * np.sin(angle)))
+    masses = rng.uniform(1e15, 1e21, n)
+    positions[0] = 0.0
+    masses[0] = 1.989e30
+    softening = 1e6
+
+    check = rng.choice(n, n_check, replace=False)
+    exact = np.zeros((n_check, 2))
+    start = time.perf_counter()
+    for k in range(0, n_check, 100):
+        rows = check[k:k + 100]
+        dx = positions[np.newaxis, :, 0] - positions[rows, np.newaxis, 0]
+        dy = positions[np.newaxis, :, 1] - positions[rows, np.newaxis, 1]
+        r2 = dx * dx + dy * dy + softening ** 2
+        f = G * masses / (r2 * np.sqrt(r2))
+        f[np.arange(len(rows)), rows] = 0.0
+        exact[k:k + 100, 0] = (f * dx).sum(axis=1)
+        exact[k:k + 100, 1] = (f * dy).sum(axis=1)
+    direct_time = (time.perf_counter() - start) * n / n_check
+
+    # Contribution des autres astéroïdes seule : l'étoile centrale masquerait l'erreur
+    star = positions[0] - positions[check]
+    star_r2 = (star ** 2).sum(axis=1) + softening ** 2
+    star_acc = G * masses[0] * star / (star_r2 * np.sqrt(star_r2))[:, np.newaxis]
+    star_acc[check == 0] = 0.0
+    belt_exact = exact - star_acc
+
+    results = []
+    out = np.zeros((n, 2))
+    for theta in thetas:
+        solver = BarnesHutSolver(theta=theta)
+        start = time.perf_counter()
+        solver.accelerations(positions, masses, softening, out)
+        bh_time = time.perf_counter() - start
+        err = np.linalg.norm(out[check] - exact, axis=1) / np.linalg.norm(belt_exact, axis=1)
+        results.append({
+            "theta": theta,
+            "time": bh_time,
+            "direct_time": direct_time,
+            "speedup": direct_time / bh_time,
+            "median_error": float(np.median(err)),
+            "p99_error": float(np.percentile(err, 99)),
+            "max_error": float(err.max()),
+            "interactions_per_body": solver.interactions / n,
+        })
+    return results
+
+
+if __name__ == "__main__":
+    import sys
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print("N = %d" % n)
+    print("| theta | Barnes-Hut | Direct (extrapolé) | Gain   | Erreur médiane | Erreur p99 | Interactions/corps |")
+    print("|-------|------------|--------------------|--------|----------------|------------|--------------------|")
+    for row in accuracy_report(n):
+        print("| %.1f   | %8.2f s | %16.2f s | x%-5.1f | %14.1e | %10.1e | %18.0f |" % (
+            row["theta"], row["time"], row["direct_time"], row["speedup"],
+            row["median_error"], row["p99_error"], row["interactions_per_body"]))
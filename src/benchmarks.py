@@ -0,0 +1,462 @@
+"""
+@file benchmarks.py
+@brief Suite de mesures de performance : propagation, calcul des forces, rendu et mémoire.
+
+Ce script mesure :
+- functions.get_orbit et les tracés d'orbites adaptatifs d'orbits.py (cache vide et rempli) ;
+- functions.update (ancien rendu) et functions.update_bodies, par image, pour les systèmes
+  small et full de main.py ;
+- le coût complet d'une image Matplotlib (redessin complet ou blitting, moteur Agg) ;
+- le pas réel de test.py (NBodySystem.from_state sur le SystemState de reference_state, adoucissement
+  et détection des collisions), puis le pas de gravitation en Python pur, avec NBodySystem et avec
+  Barnes-Hut, à N croissant ;
+- le coût d'une image pygame (cercles et traînées, comme CelestialBody.draw de test.py),
+  et d'une image zoomée sans puis avec élimination hors champ, si pygame est installé ;
+- la mémoire consommée au fil d'une longue simulation.
+
+Les résultats sont écrits en JSON ; le mode compare signale les régressions entre deux séries :
+
+    python benchmarks.py run --out avant.json
+    python benchmarks.py run --out apres.json
+    python benchmarks.py compare avant.json apres.json --threshold 0.15
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+
+def measure(func, repeat=5, min_time=0.05):
+    """
+    @brief Mesure la durée d'un appel de func (à la manière de timeit).
+
+    Le nombre d'appels par série est choisi pour qu'une série dure au moins min_time.
+
+    @param func: Fonction sans argument.
+    @param repeat: Nombre de séries.
+    @param min_time: Durée minimale d'une série en secondes.
+    @return: Dictionnaire value (médiane par appel, s), min, unit, number, repeat.
+    """
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time or number >= 1 << 20:
+            break
+        number = 10 * number if elapsed == 0 else max(2 * number, int(number * min_time / elapsed) + 1)
+    samples = [elapsed / number]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {"value": statistics.median(samples), "min": min(samples), "unit": "s",
+            "number": number, "repeat": repeat}
+
+
+def bench_orbit(quick):
+    """
+    @brief Calcul d'une orbite elliptique (functions.get_orbit) et de 1000 orbites adaptatives (orbits.OrbitPaths).
+    """
+    from functions import get_orbit
+    from orbits import OrbitPaths
+
+    results = {}
+    for num_points in (200, 2000):
+        results["get_orbit[%d]" % num_points] = measure(lambda: get_orbit(5.2, 0.048, num_points))
+
+    rng = np.random.default_rng(0)
+    a = rng.uniform(0.5, 30, 1000)
+    e = rng.uniform(0, 0.9, 1000)
+    results["orbit_paths[1000,froid]"] = measure(lambda: OrbitPaths().adaptive(a, e, 10.0))
+    paths = OrbitPaths()
+    paths.adaptive(a, e, 10.0)
+    results["orbit_paths[1000,cache]"] = measure(lambda: paths.adaptive(a, e, 10.0))
+    return results
+
+
+def _figure(system, legacy):
+    """
+    @brief Prépare une figure Agg et la fonction de mise à jour d'une image, comme main.py.
+    """
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from functions import draw_background, draw_bodies, draw_scene
+    from kepler import KeplerPropagator
+    from main import sun, systems
+
+    planets, moons, planets_with_moons = systems[system]
+    propagator = KeplerPropagator(planets, [moon for moon in moons if moon.planet in planets_with_moons])
+    figure = Figure(figsize=(6, 6))
+    canvas = FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    if legacy:
+        planet_plots, moon_plots, _ = draw_scene(ax, sun, planets, moons)
+        artists = (planets, moons, planet_plots, moon_plots, planets_with_moons, propagator)
+    else:
+        scale_factor, _ = draw_background(ax, sun, planets, moons)
+        artists = (propagator, draw_bodies(ax, propagator, scale_factor))
+    canvas.draw()
+    return canvas, ax, artists
+
+
+def bench_update(quick):
+    """
+    @brief Mise à jour des objets graphiques pour une image, sans dessin.
+    """
+    from functions import update, update_bodies
+    from main import systems
+
+    results = {}
+    for system in sorted(systems):
+        _, _, (planets, moons, planet_plots, moon_plots, with_moons, propagator) = _figure(system, True)
+        frame = iter(range(1 << 62))
+        results["update[%s]" % system] = measure(
+            lambda: update(next(frame), planets, moons, planet_plots, moon_plots, with_moons, propagator))
+        results["update_no_propagator[%s]" % system] = measure(
+            lambda: update(next(frame), planets, moons, planet_plots, moon_plots, with_moons))
+        _, _, (propagator, bodies) = _figure(system, False)
+        results["update_bodies[%s]" % system] = measure(lambda: update_bodies(next(frame), propagator, bodies))
+    return results
+
+
+def bench_matplotlib_frame(quick):
+    """
+    @brief Coût complet d'une image Matplotlib (moteur Agg) : redessin complet contre blitting.
+    """
+    from functions import update, update_bodies
+    from main import systems
+
+    results = {}
+    for system in sorted(systems):
+        canvas, _, (planets, moons, planet_plots, moon_plots, with_moons, propagator) = _figure(system, True)
+        frame = iter(range(1 << 62))
+
+        def legacy_frame():
+            update(next(frame), planets, moons, planet_plots, moon_plots, with_moons, propagator)
+            canvas.draw()
+        results["frame_legacy[%s]" % system] = measure(legacy_frame, repeat=3)
+
+        canvas, ax, (propagator, bodies) = _figure(system, False)
+        background = canvas.copy_from_bbox(ax.bbox)
+
+        def blit_frame():
+            canvas.restore_region(background)
+            for artist in update_bodies(next(frame), propagator, bodies):
+                ax.draw_artist(artist)
+            canvas.blit(ax.bbox)
+        results["frame_blit[%s]" % system] = measure(blit_frame)
+    return results
+
+
+def bench_gravity(quick):
+    """
+    @brief Pas réel de test.py, puis pas de gravitation à N croissant : Python pur, NBodySystem, Barnes-Hut.
+    """
+    from barnes_hut import BarnesHutSolver
+    from encounters import EncounterDetector
+    from nbody import TIME_STEP, NBodySystem, _python_step, random_scenario, reference_state
+
+    results = {}
+    # Comme la fonction step de test.py : corps rangés dans un SystemState, adoucissement de 100 km,
+    # collisions détectées à chaque pas et copie des positions pour les traînées
+    state = reference_state()
+    system = NBodySystem.from_state(state, softening=1e5)
+    detector = EncounterDetector(state.diameter_km * 500, hill_factor=0)
+
+    def test_step():
+        detector.step(system, TIME_STEP)
+        state.position.copy()
+    results["test_step[%d]" % len(state)] = measure(test_step, repeat=3)
+
+    sizes = (10, 100, 1000) if quick else (10, 100, 1000, 5000)
+    for n in sizes:
+        system = random_scenario(n)
+        if n <= 1000:
+            positions = system.positions.tolist()
+            velocities = system.velocities.tolist()
+            masses = system.masses.tolist()
+            results["python_step[%d]" % n] = measure(
+                lambda: _python_step(positions, velocities, masses, TIME_STEP),
+                repeat=1 if n >= 1000 else 3, min_time=0.0 if n >= 1000 else 0.05)
+        results["nbody_step[%d]" % n] = measure(system.step, repeat=3)
+        if n >= 1000:
+            tree = random_scenario(n, softening=1e6, solver=BarnesHutSolver(theta=0.5))
+            results["barnes_hut_step[%d]" % n] = measure(tree.step, repeat=3)
+    return results
+
+
+def bench_pygame_frame(quick):
+    """
+    @brief Coût d'une image pygame : fond, traînées pleines et cercles, comme test.py (surface hors écran).
+
+    Les images zoomées (x4, vue décalée) sont mesurées sans puis avec élimination des corps et
+    des portions de traînée hors champ (spatial.ScreenIndex, trails.visible_runs).
+    """
+    try:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        import pygame
+    except ImportError:
+        print("pygame absent : mesures pygame ignorées", file=sys.stderr)
+        return {}
+
+    from nbody import TIME_STEP, random_scenario
+    from spatial import ScreenIndex
+    from trails import TrailBuffer, screen_trail, visible_runs
+
+    width = height = 800
+    scale = 100 / 1.5e11
+    pygame.init()
+    surface = pygame.Surface((width, height))
+    results = {}
+    for n in (7, 100) if quick else (7, 100, 1000):
+        system = random_scenario(n)
+        trails = [TrailBuffer(2000) for _ in range(n)]
+        # Traînées pleines : les 2000 derniers jours de chaque orbite circulaire
+        r = np.hypot(system.positions[:, 0], system.positions[:, 1])
+        angle = np.arctan2(system.positions[:, 1], system.positions[:, 0])
+        omega = np.hypot(system.velocities[:, 0], system.velocities[:, 1]) / np.maximum(r, 1.0)
+        for k in range(2000, 0, -1):
+            past = angle - omega * k * TIME_STEP
+            for trail, point in zip(trails, np.column_stack((r * np.cos(past), r * np.sin(past)))):
+                trail.append(point)
+
+        def frame():
+            surface.fill((0, 0, 0))
+            for trail, (x, y) in zip(trails, system.positions):
+                points = screen_trail(trail, scale, 1.0, width, height)
+                if len(points) > 1:
+                    pygame.draw.lines(surface, (128, 128, 128), False, points.tolist(), 1)
+                pygame.draw.circle(surface, (255, 255, 255),
+                                   (int(x * scale + width // 2), int(y * scale + height // 2)), 3)
+        results["pygame_frame[%d]" % n] = measure(frame, repeat=3)
+
+        def zoomed(cull, zoom=4.0, offset=(-600, 0)):
+            index = ScreenIndex(width, height, margin=3)
+
+            def frame():
+                surface.fill((0, 0, 0))
+                for trail in trails:
+                    points = screen_trail(trail, scale, zoom, width, height, offset=offset)
+                    runs = visible_runs(points, width, height) if cull else [points] if len(points) > 1 else []
+                    for run in runs:
+                        pygame.draw.lines(surface, (128, 128, 128), False, run.tolist(), 1)
+                screen = system.positions * (scale * zoom) + (width // 2 + offset[0], height // 2 + offset[1])
+                if cull:
+                    index.update(screen)
+                    screen = screen[index.visible()]
+                for x, y in screen:
+                    pygame.draw.circle(surface, (255, 255, 255), (int(x), int(y)), 3)
+            return frame
+        results["pygame_zoom[%d]" % n] = measure(zoomed(False), repeat=3)
+        results["pygame_zoom_culled[%d]" % n] = measure(zoomed(True), repeat=3)
+    pygame.quit()
+    return results
+
+
+def bench_memory(quick):
+    """
+    @brief Mémoire allouée au fil d'une longue simulation (tracemalloc) : croissance et pic.
+
+    La croissance est mesurée entre la fin du préchauffage et la fin de la simulation :
+    elle doit rester nulle, les traînées et les tampons étant de taille fixe.
+    """
+    from functions import update
+    from nbody import reference_scenario
+    from trails import TrailBuffer
+
+    n_steps = 5000 if quick else 50000
+    results = {}
+
+    system = reference_scenario()
+    trails = [TrailBuffer(2000) for _ in range(len(system))]
+
+    def simulate(steps):
+        for _ in range(steps):
+            system.step()
+            for trail, position in zip(trails, system.positions):
+                trail.append(position)
+
+    tracemalloc.start()
+    simulate(100)
+    warm = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    simulate(n_steps)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["memory_growth[nbody_%d_steps]" % n_steps] = {"value": current - warm, "unit": "bytes"}
+    results["memory_peak[nbody_%d_steps]" % n_steps] = {"value": peak, "unit": "bytes"}
+
+    n_frames = 500 if quick else 5000
+    _, _, (planets, moons, planet_plots, moon_plots, with_moons, propagator) = _figure("full", True)
+    tracemalloc.start()
+    for frame in range(50):
+        update(frame, planets, moons, planet_plots, moon_plots, with_moons, propagator)
+    warm = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    for frame in range(50, 50 + n_frames):
+        update(frame, planets, moons, planet_plots, moon_plots, with_moons, propagator)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    results["memory_growth[update_%d_frames]" % n_frames] = {"value": current - warm, "unit": "bytes"}
+    results["memory_peak[update_%d_frames]" % n_frames] = {"value": peak, "unit": "bytes"}
+    return results
+
+
+BENCHMARKS = {
+    "orbit": bench_orbit,
+    "update": bench_update,
+    "matplotlib_frame": bench_matplotlib_frame,
+    "gravity": bench_gravity,
+    "pygame_frame": bench_pygame_frame,
+    "memory": bench_memory,
+}
+
+
+def _commit():
+    """
+    @brief Révision git courante, si elle est disponible.
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(groups=None, quick=False):
+    """
+    @brief Exécute les mesures.
+
+    @param groups: Noms des groupes de BENCHMARKS à exécuter (tous par défaut).
+    @param quick: Tailles réduites, pour une vérification rapide.
+    @return: Dictionnaire meta (machine, versions, révision) et results {nom: mesure}.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    results = {}
+    for group in groups or BENCHMARKS:
+        for name, result in BENCHMARKS[group](quick).items():
+            results["%s.%s" % (group, name)] = result
+            print("%-50s %s" % ("%s.%s" % (group, name), _format(result)), file=sys.stderr)
+    meta = {
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "matplotlib": matplotlib.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "quick": quick,
+    }
+    return {"meta": meta, "results": results}
+
+
+def _format(result):
+    """
+    @brief Met en forme une mesure pour l'affichage.
+    """
+    value = result["value"]
+    if result["unit"] == "bytes":
+        return "%.1f Ko" % (value / 1024)
+    if value < 1e-3:
+        return "%.2f µs" % (value * 1e6)
+    if value < 1:
+        return "%.2f ms" % (value * 1e3)
+    return "%.2f s" % value
+
+
+def compare(before, after, threshold=0.10):
+    """
+    @brief Compare deux séries de mesures et repère les régressions.
+
+    Une mesure régresse si elle augmente de plus de threshold (en proportion). Pour la mémoire,
+    un écart de moins de 64 Ko est ignoré. Une mesure de référence absente des nouveaux résultats
+    est signalée « missing » (elle ne peut plus détecter de régression), une mesure apparue « new ».
+
+    @param before: Résultats de référence (valeur renvoyée par run, ou relue du JSON).
+    @param after: Nouveaux résultats.
+    @param threshold: Augmentation relative tolérée.
+    @return: Liste de tuples (nom, avant, après, rapport, verdict), verdict valant "regression", "improvement",
+    "missing" (après vaut None), "new" (avant vaut None) ou "" ; le rapport vaut None si l'un des deux manque.
+    """
+    rows = []
+    for name in sorted(set(before["results"]) | set(after["results"])):
+        old, new = before["results"].get(name), after["results"].get(name)
+        if new is None:
+            rows.append((name, old, None, None, "missing"))
+            continue
+        if old is None:
+            rows.append((name, None, new, None, "new"))
+            continue
+        a, b = old["value"], new["value"]
+        ratio = b / a if a else (1.0 if b == a else float("inf"))
+        verdict = ""
+        if old["unit"] == "bytes" and abs(b - a) < 64 * 1024:
+            verdict = ""
+        elif ratio > 1 + threshold:
+            verdict = "regression"
+        elif ratio < 1 / (1 + threshold):
+            verdict = "improvement"
+        rows.append((name, old, new, ratio, verdict))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Mesures de performance du système solaire.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="Exécute les mesures et les écrit en JSON.")
+    run_parser.add_argument("--out", default="benchmarks.json", help="Fichier JSON de sortie.")
+    run_parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Groupes à exécuter.")
+    run_parser.add_argument("--quick", action="store_true", help="Tailles réduites.")
+    compare_parser = commands.add_parser("compare", help="Compare deux fichiers JSON.")
+    compare_parser.add_argument("before", help="Mesures de référence.")
+    compare_parser.add_argument("after", help="Nouvelles mesures.")
+    compare_parser.add_argument("--threshold", type=float, default=0.10, help="Augmentation relative tolérée.")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        report = run(args.only, args.quick)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        return 0
+
+    with open(args.before, encoding="utf-8") as f:
+        before = json.load(f)
+    with open(args.after, encoding="utf-8") as f:
+        after = json.load(f)
+    rows = compare(before, after, args.threshold)
+    print("| %-50s | %12s | %12s | %7s | %-11s |" % ("Mesure", "Avant", "Après", "Rapport", ""))
+    print("|%s|%s|%s|%s|%s|" % ("-" * 52, "-" * 14, "-" * 14, "-" * 9, "-" * 13))
+    for name, old, new, ratio, verdict in rows:
+        print("| %-50s | %12s | %12s | %7s | %-11s |" % (
+            name, _format(old) if old is not None else "-", _format(new) if new is not None else "-",
+            "x%.2f" % ratio if ratio is not None else "", verdict))
+    regressions = sum(verdict == "regression" for *_, verdict in rows)
+    missing = [name for name, *_, verdict in rows if verdict == "missing"]
+    added = sum(verdict == "new" for *_, verdict in rows)
+    print("%d mesure(s) comparée(s), %d régression(s), %d absente(s) des nouveaux résultats, %d nouvelle(s)"
+          % (len(rows) - len(missing) - added, regressions, len(missing), added))
+    if missing:
+        print("Mesures absentes : %s" % ", ".join(missing))
+    return 1 if regressions or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""
+@file catalog.py
+@brief Chargement des catalogues de corps (JSON, CSV, colonnes binaires) dans un SystemState.
+
+Ce fichier remplace les listes de constructeurs écrites en dur dans main.py :
+
+- load_system lit un petit catalogue JSON (étoile, planètes, lunes, systèmes affichables)
+  et crée les objets Star, Planet et Moon ;
+- Catalog ouvre un grand catalogue tabulaire (petits corps, export d'orbites du MPC...)
+  au format CSV, .npz ou dossier de colonnes .npy, et le charge directement dans les
+  tableaux d'un SystemState, sans objet Python par ligne. Les dossiers de colonnes sont
+  projetés en mémoire (memmap) : un filtre comme « a < 5 UA » ne lit que les colonnes
+  dont il a besoin, puis seules les lignes retenues sont copiées.
+
+Exemples :
+
+    sun, systems = load_system()
+    catalog = Catalog("asteroides/")
+    state, rows = catalog.load(state, where=lambda c: c["semi_major_axis"] < 5)
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import json
+import os
+
+import numpy as np
+
+from space_objects import Star, Planet, Moon
+from state import SystemState, FLOAT_FIELDS, KIND_BODY
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data")
+DEFAULT_CATALOG = os.path.join(DATA_DIR, "solar_system.json")
+
+# Colonnes texte des catalogues tabulaires, les autres colonnes sont des flottants
+TEXT_COLUMNS = ("name", "color")
+TEXT_DTYPE = "U32"
+
+
+def load_system(path=DEFAULT_CATALOG, state=None):
+    """
+    @brief Crée l'étoile, les planètes et les lunes décrites par un catalogue JSON.
+
+    Le catalogue contient une entrée "star", des listes "planets" et "moons" (une lune
+    désigne sa planète par son nom) et un dictionnaire "systems" qui associe à chaque
+    système affichable la liste des noms de ses planètes.
+
+    @param path: Chemin du catalogue JSON.
+    @param state: SystemState qui reçoit les corps (un nouveau SystemState par défaut : des chargements
+                  répétés ne s'accumulent pas dans default_state).
+    @return: (étoile, dictionnaire {système: (planètes, lunes, planètes avec lunes)}).
+    """
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    if state is None:
+        state = SystemState()
+
+    sun = Star(state=state, **data["star"])
+    planets = {}
+    for entry in data["planets"]:
+        planets[entry["name"]] = Planet(star=sun, state=state, **entry)
+    moons = []
+    for entry in data["moons"]:
+        entry = dict(entry)
+        planet = planets[entry.pop("planet")]
+        moons.append(Moon(planet=planet, state=state, **entry))
+
+    systems = {}
+    for system, names in data["systems"].items():
+        system_planets = [planets[name] for name in names]
+        system_moons = [moon for moon in moons if moon.planet in system_planets]
+        with_moons = [planet for planet in system_planets if any(moon.planet == planet for moon in system_moons)]
+        systems[system] = (system_planets, system_moons, with_moons)
+    return sun, systems
+
+
+class Catalog:
+    """
+    @class Catalog
+    @brief Catalogue tabulaire de corps, lu colonne par colonne et à la demande.
+
+    Formats reconnus d'après le chemin :
+    - dossier : une colonne par fichier nom.npy, projetée en mémoire (le plus rapide) ;
+    - fichier .npz : archive de colonnes (non compressée de préférence), lue colonne par colonne ;
+    - fichier .csv : en-tête puis une ligne par corps, lu entièrement à l'ouverture.
+
+    Les colonnes portent les noms des grandeurs de SystemState (semi_major_axis, eccentricity,
+    period, mass, diameter_km...), plus "name" et "color" facultatives. Position et vitesse
+    s'écrivent en deux colonnes (position_x et position_y, velocity_x et velocity_y).
+
+    @param path Chemin du catalogue.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._columns = {}
+        if os.path.isdir(path):
+            self._archive = None
+            self.columns = sorted(name[:-4] for name in os.listdir(path) if name.endswith(".npy"))
+        elif path.lower().endswith(".npz"):
+            self._archive = np.load(path)
+            self.columns = sorted(self._archive.files)
+        elif path.lower().endswith(".csv"):
+            self._archive = None
+            table = _read_csv(path)
+            self.columns = list(table.dtype.names)
+            self._columns = {name: table[name] for name in self.columns}
+        else:
+            raise ValueError("Format de catalogue inconnu : %s" % path)
+
+    def __len__(self):
+        return len(self[self.columns[0]])
+
+    def __getitem__(self, column):
+        """
+        @brief Renvoie une colonne (lue au premier accès, puis gardée).
+
+        @param column: Nom de la colonne.
+        @return: Tableau NumPy (memmap pour un dossier de colonnes).
+        """
+        if column not in self._columns:
+            if column not in self.columns:
+                raise KeyError("Colonne absente du catalogue : %s" % column)
+            if self._archive is not None:
+                self._columns[column] = self._archive[column]
+            else:
+                self._columns[column] = np.load(os.path.join(self.path, column + ".npy"), mmap_mode="r")
+        return self._columns[column]
+
+    def select(self, where=None):
+        """
+        @brief Indices des lignes qui vérifient un filtre.
+
+        @param where: Fonction qui reçoit le catalogue et renvoie un masque booléen
+                      (par exemple lambda c: c["semi_major_axis"] < 5), ou None pour tout garder.
+        @return: Tableau d'indices, ou None si toutes les lignes sont gardées.
+        """
+        if where is None:
+            return None
+        return np.flatnonzero(where(self))
+
+    def load(self, state=None, where=None, kind=KIND_BODY, names=False, parent=-1):
+        """
+        @brief Ajoute les corps du catalogue (ou ceux qui vérifient un filtre) à un SystemState.
+
+        Les colonnes sont copiées en bloc dans les tableaux du SystemState ; aucun objet
+        Python n'est créé par corps, sauf les noms si names est vrai. Sans eux, les corps
+        s'appellent « #indice » et leurs noms restent lisibles dans la colonne catalog["name"].
+        Une colonne qui ne correspond à aucune grandeur du SystemState lève KeyError, comme
+        SystemState.add, plutôt que d'être ignorée.
+
+        @param state: SystemState à remplir (nouveau par défaut).
+        @param where: Filtre de lignes (voir select).
+        @param kind: Nature des corps ajoutés.
+        @param names: Charge aussi la colonne "name" (un str par corps, coûteux pour de grandes populations).
+        @param parent: Indice du corps parent commun (l'étoile, par exemple).
+        @return: (state, intervalle range des indices ajoutés).
+        """
+        known = _known_columns(self.columns)
+        unknown = [name for name in self.columns if name not in known]
+        if unknown:
+            raise KeyError("Colonnes inconnues : %s" % ", ".join(unknown))
+        if state is None:
+            state = SystemState()
+        rows = self.select(where)
+        count = len(self) if rows is None else len(rows)
+
+        def column(name):
+            values = self[name]
+            return values[rows] if rows is not None else values
+
+        fields = {name: column(name) for name in self.columns if name in FLOAT_FIELDS}
+        for name in ("position", "velocity"):
+            if name + "_x" in self.columns and name + "_y" in self.columns:
+                fields[name] = np.column_stack((column(name + "_x"), column(name + "_y")))
+        body_names = column("name").tolist() if names and "name" in self.columns else None
+        colors = column("color").tolist() if "color" in self.columns else None
+        indices = state.add_many(kind, count, names=body_names, colors=colors, parent=parent, **fields)
+        return state, indices
+
+
+def _known_columns(columns):
+    """
+    @brief Colonnes qu'un SystemState sait recevoir, parmi celles d'un catalogue.
+
+    @param columns: Noms des colonnes du catalogue.
+    @return: Ensemble des noms reconnus (une composante de vecteur seule ne l'est pas).
+    """
+    known = set(FLOAT_FIELDS) | set(TEXT_COLUMNS)
+    for name in ("position", "velocity"):
+        if name + "_x" in columns and name + "_y" in columns:
+            known.update((name + "_x", name + "_y"))
+    return known
+
+
+def _read_csv(path):
+    """
+    @brief Lit un catalogue CSV dans un tableau structuré (une colonne par champ de l'en-tête).
+
+    @param path: Chemin du fichier CSV.
+    @return: Tableau structuré NumPy.
+    """
+    with open(path, encoding="utf-8") as f:
+        header = f.readline().strip().split(",")
+    dtype = [(name, TEXT_DTYPE if name in TEXT_COLUMNS else np.float64) for name in header]
+    return np.atleast_1d(np.loadtxt(path, dtype=dtype, delimiter=",", skiprows=1, encoding="utf-8"))
+
+
+def save_columns(path, columns):
+    """
+    @brief Écrit un catalogue tabulaire au format binaire colonne par colonne.
+
+    @param path: Dossier (une colonne .npy par fichier, lisible en memmap) ou fichier .npz.
+    @param columns: Dictionnaire {nom de colonne: tableau}.
+    """
+    if path.lower().endswith(".npz"):
+        np.savez(path, **columns)
+        return
+    os.makedirs(path, exist_ok=True)
+    for name, values in columns.items():
+        np.save(os.path.join(path, name + ".npy"), np.asarray(values))
+
+
+def convert(source, destination):
+    """
+    @brief Convertit un catalogue (CSV par exemple) vers un format binaire rapide à charger.
+
+    @param source: Chemin du catalogue d'origine.
+    @param destination: Dossier de colonnes ou fichier .npz.
+    """
+    catalog = Catalog(source)
+    save_columns(destination, {name: np.asarray(catalog[name]) for name in catalog.columns})
+
+
+def synthetic_asteroids(n, seed=0):
+    """
+    @brief Crée un catalogue fictif d'astéroïdes (ceinture principale et au-delà), pour les mesures.
+
+    @param n: Nombre d'astéroïdes.
+    @param seed: Graine du générateur aléatoire.
+    @return: Dictionnaire de colonnes.
+    """
+    rng = np.random.default_rng(seed)
+    semi_major_axis = rng.uniform(1.5, 6.0, n)
+    return {
+        "name": np.char.add("A", np.arange(n).astype(TEXT_DTYPE)),
+        "semi_major_axis": semi_major_axis,
+        "eccentricity": rng.uniform(0.0, 0.3, n),
+        "period": semi_major_axis ** 1.5,  # Troisième loi de Kepler, en années
+        "diameter_km": rng.lognormal(1.0, 1.0, n),
+    }
+
+
+if __name__ == "__main__":
+    import tempfile
+    import time
+
+    n = 1000000
+    columns = synthetic_asteroids(n)
+    folder = tempfile.mkdtemp()
+    csv_path = os.path.join(folder, "asteroides.csv")
+    header = list(columns)
+    np.savetxt(csv_path, np.column_stack([columns[name] for name in header]), fmt="%s", delimiter=",",
+               header=",".join(header), comments="")
+    save_columns(os.path.join(folder, "asteroides.npz"), columns)
+    save_columns(os.path.join(folder, "asteroides"), columns)
+
+    print("%-22s %-14s %10s %12s" % ("format", "sélection", "corps", "temps (s)"))
+    for label, path in (("CSV", csv_path), (".npz", os.path.join(folder, "asteroides.npz")),
+                        ("colonnes .npy", os.path.join(folder, "asteroides"))):
+        for selection, where in (("tout", None), ("a < 5 UA", lambda c: c["semi_major_axis"] < 5)):
+            start = time.perf_counter()
+            state, rows = Catalog(path).load(where=where)
+            elapsed = time.perf_counter() - start
+            print("%-22s %-14s %10d %12.3f" % (label, selection, len(rows), elapsed))
+    print("mémoire du SystemState : %.1f Mo" % (state.nbytes / 1e6))
@@ -0,0 +1,372 @@
+"""
+@file encounters.py
+@brief Détection des rencontres proches et des collisions par grille de hachage spatial.
+
+Ce fichier contient :
+- SpatialHash, une grille uniforme qui trouve les paires de corps voisins en temps
+  quasi linéaire (phase large), sans examiner toutes les paires ;
+- EncounterDetector, qui trie ces paires candidates (phase fine) selon les rayons des
+  corps (collision) et leurs sphères de Hill (rencontre proche), consigne chaque nouvel
+  événement dans un journal, et peut fusionner ou faire rebondir les corps qui se touchent.
+
+Les corps dont le rayon d'action dépasse la moitié d'une cellule (planètes et leurs grandes
+sphères de Hill, au milieu d'une ceinture d'astéroïdes) ne sont pas rangés dans la grille :
+chacun l'interroge sur tout son rayon d'action, et la taille des cellules reste adaptée
+aux petits corps.
+
+Exemple :
+
+    system = random_scenario(100000)
+    detector = EncounterDetector(radii, handling="merge")
+    for _ in range(365):
+        detector.step(system)
+    print(detector.log.array)
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+
+from barnes_hut import _expand
+from nbody import TIME_STEP
+
+# Nature des événements
+COLLISION = 1
+ENCOUNTER = 2
+
+EVENT_DTYPE = np.dtype([
+    ("time", "f8"), ("kind", "i1"), ("body1", "U32"), ("body2", "U32"),
+    ("distance", "f8"), ("speed", "f8"),
+])
+
+# Demi-voisinage : chaque paire de cellules voisines n'est examinée qu'une fois
+_HALF_STENCIL = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+# En dessous de ce nombre de corps, toutes les paires sont examinées : la grille coûte plus cher qu'elle n'économise
+DIRECT_PAIRS = 64
+
+
+def hill_radii(positions, masses):
+    """
+    @brief Rayon de la sphère de Hill de chaque corps par rapport au corps le plus massif : a (m / 3M)^(1/3).
+
+    @param positions: Tableau (N, 2) de positions.
+    @param masses: Tableau (N,) de masses.
+    @return: Tableau (N,) de rayons (0 pour le corps central).
+    """
+    central = int(np.argmax(masses))
+    offset = positions - positions[central]
+    hill = np.hypot(offset[:, 0], offset[:, 1]) * np.cbrt(masses / (3 * masses[central]))
+    hill[central] = 0.0
+    return hill
+
+
+class SpatialHash:
+    """
+    @class SpatialHash
+    @brief Grille uniforme de cellules carrées, stockée sous forme de clés triées.
+
+    Toute paire de corps distants de moins de cell_size se trouve dans la même cellule
+    ou dans deux cellules voisines.
+
+    @param positions Positions des corps, tableau (N, 2).
+    @param cell_size Côté d'une cellule.
+    """
+    def __init__(self, positions, cell_size):
+        self.cell_size = cell_size
+        self.positions = positions
+        self.origin = positions.min(axis=0)
+        cells = np.floor((positions - self.origin) / cell_size).astype(np.int64)
+        # Une marge en y de chaque côté : les voisins en y ne débordent jamais sur la colonne x suivante
+        self.stride = int(cells[:, 1].max()) + 3
+        self.keys = cells[:, 0] * self.stride + cells[:, 1] + 1
+        self.order = np.argsort(self.keys, kind="stable")
+        self.keys_sorted = self.keys[self.order]
+
+    def candidate_pairs(self):
+        """
+        @brief Toutes les paires de corps situés dans la même cellule ou dans deux cellules voisines.
+
+        @return: (i, j) tableaux d'indices, chaque paire n'apparaissant qu'une fois.
+        """
+        keys = self.keys_sorted
+        rank = np.arange(len(keys))
+        first, second = [], []
+        for dx, dy in _HALF_STENCIL:
+            neighbour = keys + dx * self.stride + dy
+            lo = np.searchsorted(keys, neighbour, side="left")
+            hi = np.searchsorted(keys, neighbour, side="right")
+            if dx == 0 and dy == 0:
+                lo = np.maximum(lo, rank + 1)  # Dans une même cellule, chaque paire une seule fois
+            owner, other = _expand(lo, np.maximum(hi - lo, 0))
+            first.append(self.order[owner])
+            second.append(self.order[other])
+        return np.concatenate(first), np.concatenate(second)
+
+    def query(self, center, radius):
+        """
+        @brief Corps des cellules qui recouvrent le carré de demi-côté radius centré sur center.
+
+        Pour une colonne de cellules, les clés de la plage en y sont consécutives :
+        une recherche dichotomique par colonne suffit. Si le carré couvre plus de colonnes
+        qu'il n'y a de corps, tous les corps sont renvoyés.
+
+        @param center: Coordonnées (x, y).
+        @param radius: Demi-côté du carré.
+        @return: Tableau d'indices (sur-ensemble des corps à moins de radius).
+        """
+        low = np.floor((np.asarray(center) - radius - self.origin) / self.cell_size).astype(np.int64)
+        high = np.floor((np.asarray(center) + radius - self.origin) / self.cell_size).astype(np.int64)
+        if high[0] - low[0] + 1 > len(self.keys):
+            return np.arange(len(self.keys))
+        columns = np.arange(max(low[0], 0), high[0] + 1)
+        y0 = min(max(low[1], -1), self.stride - 2)
+        y1 = min(max(high[1], -1), self.stride - 2)
+        lo = np.searchsorted(self.keys_sorted, columns * self.stride + y0 + 1, side="left")
+        hi = np.searchsorted(self.keys_sorted, columns * self.stride + y1 + 1, side="right")
+        _, found = _expand(lo, hi - lo)
+        return self.order[found]
+
+
+class EventLog:
+    """
+    @class EventLog
+    @brief Journal des rencontres et collisions, stocké par lots de tableaux structurés.
+    """
+    def __init__(self):
+        self._batches = []
+
+    def __len__(self):
+        return sum(len(batch) for batch in self._batches)
+
+    def append(self, time, kind, names1, names2, distance, speed):
+        """
+        @brief Ajoute un lot d'événements.
+
+        @return: Le lot ajouté (tableau structuré EVENT_DTYPE).
+        """
+        batch = np.zeros(len(distance), dtype=EVENT_DTYPE)
+        batch["time"] = time
+        batch["kind"] = kind
+        batch["body1"] = names1
+        batch["body2"] = names2
+        batch["distance"] = distance
+        batch["speed"] = speed
+        if len(batch):
+            self._batches.append(batch)
+        return batch
+
+    @property
+    def array(self):
+        """
+        @brief Tous les événements, dans l'ordre où ils ont été détectés.
+        """
+        if not self._batches:
+            return np.zeros(0, dtype=EVENT_DTYPE)
+        if len(self._batches) > 1:
+            self._batches = [np.concatenate(self._batches)]
+        return self._batches[0]
+
+    def collisions(self):
+        """
+        @brief Collisions du journal.
+        """
+        events = self.array
+        return events[events["kind"] == COLLISION]
+
+    def encounters(self):
+        """
+        @brief Rencontres proches du journal.
+        """
+        events = self.array
+        return events[events["kind"] == ENCOUNTER]
+
+    def save(self, path):
+        """
+        @brief Écrit le journal en CSV.
+
+        @param path: Chemin du fichier.
+        """
+        np.savetxt(path, self.array, fmt=("%.6e", "%d", "%s", "%s", "%.6e", "%.6e"), delimiter=",",
+                   header=",".join(EVENT_DTYPE.names), comments="", encoding="utf-8")
+
+
+class EncounterDetector:
+    """
+    @class EncounterDetector
+    @brief Détection des collisions et rencontres proches d'un NBodySystem, avec fusion ou rebond facultatifs.
+
+    Une paire est en collision si sa distance est inférieure à la somme des rayons, et en
+    rencontre proche si elle est inférieure à hill_factor fois la plus grande des deux sphères
+    de Hill. Un événement n'est consigné qu'une fois, au début de la rencontre.
+
+    @param radii Rayons physiques des corps en mètres, tableau (N,) dans l'ordre du système.
+    @param hill_factor Fraction de la sphère de Hill qui définit une rencontre proche (0 : collisions seules).
+    @param handling None (détection seule), "merge" (fusion inélastique) ou "bounce" (rebond).
+    @param restitution Coefficient de restitution des rebonds (1 : élastique).
+    @param cell_size Côté des cellules de la grille (par défaut, deux fois le 99e centile des rayons d'action).
+    """
+    def __init__(self, radii, hill_factor=1.0, handling=None, restitution=1.0, cell_size=None):
+        if handling not in (None, "merge", "bounce"):
+            raise ValueError("Traitement inconnu : %s" % handling)
+        self.radii = np.array(radii, dtype=np.float64)
+        self.hill_factor = hill_factor
+        self.handling = handling
+        self.restitution = restitution
+        self.cell_size = cell_size
+        self.log = EventLog()
+        self.pairs_tested = 0  # Nombre de paires candidates examinées par la phase fine
+        self._active = np.zeros(0, dtype=np.int64)  # Paires en rencontre au dernier appel (i * N + j)
+        self._direct_pairs = np.triu_indices(0, k=1)  # Toutes les paires, gardées tant que N ne change pas
+
+    def candidates(self, positions, reach):
+        """
+        @brief Phase large : paires dont la distance peut être inférieure au seuil d'événement.
+
+        @param positions: Tableau (N, 2).
+        @param reach: Rayon d'action de chaque corps, tableau (N,) ; le seuil d'une paire est au plus 2 max(reach).
+        @return: (i, j) tableaux d'indices avec i != j, chaque paire une seule fois.
+        """
+        n = len(positions)
+        if n <= DIRECT_PAIRS:
+            if len(self._direct_pairs[0]) != n * (n - 1) // 2:
+                self._direct_pairs = np.triu_indices(n, k=1)
+            return self._direct_pairs
+        cell = self.cell_size
+        if cell is None:
+            cell = 2 * float(np.percentile(reach, 99)) if n else 1.0
+        if cell <= 0:
+            extent = float((positions.max(axis=0) - positions.min(axis=0)).max())
+            cell = max(extent / np.sqrt(n), 1.0)
+        large = np.flatnonzero(2 * reach > cell)
+        small = np.flatnonzero(2 * reach <= cell)
+
+        grid = SpatialHash(positions[small], cell)
+        i, j = grid.candidate_pairs()
+        first, second = [small[i]], [small[j]]
+        # Un grand corps interroge la grille sur tout son rayon d'action, puis est comparé aux autres grands corps
+        margin = float(reach[small].max()) if len(small) else 0.0
+        for rank, body in enumerate(large):
+            others = np.concatenate((small[grid.query(positions[body], 2 * reach[body] + margin)],
+                                     large[rank + 1:]))
+            first.append(np.full(len(others), body))
+            second.append(others)
+        return np.concatenate(first), np.concatenate(second)
+
+    def detect(self, system):
+        """
+        @brief Détecte les collisions et rencontres proches à la date courante, puis les traite.
+
+        @param system: Le NBodySystem.
+        @return: Nouveaux événements (tableau structuré EVENT_DTYPE).
+        """
+        positions, velocities, masses = system.positions, system.velocities, system.masses
+        n = len(masses)
+        # hill_factor nul : collisions seules, les sphères de Hill ne sont pas calculées
+        hill = hill_radii(positions, masses) * self.hill_factor if self.hill_factor else np.zeros(n)
+        reach = np.maximum(self.radii, hill)
+
+        i, j = self.candidates(positions, reach)
+        self.pairs_tested += len(i)
+        d = positions[j] - positions[i]
+        distance = np.hypot(d[:, 0], d[:, 1])
+        collision = distance <= self.radii[i] + self.radii[j]
+        encounter = ~collision & (distance <= np.maximum(hill[i], hill[j]))
+        hit = collision | encounter
+        if not hit.any():
+            # Cas courant : aucune paire en contact ni en rencontre, rien à consigner ni à traiter
+            self._active = self._active[:0]
+            return np.zeros(0, dtype=EVENT_DTYPE)
+        i, j, distance, collision = i[hit], j[hit], distance[hit], collision[hit]
+        lo, hi = np.minimum(i, j), np.maximum(i, j)
+
+        # Seuls les événements qui commencent sont consignés
+        keys = lo * n + hi
+        new = ~np.isin(keys, self._active)
+        self._active = keys
+        v = velocities[hi[new]] - velocities[lo[new]]
+        names = np.array(system.names, dtype=EVENT_DTYPE["body1"])
+        events = self.log.append(system.time, np.where(collision[new], COLLISION, ENCOUNTER),
+                                 names[lo[new]], names[hi[new]], distance[new], np.hypot(v[:, 0], v[:, 1]))
+
+        order = np.argsort(distance[collision])
+        pairs = list(zip(lo[collision][order].tolist(), hi[collision][order].tolist()))
+        if self.handling == "merge" and pairs:
+            self._merge(system, pairs)
+        elif self.handling == "bounce" and pairs:
+            self._bounce(system, pairs)
+        return events
+
+    def _merge(self, system, pairs):
+        """
+        @brief Fusionne les corps en collision, en conservant masse et quantité de mouvement.
+
+        Le plus massif des deux garde son nom ; les paires sont traitées de la plus proche
+        à la plus éloignée, et un corps déjà absorbé ne fusionne plus.
+        """
+        absorbed = set()
+        for a, b in pairs:
+            if a in absorbed or b in absorbed:
+                continue
+            keep, gone = (a, b) if system.masses[a] >= system.masses[b] else (b, a)
+            m1, m2 = system.masses[keep], system.masses[gone]
+            total = m1 + m2
+            system.positions[keep] = (m1 * system.positions[keep] + m2 * system.positions[gone]) / total
+            system.velocities[keep] = (m1 * system.velocities[keep] + m2 * system.velocities[gone]) / total
+            system.masses[keep] = total
+            self.radii[keep] = np.cbrt(self.radii[keep] ** 3 + self.radii[gone] ** 3)
+            absorbed.add(gone)
+        gone = sorted(absorbed)
+        system.remove(gone)
+        self.radii = np.delete(self.radii, gone)
+        self._active = np.zeros(0, dtype=np.int64)  # Les indices ont changé
+
+    def _bounce(self, system, pairs):
+        """
+        @brief Fait rebondir les corps en collision qui se rapprochent (impulsion le long de la ligne des centres).
+        """
+        for a, b in pairs:
+            normal = system.positions[b] - system.positions[a]
+            normal /= np.hypot(*normal)
+            approach = np.dot(system.velocities[b] - system.velocities[a], normal)
+            if approach >= 0:
+                continue
+            ma, mb = system.masses[a], system.masses[b]
+            impulse = (1 + self.restitution) * approach / (ma + mb)
+            system.velocities[a] += impulse * mb * normal
+            system.velocities[b] -= impulse * ma * normal
+        system.invalidate()
+
+    def step(self, system, dt=TIME_STEP):
+        """
+        @brief Avance le système d'un pas puis détecte et traite les événements.
+
+        @param system: Le NBodySystem.
+        @param dt: Pas de temps en secondes.
+        @return: Nouveaux événements.
+        """
+        system.step(dt)
+        return self.detect(system)
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from barnes_hut import BarnesHutSolver
+    from nbody import random_scenario
+
+    print("| N       | Paires candidates | Paires (toutes) | Détection | Événements |")
+    print("|---------|-------------------|-----------------|-----------|------------|")
+    for n in [int(arg) for arg in sys.argv[1:]] or (1000, 10000, 100000):
+        system = random_scenario(n, softening=1e6, solver=BarnesHutSolver())
+        rng = np.random.default_rng(1)
+        system.masses[1:] = 10 ** rng.uniform(15, 21, n - 1)  # Masses d'astéroïdes
+        radii = rng.uniform(1e5, 1e7, n)  # Rayons gonflés pour provoquer des événements
+        radii[0] = 7e8  # Soleil
+        detector = EncounterDetector(radii, handling="merge")
+        start = time.perf_counter()
+        detector.detect(system)
+        elapsed = time.perf_counter() - start
+        print("| %-7d | %17d | %15d | %7.3f s | %10d |" % (
+            n, detector.pairs_tested, n * (n - 1) // 2, elapsed, len(detector.log)))
@@ -0,0 +1,441 @@
+"""
+@file ensemble.py
+@brief Exécution parallèle d'ensembles de simulations (balayages de paramètres, études de Monte-Carlo).
+
+Ce fichier contient la classe Ensemble, qui fait tourner un même scénario N-corps des
+centaines de fois avec des conditions initiales modifiées (masses, vitesses, distances
+des lunes), sans affichage, sur une réserve de processus. Chaque simulation renvoie un
+résumé (stabilité, plus courte distance entre deux corps, dérive de l'énergie) dès
+qu'elle se termine.
+
+Les tableaux du scénario de base (positions, vitesses, masses, qui peuvent venir d'un grand
+catalogue) sont publiés une seule fois dans un segment de mémoire partagée : chaque
+processus s'y attache au démarrage, et seules les petites variations de paramètres sont
+transmises par pickle à chaque simulation.
+
+Exemple :
+
+    ensemble = Ensemble(reference_scenario(integrator=Leapfrog()), duration=30 * TIME_STEP, dt=600, workers=4)
+    for summary in ensemble.run(monte_carlo(ensemble.base, 500, velocity_sigma=0.01)):
+        print(summary["index"], summary["stable"], summary["max_energy_drift"])
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import math
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from encounters import hill_radii
+from integrators import DriftMonitor
+from nbody import G, TIME_STEP, NBodySystem, circular_velocity
+
+
+class SharedArrays:
+    """
+    @class SharedArrays
+    @brief Tableaux NumPy rangés dans un seul segment de mémoire partagée.
+
+    Le processus qui crée l'objet possède le segment et doit appeler unlink() ;
+    les autres processus s'y attachent avec attach(spec), sans copie.
+
+    @param arrays Dictionnaire {nom: tableau} à publier.
+    """
+    def __init__(self, arrays):
+        layout = []
+        offset = 0
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            offset = (offset + 63) // 64 * 64  # Alignement de chaque tableau sur 64 octets
+            layout.append((name, array.dtype.str, array.shape, offset))
+            offset += array.nbytes
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        self.layout = layout
+        self.arrays = self._views(self._shm, layout)
+        for name, array in arrays.items():
+            self.arrays[name][...] = array
+
+    @staticmethod
+    def _views(shm, layout):
+        """
+        @brief Crée les vues NumPy sur le segment.
+        """
+        return {name: np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=offset)
+                for name, dtype, shape, offset in layout}
+
+    @property
+    def spec(self):
+        """
+        @brief Description picklable du segment (nom et disposition des tableaux), pour attach().
+        """
+        return self._shm.name, self.layout
+
+    @staticmethod
+    def attach(spec):
+        """
+        @brief S'attache à un segment créé par un autre processus.
+
+        @param spec: Valeur de SharedArrays.spec.
+        @return: (segment, dictionnaire {nom: tableau}) ; le segment doit rester référencé tant que les tableaux servent.
+        """
+        name, layout = spec
+        shm = shared_memory.SharedMemory(name=name)
+        return shm, SharedArrays._views(shm, layout)
+
+    def unlink(self):
+        """
+        @brief Libère le segment.
+        """
+        self.arrays = {}
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.unlink()
+
+
+def closest_pair(positions, chunk_size=256):
+    """
+    @brief Trouve la plus courte distance entre deux corps, par blocs de lignes.
+
+    @param positions: Tableau (N, 2) de positions.
+    @param chunk_size: Nombre de lignes de la matrice des paires traitées ensemble.
+    @return: (distance, i, j).
+    """
+    n = len(positions)
+    best = (math.inf, -1, -1)
+    for begin in range(0, n, chunk_size):
+        rows = np.arange(begin, min(begin + chunk_size, n))
+        d = positions[np.newaxis, :, :] - positions[rows, np.newaxis, :]
+        r2 = np.einsum("ijk,ijk->ij", d, d)
+        r2[np.arange(n)[np.newaxis, :] <= rows[:, np.newaxis]] = np.inf
+        k = int(np.argmin(r2))
+        i, j = divmod(k, n)
+        if r2[i, j] < best[0] ** 2:
+            best = (math.sqrt(r2[i, j]), int(rows[i]), j)
+    return best
+
+
+def find_hosts(system, chunk_size=256):
+    """
+    @brief Associe à chaque corps celui autour duquel il orbite (-1 pour le plus massif).
+
+    L'hôte d'un corps est le plus proche des corps plus massifs dont il occupe la sphère de Hill
+    (rayon a (m / 3M)^(1/3), où M est la masse du corps central), et le corps central sinon :
+    la Lune orbite autour de la Terre bien que le Soleil l'attire davantage.
+
+    @param system: Le NBodySystem.
+    @param chunk_size: Nombre de lignes de la matrice des paires traitées ensemble.
+    @return: Tableau (N,) d'indices.
+    """
+    n = len(system)
+    positions, masses = system.positions, system.masses
+    central = int(np.argmax(masses))
+    hill = hill_radii(positions, masses)
+    hosts = np.full(n, central, dtype=np.int64)
+    hosts[central] = -1
+    for begin in range(0, n, chunk_size):
+        rows = np.arange(begin, min(begin + chunk_size, n))
+        d = positions[np.newaxis, :, :] - positions[rows, np.newaxis, :]
+        r = np.sqrt(np.einsum("ijk,ijk->ij", d, d))
+        r[(r >= hill[np.newaxis, :]) | (masses[np.newaxis, :] <= masses[rows, np.newaxis])] = np.inf
+        nearest = np.argmin(r, axis=1)
+        inside = np.isfinite(r[np.arange(len(rows)), nearest]) & (rows != central)
+        hosts[rows[inside]] = nearest[inside]
+    return hosts
+
+
+def bound(system, hosts):
+    """
+    @brief Indique, pour chaque corps, s'il reste lié à son hôte (énergie orbitale relative négative).
+
+    @param system: Le NBodySystem.
+    @param hosts: Indices des hôtes (voir find_hosts).
+    @return: Tableau (N,) de booléens (vrai pour le corps sans hôte).
+    """
+    result = np.ones(len(system), dtype=bool)
+    orbiting = np.flatnonzero(hosts >= 0)
+    h = hosts[orbiting]
+    d = system.positions[orbiting] - system.positions[h]
+    v = system.velocities[orbiting] - system.velocities[h]
+    r = np.hypot(d[:, 0], d[:, 1])
+    energy = 0.5 * np.einsum("ij,ij->i", v, v) - G * (system.masses[orbiting] + system.masses[h]) / r
+    result[orbiting] = energy < 0
+    return result
+
+
+def apply_variation(system, variation, hosts):
+    """
+    @brief Modifie les conditions initiales d'un système selon une variation de paramètres.
+
+    Clés reconnues (chacune associe des noms de corps à des valeurs) :
+    - "mass" : masse en kg ;
+    - "position" : (x, y) en m ;
+    - "velocity" : (vx, vy) en m/s, comme les vitesses initiales des corps de test.py ;
+    - "moon_distance" : distance à l'hôte en m, comme le paramètre distance de Moon dans test.py.
+      La lune est replacée dans la même direction, sur une orbite circulaire de même sens.
+
+    @param system: Le NBodySystem à modifier.
+    @param variation: Dictionnaire décrit ci-dessus.
+    @param hosts: Indices des hôtes (voir find_hosts).
+    """
+    unknown = set(variation) - {"mass", "position", "velocity", "moon_distance"}
+    if unknown:
+        raise KeyError("Paramètres inconnus : %s" % ", ".join(sorted(unknown)))
+    for name, mass in variation.get("mass", {}).items():
+        system.masses[system.index(name)] = mass
+    for name, position in variation.get("position", {}).items():
+        system.positions[system.index(name)] = position
+    for name, velocity in variation.get("velocity", {}).items():
+        system.velocities[system.index(name)] = velocity
+    for name, distance in variation.get("moon_distance", {}).items():
+        i = system.index(name)
+        h = hosts[i]
+        if h < 0:
+            raise ValueError("%s n'orbite autour d'aucun corps" % name)
+        offset = system.positions[i] - system.positions[h]
+        u = offset / np.hypot(*offset)
+        w = np.array((-u[1], u[0]))  # Direction perpendiculaire, sens trigonométrique
+        sense = 1.0 if np.dot(system.velocities[i] - system.velocities[h], w) >= 0 else -1.0
+        system.positions[i] = system.positions[h] + distance * u
+        system.velocities[i] = system.velocities[h] + sense * circular_velocity(system.masses[h], distance) * w
+    system.invalidate()
+
+
+def simulate(system, hosts, duration, dt, samples=100, collision_distance=0.0):
+    """
+    @brief Fait tourner une simulation et résume son évolution.
+
+    Une simulation est stable si aucun corps ne quitte son hôte (énergie orbitale relative
+    positive) et si aucune paire ne passe sous collision_distance, aux instants de mesure.
+
+    @param system: Le NBodySystem (modifié sur place).
+    @param hosts: Indices des hôtes (voir find_hosts).
+    @param duration: Durée simulée en secondes.
+    @param dt: Pas de temps en secondes.
+    @param samples: Nombre d'instants de mesure.
+    @param collision_distance: Distance en m sous laquelle deux corps sont considérés en collision.
+    @return: Dictionnaire stable, unbound (noms), closest_approach (m), closest_pair (noms),
+    max_energy_drift, max_angular_momentum_drift, cpu_time, force_evaluations, steps.
+    """
+    n_steps = int(math.ceil(duration / dt))
+    every = max(1, n_steps // samples)
+    monitor = DriftMonitor(system)
+    still_bound = bound(system, hosts)
+    closest = closest_pair(system.positions)
+    report = monitor.sample()
+    for step in range(1, n_steps + 1):
+        system.step(dt)
+        if step % every == 0 or step == n_steps:
+            report = monitor.sample()
+            still_bound &= bound(system, hosts)
+            pair = closest_pair(system.positions)
+            if pair[0] < closest[0]:
+                closest = pair
+    _, i, j = closest
+    return {
+        "stable": bool(still_bound.all()) and closest[0] > collision_distance,
+        "unbound": [system.names[k] for k in np.flatnonzero(~still_bound)],
+        "closest_approach": closest[0],
+        "closest_pair": (system.names[i], system.names[j]),
+        "max_energy_drift": report["max_energy_drift"],
+        "max_angular_momentum_drift": report["max_angular_momentum_drift"],
+        "cpu_time": report["cpu_time"],
+        "force_evaluations": report["force_evaluations"],
+        "steps": n_steps,
+    }
+
+
+_worker = None
+
+
+def _init_worker(spec, names, settings):
+    """
+    @brief S'attache à la mémoire partagée du scénario de base dans un processus de la réserve.
+    """
+    global _worker
+    shm, arrays = SharedArrays.attach(spec)
+    _worker = (shm, arrays, names, settings)
+
+
+def _run_one(task):
+    """
+    @brief Fait tourner une simulation de l'ensemble dans un processus de la réserve.
+
+    @param task: (numéro de la simulation, variation).
+    @return: Résumé de simulate, complété par index et variation.
+    """
+    index, variation = task
+    _, arrays, names, settings = _worker
+    return _run(index, variation, arrays, names, settings)
+
+
+def _run(index, variation, arrays, names, settings):
+    """
+    @brief Reconstruit un système à partir des tableaux de base, applique la variation et le simule.
+    """
+    softening, solver, integrator, duration, dt, samples, collision_distance = settings
+    system = NBodySystem(names, arrays["positions"], arrays["velocities"], arrays["masses"],
+                         softening=softening, solver=solver, integrator=integrator)
+    hosts = arrays["hosts"]
+    apply_variation(system, variation, hosts)
+    summary = simulate(system, hosts, duration, dt, samples, collision_distance)
+    summary["index"] = index
+    summary["variation"] = variation
+    return summary
+
+
+class Ensemble:
+    """
+    @class Ensemble
+    @brief Ensemble de simulations d'un même scénario avec des conditions initiales différentes.
+
+    Les hôtes (corps autour duquel chaque corps orbite) sont déterminés une fois sur le
+    scénario de base et servent à placer les lunes et à tester la stabilité.
+
+    @param base Le NBodySystem de base (non modifié ; son solveur, son intégrateur et son adoucissement sont repris).
+    @param duration Durée simulée de chaque simulation, en secondes.
+    @param dt Pas de temps en secondes.
+    @param samples Nombre d'instants de mesure par simulation.
+    @param collision_distance Distance en m sous laquelle une rencontre rend la simulation instable.
+    @param workers Nombre de processus (par défaut, le nombre de cœurs ; 1 : tout dans le processus courant).
+    """
+    def __init__(self, base, duration, dt=TIME_STEP, samples=100, collision_distance=0.0, workers=None):
+        self.base = base
+        self.duration = duration
+        self.dt = dt
+        self.samples = samples
+        self.collision_distance = collision_distance
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.hosts = find_hosts(base)
+
+    def _arrays(self):
+        return {"positions": self.base.positions, "velocities": self.base.velocities,
+                "masses": self.base.masses, "hosts": self.hosts}
+
+    def _settings(self):
+        return (self.base.softening, self.base.solver, self.base.integrator, self.duration, self.dt,
+                self.samples, self.collision_distance)
+
+    def run(self, variations, max_pending=None):
+        """
+        @brief Lance les simulations et renvoie leurs résumés au fur et à mesure qu'elles se terminent.
+
+        Les variations peuvent venir d'un générateur : au plus max_pending simulations sont
+        soumises à l'avance, la mémoire reste donc bornée pour des ensembles très grands.
+
+        @param variations: Liste ou générateur de variations (voir apply_variation).
+        @param max_pending: Nombre maximal de simulations en attente (par défaut 4 par processus).
+        @return: Itérateur de résumés (voir simulate), avec index (rang de la variation) et variation, dans l'ordre de fin.
+        """
+        tasks = enumerate(variations)
+        if self.workers <= 1:
+            arrays = {name: np.array(values) for name, values in self._arrays().items()}
+            for index, variation in tasks:
+                yield _run(index, variation, arrays, self.base.names, self._settings())
+            return
+
+        max_pending = max_pending or 4 * self.workers
+        with SharedArrays(self._arrays()) as shared, ProcessPoolExecutor(
+                self.workers, initializer=_init_worker,
+                initargs=(shared.spec, self.base.names, self._settings())) as pool:
+            pending = set()
+            for task in tasks:
+                pending.add(pool.submit(_run_one, task))
+                if len(pending) >= max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+
+def monte_carlo(base, n, mass_sigma=0.0, velocity_sigma=0.0, distance_sigma=0.0, bodies=None, seed=0):
+    """
+    @brief Génère des variations aléatoires (loi normale relative) autour d'un scénario de base.
+
+    @param base: Le NBodySystem de base.
+    @param n: Nombre de variations.
+    @param mass_sigma: Écart-type relatif des masses.
+    @param velocity_sigma: Écart-type relatif de chaque composante de vitesse, rapporté à la norme de la vitesse.
+    @param distance_sigma: Écart-type relatif des distances des lunes à leur hôte.
+    @param bodies: Noms des corps perturbés (par défaut, tous sauf le plus massif).
+    @param seed: Graine du générateur aléatoire.
+    @return: Générateur de variations.
+    """
+    rng = np.random.default_rng(seed)
+    hosts = find_hosts(base)
+    if bodies is None:
+        bodies = [name for i, name in enumerate(base.names) if hosts[i] >= 0]
+    indices = [base.index(name) for name in bodies]
+    # Les lunes sont les corps dont l'hôte n'est pas le corps central
+    moons = [i for i in range(len(base)) if hosts[i] >= 0 and hosts[hosts[i]] >= 0]
+    for _ in range(n):
+        variation = {}
+        if mass_sigma:
+            variation["mass"] = {base.names[i]: base.masses[i] * (1 + mass_sigma * rng.standard_normal())
+                                 for i in indices}
+        if velocity_sigma:
+            delta = np.zeros_like(base.velocities)
+            for i in indices:
+                if i not in moons:
+                    delta[i] = velocity_sigma * np.hypot(*base.velocities[i]) * rng.standard_normal(2)
+            # Une lune suit la perturbation de vitesse de sa planète
+            for i in moons:
+                delta[i] = delta[hosts[i]]
+            variation["velocity"] = {base.names[i]: tuple(base.velocities[i] + delta[i])
+                                     for i in range(len(base)) if delta[i].any()}
+        if distance_sigma:
+            variation["moon_distance"] = {
+                base.names[i]: np.hypot(*(base.positions[i] - base.positions[hosts[i]]))
+                * (1 + distance_sigma * rng.standard_normal())
+                for i in moons if i in indices}
+        yield variation
+
+
+def sweep(parameter, body, values):
+    """
+    @brief Génère un balayage d'un paramètre d'un corps (voir apply_variation).
+
+    @param parameter: "mass", "position", "velocity" ou "moon_distance".
+    @param body: Nom du corps.
+    @param values: Valeurs successives.
+    @return: Générateur de variations.
+    """
+    for value in values:
+        yield {parameter: {body: value}}
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    from integrators import Leapfrog
+    from nbody import reference_scenario
+
+    n_runs = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    # Pas de 10 minutes : Phobos (période de 7,7 h) reste en orbite
+    base = reference_scenario(integrator=Leapfrog())
+    print("Scénario de référence, %d simulations de 30 jours (pas de 10 min),"
+          " vitesses perturbées de 1 %% et distances des lunes de 5 %%" % n_runs)
+    print("| Processus | Temps   | Simulations/s | Accélération | Stables |")
+    print("|-----------|---------|---------------|--------------|---------|")
+    reference = None
+    for workers in sorted({1, 2, os.cpu_count() or 1}):
+        ensemble = Ensemble(base, duration=30 * TIME_STEP, dt=600, workers=workers)
+        start = time.perf_counter()
+        summaries = list(ensemble.run(monte_carlo(base, n_runs, velocity_sigma=0.01, distance_sigma=0.05)))
+        elapsed = time.perf_counter() - start
+        reference = reference or elapsed
+        stable = sum(summary["stable"] for summary in summaries)
+        print("| %-9d | %5.2f s | %13.1f | x%-11.2f | %3d/%-3d |" % (
+            workers, elapsed, n_runs / elapsed, reference / elapsed, stable, n_runs))
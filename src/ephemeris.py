@@ -0,0 +1,374 @@
+"""
+@file ephemeris.py
+@brief Éphémérides précalculées avec interpolation, pour rejouer une plage de temps sans recalcul.
+
+Ce fichier contient la classe Ephemeris, qui découpe une plage de temps en blocs
+d'échantillons réguliers (positions et vitesses en float32, rangées corps par corps)
+et répond à position(corps, t) en O(1) par interpolation d'Hermite cubique.
+Les blocs sont conservés dans un cache LRU borné en mémoire et recalculés à la demande
+par une source : KeplerSource (functions.py / kepler.py, utilisée par main.py) ou NBodySource
+(nbody.py, ou le SystemState de test.py). Les instantanés d'une NBodySource comptent dans
+le budget mémoire du cache.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import bisect
+import copy
+import json
+from collections import OrderedDict
+
+import numpy as np
+
+from nbody import NBodySystem
+from state import SystemState
+
+
+class KeplerSource:
+    """
+    @class KeplerSource
+    @brief Source d'échantillons calculés par un KeplerPropagator (accès direct à n'importe quelle date).
+
+    @param propagator Le KeplerPropagator.
+    """
+    def __init__(self, propagator):
+        self.propagator = propagator
+        self.names = list(propagator.names)
+
+    def __call__(self, times):
+        """
+        @brief Calcule positions et vitesses aux dates demandées.
+
+        @param times: Tableau (T,) de dates croissantes.
+        @return: (positions, vitesses), tableaux (T, N, 2).
+        """
+        return self.propagator.positions(times), self.propagator.velocities(times)
+
+
+class NBodySource:
+    """
+    @class NBodySource
+    @brief Source d'échantillons calculés en intégrant un NBodySystem.
+
+    L'intégration est séquentielle : la source garde un instantané de l'état au début
+    de chaque plage demandée, et repart du dernier instantané antérieur pour recalculer
+    un bloc évincé du cache, au lieu de tout réintégrer depuis le début.
+
+    @param system Le NBodySystem, ou un SystemState (simulé par NBodySystem.from_state) ;
+                  il est copié, l'original n'est pas modifié.
+    @param dt Pas d'intégration en secondes ; le pas des échantillons doit en être un multiple.
+    @param softening Longueur d'adoucissement en mètres, pour un SystemState.
+    """
+    def __init__(self, system, dt, softening=0.0):
+        if isinstance(system, SystemState):
+            system = NBodySystem.from_state(copy.deepcopy(system), softening=softening)
+        else:
+            system = copy.deepcopy(system)
+        self.system = system
+        self.dt = dt
+        self.names = list(system.names)
+        self.nbytes = 0  # Mémoire occupée par les instantanés
+        self._snapshot_times = []
+        self._snapshots = {}
+        self._save_snapshot()
+
+    def _save_snapshot(self):
+        """
+        @brief Mémorise l'état courant du système intégré.
+        """
+        t = self.system.time
+        if t not in self._snapshots:
+            bisect.insort(self._snapshot_times, t)
+            self.nbytes += self.system.positions.nbytes + self.system.velocities.nbytes
+        self._snapshots[t] = (self.system.positions.copy(), self.system.velocities.copy())
+
+    def trim(self, max_bytes):
+        """
+        @brief Supprime un instantané sur deux (le premier est gardé) jusqu'à tenir dans max_bytes.
+
+        Un bloc à recalculer repart alors d'un instantané plus ancien : la mémoire est
+        bornée au prix d'une intégration plus longue.
+
+        @param max_bytes: Mémoire accordée aux instantanés, en octets.
+        """
+        while self.nbytes > max_bytes and len(self._snapshot_times) > 1:
+            kept = self._snapshot_times[::2]
+            for t in self._snapshot_times[1::2]:
+                positions, velocities = self._snapshots.pop(t)
+                self.nbytes -= positions.nbytes + velocities.nbytes
+            self._snapshot_times = kept
+
+    def _seek(self, t):
+        """
+        @brief Place le système au plus près de t sans le dépasser.
+
+        Le système continue depuis son état courant s'il est déjà entre le dernier
+        instantané antérieur à t et t ; sinon il repart de cet instantané.
+
+        @param t: Date visée en secondes.
+        """
+        tol = 0.5 * self.dt
+        k = bisect.bisect_right(self._snapshot_times, t + tol) - 1
+        if k < 0:
+            raise ValueError("Date %g antérieure au début de la simulation" % t)
+        snapshot_time = self._snapshot_times[k]
+        if snapshot_time <= self.system.time <= t + tol:
+            return
+        positions, velocities = self._snapshots[snapshot_time]
+        self.system.positions[:] = positions
+        self.system.velocities[:] = velocities
+        self.system.time = snapshot_time
+        self.system.invalidate()
+
+    def __call__(self, times):
+        """
+        @brief Intègre le système et relève positions et vitesses aux dates demandées.
+
+        @param times: Tableau (T,) de dates croissantes, en secondes.
+        @return: (positions, vitesses), tableaux (T, N, 2).
+        """
+        self._seek(times[0])
+        positions = np.empty((len(times), len(self.names), 2))
+        velocities = np.empty((len(times), len(self.names), 2))
+        for i, t in enumerate(times):
+            while self.system.time < t - 0.5 * self.dt:
+                self.system.step(self.dt)
+            if i == 0:
+                self._save_snapshot()
+            positions[i] = self.system.positions
+            velocities[i] = self.system.velocities
+        return positions, velocities
+
+
+class Ephemeris:
+    """
+    @class Ephemeris
+    @brief Cache d'éphémérides par blocs, interpolées par Hermite cubique.
+
+    Le bloc k contient les échantillons k.B à (k+1).B inclus (B = block_size) : l'intervalle
+    entre deux échantillons est toujours interpolé à l'intérieur d'un même bloc.
+    Mémoire d'un bloc : N x (B + 1) x 4 x 4 octets (positions et vitesses en float32).
+
+    @param names Noms des corps.
+    @param t0 Date de début.
+    @param t1 Date de fin.
+    @param step Intervalle entre deux échantillons.
+    @param source Fonction times -> (positions, vitesses) utilisée pour remplir les blocs.
+    @param block_size Nombre d'intervalles par bloc.
+    @param max_bytes Budget mémoire du cache en octets, instantanés de la source compris (les blocs
+                     les moins récemment utilisés sont évincés).
+    @param dtype Type de stockage (float32 par défaut : ~7 chiffres significatifs).
+    """
+    def __init__(self, names, t0, t1, step, source, block_size=256, max_bytes=64 * 2**20,
+                 dtype=np.float32):
+        self.names = list(names)
+        self._index = {name: i for i, name in enumerate(self.names)}
+        self.t0 = float(t0)
+        self.step = float(step)
+        self.n_samples = int(np.ceil((t1 - t0) / step)) + 1
+        self.t1 = self.t0 + (self.n_samples - 1) * self.step
+        self.source = source
+        self.block_size = block_size
+        self.max_bytes = max_bytes
+        self.dtype = np.dtype(dtype)
+        self.n_blocks = max(1, -(-(self.n_samples - 1) // block_size))
+        self._blocks = OrderedDict()
+        self._block_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_kepler(cls, propagator, t0, t1, step, **kwargs):
+        """
+        @brief Construit des éphémérides alimentées par un KeplerPropagator.
+
+        @param propagator: Le KeplerPropagator.
+        @param t0: Date de début.
+        @param t1: Date de fin.
+        @param step: Intervalle entre deux échantillons.
+        @return: Un Ephemeris.
+        """
+        source = KeplerSource(propagator)
+        return cls(source.names, t0, t1, step, source, **kwargs)
+
+    @classmethod
+    def from_nbody(cls, system, t1, step, dt=None, softening=0.0, **kwargs):
+        """
+        @brief Construit des éphémérides alimentées par l'intégration d'un NBodySystem.
+
+        @param system: Le NBodySystem dans son état initial (date system.time), ou un SystemState (date 0).
+        @param t1: Date de fin en secondes.
+        @param step: Intervalle entre deux échantillons en secondes.
+        @param dt: Pas d'intégration (par défaut égal à step).
+        @param softening: Longueur d'adoucissement en mètres, pour un SystemState.
+        @return: Un Ephemeris.
+        """
+        source = NBodySource(system, dt if dt is not None else step, softening=softening)
+        return cls(source.names, source.system.time, t1, step, source, **kwargs)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def nbytes(self):
+        """
+        @brief Mémoire occupée en octets : blocs en cache et instantanés de la source.
+        """
+        return self._block_bytes + getattr(self.source, "nbytes", 0)
+
+    def block_nbytes(self):
+        """
+        @brief Taille mémoire d'un bloc en octets.
+        """
+        return len(self.names) * (self.block_size + 1) * 4 * self.dtype.itemsize
+
+    def _block(self, k):
+        """
+        @brief Renvoie le bloc k (positions, vitesses), en le calculant si besoin.
+
+        @param k: Numéro du bloc.
+        @return: Tableaux (N, B + 1, 2) de positions et de vitesses.
+        """
+        block = self._blocks.get(k)
+        if block is not None:
+            self._blocks.move_to_end(k)
+            self.hits += 1
+            return block
+        self.misses += 1
+        first = k * self.block_size
+        last = min(first + self.block_size, self.n_samples - 1)
+        times = self.t0 + self.step * np.arange(first, last + 1)
+        positions, velocities = self.source(times)
+        block = (np.ascontiguousarray(np.swapaxes(positions, 0, 1), dtype=self.dtype),
+                 np.ascontiguousarray(np.swapaxes(velocities, 0, 1), dtype=self.dtype))
+        self._store(k, block)
+        return block
+
+    def _store(self, k, block):
+        """
+        @brief Ajoute un bloc au cache et évince les plus anciens pour respecter le budget.
+
+        @param k: Numéro du bloc.
+        @param block: (positions, vitesses).
+        """
+        self._blocks[k] = block
+        self._block_bytes += block[0].nbytes + block[1].nbytes
+        while self.nbytes > self.max_bytes and len(self._blocks) > 1:
+            _, (positions, velocities) = self._blocks.popitem(last=False)
+            self._block_bytes -= positions.nbytes + velocities.nbytes
+        if self.nbytes > self.max_bytes and hasattr(self.source, "trim"):
+            # Un seul bloc reste : les instantanés de la source cèdent la place
+            self.source.trim(self.max_bytes - self._block_bytes)
+
+    def precompute(self):
+        """
+        @brief Calcule tous les blocs dans l'ordre (seuls les plus récents restent si le budget est dépassé).
+        """
+        for k in range(self.n_blocks):
+            self._block(k)
+
+    def _locate(self, t):
+        """
+        @brief Trouve le bloc, l'échantillon et la fraction d'intervalle correspondant à t.
+
+        @param t: Date.
+        @return: (bloc, indice local, fraction dans [0, 1]).
+        """
+        if not self.t0 <= t <= self.t1:
+            raise ValueError("Date %g hors de la plage [%g, %g]" % (t, self.t0, self.t1))
+        u = (t - self.t0) / self.step
+        i = min(int(u), self.n_samples - 2) if self.n_samples > 1 else 0
+        return self._block(i // self.block_size), i % self.block_size, u - i
+
+    def _interpolate(self, positions, velocities, i, s):
+        """
+        @brief Interpolation d'Hermite cubique entre les échantillons i et i + 1.
+
+        @param positions: Positions du bloc, tableau (..., B + 1, 2).
+        @param velocities: Vitesses du bloc, tableau (..., B + 1, 2).
+        @param i: Indice local de l'échantillon de gauche.
+        @param s: Fraction de l'intervalle, dans [0, 1].
+        @return: Positions interpolées, tableau (..., 2).
+        """
+        if positions.shape[-2] == 1:
+            return positions[..., 0, :].astype(float)
+        p0 = positions[..., i, :].astype(float)
+        p1 = positions[..., i + 1, :].astype(float)
+        m0 = velocities[..., i, :] * self.step
+        m1 = velocities[..., i + 1, :] * self.step
+        s2 = s * s
+        s3 = s2 * s
+        return ((2 * s3 - 3 * s2 + 1) * p0 + (s3 - 2 * s2 + s) * m0
+                + (-2 * s3 + 3 * s2) * p1 + (s3 - s2) * m1)
+
+    def position(self, body, t):
+        """
+        @brief Position interpolée d'un corps à la date t, en O(1).
+
+        @param body: Nom ou indice du corps.
+        @param t: Date.
+        @return: Tableau (2,) de coordonnées.
+        """
+        j = self._index[body] if isinstance(body, str) else body
+        (positions, velocities), i, s = self._locate(t)
+        return self._interpolate(positions[j], velocities[j], i, s)
+
+    def positions(self, t):
+        """
+        @brief Positions interpolées de tous les corps à la date t.
+
+        @param t: Date.
+        @return: Tableau (N, 2).
+        """
+        (positions, velocities), i, s = self._locate(t)
+        return self._interpolate(positions, velocities, i, s)
+
+    def save(self, path):
+        """
+        @brief Enregistre toutes les éphémérides sur disque.
+
+        Écrit path.npy (tableau (N, échantillons, 4) : x, y, vx, vy) et path.json (métadonnées).
+        Le fichier .npy est écrit bloc par bloc, sans tout charger en mémoire.
+
+        @param path: Chemin sans extension.
+        """
+        data = np.lib.format.open_memmap(path + ".npy", mode="w+", dtype=self.dtype,
+                                         shape=(len(self.names), self.n_samples, 4))
+        for k in range(self.n_blocks):
+            positions, velocities = self._block(k)
+            first = k * self.block_size
+            last = first + positions.shape[1]
+            data[:, first:last, :2] = positions
+            data[:, first:last, 2:] = velocities
+        data.flush()
+        del data
+        meta = {"names": self.names, "t0": self.t0, "step": self.step, "n_samples": self.n_samples,
+                "block_size": self.block_size}
+        with open(path + ".json", "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path, max_bytes=64 * 2**20):
+        """
+        @brief Relit des éphémérides enregistrées par save().
+
+        Le fichier .npy est projeté en mémoire : seuls les blocs consultés sont lus
+        sur disque, et ils restent soumis au budget du cache.
+
+        @param path: Chemin sans extension.
+        @param max_bytes: Budget mémoire du cache en octets.
+        @return: Un Ephemeris.
+        """
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        data = np.load(path + ".npy", mmap_mode="r")
+
+        def source(times):
+            first = int(round((times[0] - meta["t0"]) / meta["step"]))
+            rows = np.asarray(data[:, first:first + len(times)])
+            return np.swapaxes(rows[..., :2], 0, 1), np.swapaxes(rows[..., 2:], 0, 1)
+
+        t1 = meta["t0"] + (meta["n_samples"] - 1) * meta["step"]
+        return cls(meta["names"], meta["t0"], t1, meta["step"], source,
+                   block_size=meta["block_size"], max_bytes=max_bytes, dtype=data.dtype)
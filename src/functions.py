@@ -9,7 +9,17 @@ et mettre à jour leurs positions dans l'animation.
 @date 2025-02-22
 """
 
+import time
+from collections import deque
+
 import numpy as np
+import matplotlib.colors as mcolors
+from matplotlib.lines import Line2D
+
+from kepler import KeplerPropagator
+from orbits import OrbitCollection
+from profiling import NULL_PROFILER
+from spatial import ScreenIndex
 
 def get_orbit(a, e, num_points=200):
     """
@@ -29,37 +39,320 @@ def get_orbit(a, e, num_points=200):
     x = r * np.cos(theta)
     y = r * np.sin(theta)
     return x, y
-def update(frame, planets, moons, planet_plots, moon_plots, planets_with_moons):
+def draw_background(ax, sun, planets, moons):
+    """
+    @brief Dessine le décor fixe : Soleil, orbites et légende.
+
+
+    Les axes sont configurés (fond noir, échelle, titre) à partir des planètes affichées.
+    La légende est construite avec des marqueurs témoins, indépendants des objets
+    graphiques des corps.
+
+    @param ax: Axes Matplotlib.
+    @param sun: L'objet Star.
+    @param planets: Liste des objets Planet.
+    @param moons: Liste des objets Moon.
+
+    @return: (facteur d'échelle utilisé pour la taille des corps, OrbitCollection des orbites).
+    """
+    # Calcul des paramètres d'affichage
+    max_distance = max(planet.semi_major_axis for planet in planets)
+    scale_factor = max(planet.diameter_km for planet in planets) / 10
+    max_orbit_radius = max_distance * 1.2
+
+    ax.figure.patch.set_facecolor('black')
+    ax.set_facecolor('black')
+    ax.set_xlim(-max_orbit_radius, max_orbit_radius)
+    ax.set_ylim(-max_orbit_radius, max_orbit_radius)
+    ax.set_aspect('equal')
+    ax.set_xticks([])
+    ax.set_yticks([])
+    ax.set_title("Système Solaire (simplifié)", color='white')
+
+    # Ajout du Soleil
+    sun_plot, = ax.plot(0, 0, 'o', markersize=sun.get_scaled_size(scale_factor, star_reduction_factor=25), label=sun.name, color=sun.color)
+
+    # Ajout des orbites : un seul LineCollection, recalculé quand le zoom demande plus de détail
+    orbits = OrbitCollection(ax, [planet.semi_major_axis for planet in planets], [planet.eccentricity for planet in planets],
+                             colors=[mcolors.to_rgba(planet.color, alpha=0.3) for planet in planets],
+                             linestyles='--', alpha=0.5)
+
+    # Légende
+    handles = [sun_plot] + [
+        Line2D([], [], marker='o', linestyle='', label=body.name, markersize=body.get_scaled_size(scale_factor), color=body.color)
+        for body in list(planets) + list(moons)
+    ]
+    ax.legend(handles=handles, loc='upper left', bbox_to_anchor=(1, 1), facecolor='white', edgecolor='white', frameon=True, labelspacing=1.2, fontsize='large')
+    return scale_factor, orbits
+
+
+def draw_scene(ax, sun, planets, moons):
+    """
+    @brief Dessine le décor et crée un objet graphique Line2D par corps.
+
+
+    @param ax: Axes Matplotlib.
+    @param sun: L'objet Star.
+    @param planets: Liste des objets Planet.
+    @param moons: Liste des objets Moon.
+
+    @return: Dictionnaires des objets graphiques des planètes et des lunes, indexés par nom, et OrbitCollection des orbites.
+    """
+    scale_factor, orbits = draw_background(ax, sun, planets, moons)
+
+    planet_plots = {}
+    moon_plots = {}
+    for planet in planets:
+        planet_plots[planet.name], = ax.plot([], [], 'o', label=planet.name, markersize=planet.get_scaled_size(scale_factor), color=planet.color)
+    for moon in moons:
+        moon_plots[moon.name], = ax.plot([], [], 'o', color=moon.color, markersize=moon.get_scaled_size(scale_factor), label=moon.name)
+    return planet_plots, moon_plots, orbits
+
+
+def draw_bodies(ax, propagator, scale_factor):
+    """
+    @brief Crée un unique nuage de points (PathCollection) pour tous les corps du propagateur.
+
+
+    Chaque image ne met alors à jour qu'un seul objet graphique, par un tableau de positions.
+
+    @param ax: Axes Matplotlib.
+    @param propagator: KeplerPropagator des corps affichés (l'ordre des points est celui de propagator.names).
+    @param scale_factor: Facteur d'échelle renvoyé par draw_background.
+
+    @return: Le PathCollection, marqué comme animé.
+    """
+    bodies = list(propagator.planets) + list(propagator.moons)
+    # La taille d'un point de scatter est l'aire du marqueur, en points²
+    sizes = [body.get_scaled_size(scale_factor) ** 2 for body in bodies]
+    colors = [body.color for body in bodies]
+    return ax.scatter(np.zeros(len(bodies)), np.zeros(len(bodies)), s=sizes, c=colors, marker='o', linewidths=0, animated=True)
+
+
+class FpsCounter:
+    """
+    @class FpsCounter
+    @brief Compteur d'images par seconde affiché dans un coin des axes.
+
+    La fréquence est la moyenne glissante des intervalles entre les dernières images.
+
+    @param ax: Axes Matplotlib où afficher le compteur.
+    @param window: Nombre d'images de la moyenne glissante.
+    """
+    def __init__(self, ax, window=60):
+        self.times = deque(maxlen=window)
+        self.text = ax.text(0.02, 0.02, "", transform=ax.transAxes, color='white', animated=True)
+
+    @property
+    def fps(self):
+        """
+        @brief Fréquence d'images mesurée (0 tant que deux images n'ont pas été vues).
+        """
+        if len(self.times) < 2:
+            return 0.0
+        return (len(self.times) - 1) / (self.times[-1] - self.times[0])
+
+    def tick(self):
+        """
+        @brief Enregistre une image et met à jour le texte affiché.
+
+        @return: L'objet texte du compteur.
+        """
+        self.times.append(time.perf_counter())
+        self.text.set_text("%.1f img/s" % self.fps)
+        return self.text
+
+
+class BodyPicker:
     """
-    @brief Met à jour la position des planètes et de la lune à chaque frame.
+    @class BodyPicker
+    @brief Nom du corps sous le curseur, zoom à la molette et déplacement de la vue en glissant.
+
+    Les positions des corps à l'écran sont rangées à chaque image dans un ScreenIndex
+    (spatial.py) : le corps sous le curseur est trouvé sans parcourir tous les corps.
+    Le zoom se fait autour du curseur et le glissement au bouton gauche (hors des modes
+    de la barre d'outils) ; la figure est alors redessinée aussitôt, pour que le décor
+    mis en cache par le blitting corresponde à la nouvelle vue.
+
+    @param ax: Axes Matplotlib.
+    @param names: Noms des corps, dans l'ordre des positions.
+    @param bodies: PathCollection créé par draw_bodies (pour la taille des marqueurs).
+    """
+    def __init__(self, ax, names, bodies):
+        self.ax = ax
+        self.names = list(names)
+        # Rayon des marqueurs en pixels : la taille d'un point de scatter est l'aire en points²
+        self.radii = np.sqrt(bodies.get_sizes()) / 2 * ax.figure.dpi / 72
+        self.index = ScreenIndex(1, 1)
+        self.mouse = None
+        self._drag = None
+        self.label = ax.text(0, 0, "", color='white', fontsize=8, animated=True, visible=False)
+        canvas = ax.figure.canvas
+        canvas.mpl_connect('motion_notify_event', self._on_motion)
+        canvas.mpl_connect('scroll_event', self._on_scroll)
+        canvas.mpl_connect('button_press_event', self._on_press)
+        canvas.mpl_connect('button_release_event', self._on_release)
+
+    def _on_motion(self, event):
+        self.mouse = (event.x, event.y) if event.inaxes is self.ax else None
+        if self._drag is not None and event.x is not None:
+            x0, y0, xlim, ylim = self._drag
+            to_data = self.ax.transData.inverted()
+            (dx, dy) = to_data.transform((x0, y0)) - to_data.transform((event.x, event.y))
+            self.ax.set_xlim(xlim[0] + dx, xlim[1] + dx)
+            self.ax.set_ylim(ylim[0] + dy, ylim[1] + dy)
+            self.ax.figure.canvas.draw()
+
+    def _on_scroll(self, event):
+        if event.inaxes is not self.ax:
+            return
+        factor = 1 / 1.2 if event.button == 'up' else 1.2
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+        # Le point sous le curseur reste en place
+        self.ax.set_xlim(event.xdata + (x0 - event.xdata) * factor, event.xdata + (x1 - event.xdata) * factor)
+        self.ax.set_ylim(event.ydata + (y0 - event.ydata) * factor, event.ydata + (y1 - event.ydata) * factor)
+        self.ax.figure.canvas.draw()
 
+    def _on_press(self, event):
+        toolbar = self.ax.figure.canvas.toolbar
+        if event.inaxes is self.ax and event.button == 1 and not (toolbar and toolbar.mode):
+            # Les limites sont recalculées à partir de celles du début du glissement
+            self._drag = (event.x, event.y, self.ax.get_xlim(), self.ax.get_ylim())
+
+    def _on_release(self, event):
+        self._drag = None
+
+    def update(self, positions):
+        """
+        @brief Range les positions de l'image courante et place le nom du corps sous le curseur.
+
+        @param positions: Tableau (N, 2) de positions en coordonnées des données.
+        @return: L'objet texte du nom.
+        """
+        bbox = self.ax.bbox
+        if (bbox.width, bbox.height) != (self.index.width, self.index.height):
+            self.index.resize(bbox.width, bbox.height, int(np.ceil(self.radii.max())))
+        screen = self.ax.transData.transform(positions) - (bbox.x0, bbox.y0)
+        self.index.update(screen)
+        picked = -1
+        if self.mouse is not None:
+            picked = self.index.pick(np.subtract(self.mouse, (bbox.x0, bbox.y0)), radii=self.radii)
+        self.label.set_visible(picked >= 0)
+        if picked >= 0:
+            self.label.set_text(" " + self.names[picked])
+            self.label.set_position(positions[picked])
+        return self.label
+
+
+class Playback:
+    """
+    @class Playback
+    @brief Date affichée par l'animation : lecture, pause, défilement et relecture au clavier.
+
+    Espace met en pause ou reprend, Gauche / Droite reculent ou avancent de seek images,
+    b revient au début. Arrivée à t1, la lecture reprend à t0 : avec des éphémérides
+    (ephemeris.py), la plage est rejouée sans rien recalculer.
+
+    @param fig: Figure Matplotlib (reçoit les événements clavier).
+    @param t0: Date de début.
+    @param t1: Date de fin.
+    @param step: Temps simulé entre deux images.
+    @param seek: Nombre d'images sautées par Gauche / Droite.
+    """
+    def __init__(self, fig, t0, t1, step=0.02, seek=10):
+        self.t0 = t0
+        self.t1 = t1
+        self.step = step
+        self.seek = seek
+        self.t = t0
+        self.paused = False
+        fig.canvas.mpl_connect('key_press_event', self._on_key)
 
-    Cette fonction calcule les nouvelles positions des planètes et de la lune et les met à jour dans l'animation.
+    def _on_key(self, event):
+        if event.key == ' ':
+            self.paused = not self.paused
+        elif event.key == 'left':
+            self.t = max(self.t0, self.t - self.seek * self.step)
+        elif event.key == 'right':
+            self.t = min(self.t1, self.t + self.seek * self.step)
+        elif event.key == 'b':
+            self.t = self.t0
+
+    def advance(self):
+        """
+        @brief Renvoie la date de l'image courante et passe à la suivante (sauf en pause).
+
+        @return: Date à afficher.
+        """
+        t = self.t
+        if not self.paused:
+            self.t = t + self.step if t + self.step <= self.t1 else self.t0
+        return t
+
+
+def update_bodies(frame, propagator, bodies, fps=None, profiler=NULL_PROFILER, picker=None, playback=None):
+    """
+    @brief Met à jour le nuage de points de tous les corps à chaque frame.
+
+
+    @param frame: Index de l'animation.
+    @param propagator: KeplerPropagator ou Ephemeris des corps affichés (tout objet doté de positions(t)).
+    @param bodies: PathCollection créé par draw_bodies.
+    @param fps: FpsCounter à mettre à jour (facultatif).
+    @param profiler: Profiler qui chronomètre les phases "propagation" et "artistes" (facultatif).
+    @param picker: BodyPicker qui affiche le nom du corps sous le curseur (facultatif).
+    @param playback: Playback qui fournit la date affichée (facultatif, sinon frame * 0.02).
+
+    @return: Liste des éléments graphiques mis à jour.
+    """
+    t = playback.advance() if playback is not None else frame * 0.02
+    with profiler.phase("propagation"):
+        positions = propagator.positions(t)
+    with profiler.phase("artistes"):
+        bodies.set_offsets(positions)
+    profiler.count("corps", len(positions))
+    artists = [bodies]
+    if picker is not None:
+        with profiler.phase("désignation"):
+            artists.append(picker.update(positions))
+    if fps is not None:
+        artists.append(fps.tick())
+    return artists
+
+
+def update(frame, planets, moons, planet_plots, moon_plots, planets_with_moons, propagator=None,
+           profiler=NULL_PROFILER):
+    """
+    @brief Met à jour la position des planètes et des lunes à chaque frame.
+
+
+    Les positions de tous les corps sont calculées en un seul appel au propagateur
+    képlérien, puis transmises aux objets graphiques.
 
     @param frame: Index de l'animation.
     @param planets: Liste des objets Planet.
-    @param moon: L'objet Moon.
+    @param moons: Liste des objets Moon.
     @param planet_plots: Dictionnaire des objets graphiques des planètes.
-    @param moon_plot: Objet graphique de la lune.
+    @param moon_plots: Dictionnaire des objets graphiques des lunes.
     @param planets_with_moons: liste des planetes avec une lune
+    @param propagator: KeplerPropagator construit pour ces planètes et lunes (recréé à chaque appel s'il est absent).
+    @param profiler: Profiler qui chronomètre les phases "propagation" et "artistes" (facultatif).
 
     @return: Liste des éléments graphiques mis à jour.
     """
     t = frame * 0.02
 
-    for planet in planets:
-        theta = t / planet.period
-        r = (planet.semi_major_axis * (1 - planet.eccentricity**2)) / (1 + planet.eccentricity * np.cos(theta))
-        x = r * np.cos(theta)
-        y = r * np.sin(theta)
-        planet_plots[planet.name].set_data(x, y)
-        if planet in planets_with_moons:
-            for moon in moons:
-                if planet != moon.planet:
-                    pass
-                else:
-                    moon_x = x + moon.orbit_radius * np.cos(moon.orbit_speed * t)
-                    moon_y = y + moon.orbit_radius * np.sin(moon.orbit_speed * t)
-                    moon_plots[moon.name].set_data(moon_x, moon_y)
+    with profiler.phase("propagation"):
+        if propagator is None:
+            propagator = KeplerPropagator(planets, [moon for moon in moons if moon.planet in planets_with_moons])
+        positions = propagator.positions(t)
+
+    with profiler.phase("artistes"):
+        plots = [planet_plots[name] for name in propagator.names[:len(propagator.planets)]]
+        plots += [moon_plots[name] for name in propagator.names[len(propagator.planets):]]
+        for plot, (x, y) in zip(plots, positions):
+            plot.set_data([x], [y])
+    profiler.count("corps", len(positions))
 
     return list(planet_plots.values()) + list(moon_plots.values())
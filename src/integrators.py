@@ -0,0 +1,273 @@
+"""
+@file integrators.py
+@brief Schémas d'intégration interchangeables pour NBodySystem.
+
+Ce fichier contient les intégrateurs utilisables par un NBodySystem :
+Euler semi-implicite (celui de test.py), saute-mouton (vitesse de Verlet),
+le schéma symplectique d'ordre 4 de Yoshida et un schéma à pas de temps par blocs,
+dans lequel les corps rapides (Phobos) font des sous-pas pendant que les corps lents
+(Jupiter) avancent d'un seul grand pas.
+
+La classe DriftMonitor mesure la dérive de l'énergie et du moment cinétique,
+le temps CPU et le nombre d'évaluations de forces, pour comparer les intégrateurs.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import math
+import time
+
+import numpy as np
+
+
+class SemiImplicitEuler:
+    """
+    @class SemiImplicitEuler
+    @brief Euler semi-implicite : la vitesse est mise à jour, puis la position avec la nouvelle vitesse.
+
+    C'est le schéma de CelestialBody.update_position dans test.py (ordre 1).
+    """
+    def step(self, system, dt):
+        """
+        @brief Avance le système d'un pas de temps.
+
+        @param system: Le NBodySystem à faire avancer.
+        @param dt: Pas de temps en secondes.
+        """
+        acc = system.current_accelerations()
+        system.velocities += np.multiply(acc, dt, out=system._delta)
+        system.positions += np.multiply(system.velocities, dt, out=system._delta)
+        system.time += dt
+
+
+class Leapfrog:
+    """
+    @class Leapfrog
+    @brief Saute-mouton « kick-drift-kick » (vitesse de Verlet), symplectique d'ordre 2.
+
+    Une seule évaluation de forces par pas : l'accélération de fin de pas est
+    réutilisée au début du pas suivant.
+    """
+    def step(self, system, dt):
+        """
+        @brief Avance le système d'un pas de temps.
+
+        @param system: Le NBodySystem à faire avancer.
+        @param dt: Pas de temps en secondes.
+        """
+        acc = system.current_accelerations()
+        system.velocities += np.multiply(acc, 0.5 * dt, out=system._delta)
+        system.positions += np.multiply(system.velocities, dt, out=system._delta)
+        system.time += dt
+        acc = system.compute_accelerations()
+        system.velocities += np.multiply(acc, 0.5 * dt, out=system._delta)
+
+
+class Yoshida4(Leapfrog):
+    """
+    @class Yoshida4
+    @brief Schéma symplectique d'ordre 4 de Yoshida (1990).
+
+    Composition de trois pas de saute-mouton de longueurs w1.dt, w0.dt et w1.dt
+    (le pas central est négatif) : trois évaluations de forces par pas.
+    """
+    W1 = 1.0 / (2.0 - 2.0 ** (1.0 / 3.0))
+    W0 = -(2.0 ** (1.0 / 3.0)) * W1
+
+    def step(self, system, dt):
+        """
+        @brief Avance le système d'un pas de temps.
+
+        @param system: Le NBodySystem à faire avancer.
+        @param dt: Pas de temps en secondes.
+        """
+        for weight in (self.W1, self.W0, self.W1):
+            Leapfrog.step(self, system, weight * dt)
+
+
+class BlockTimestep:
+    """
+    @class BlockTimestep
+    @brief Saute-mouton à pas de temps individuels par blocs (puissances de 2).
+
+    Au début de chaque pas, chaque corps reçoit un niveau k tel que dt / 2^k soit
+    inférieur à eta fois son temps dynamique (voir NBodySystem.dynamical_times).
+    Un corps central prend au moins le niveau de ses satellites directs (Mars celui de Phobos) :
+    sinon sa trajectoire, extrapolée en ligne droite sur un grand pas, fausserait
+    complètement l'orbite du satellite. La promotion n'est pas transitive, le Soleil
+    garde donc le niveau de ses planètes.
+    Toutes les positions avancent au rythme du plus petit sous-pas (opération peu coûteuse),
+    mais seules les accélérations des corps dont le sous-pas se termine sont recalculées :
+    Neptune n'est pas évaluée à la cadence de Phobos.
+
+    @param eta Fraction du temps dynamique utilisée comme pas individuel.
+    @param max_level Niveau maximal de subdivision (2^max_level sous-pas au plus).
+    """
+    def __init__(self, eta=0.05, max_level=16):
+        self.eta = eta
+        self.max_level = max_level
+        self.levels = None  # Niveau de chaque corps pendant le dernier pas
+
+    def __getstate__(self):
+        """
+        @brief État enregistré par pickle (points de contrôle) : les réglages seuls, les niveaux sont recalculés à chaque pas.
+        """
+        return dict(self.__dict__, levels=None)
+
+    def assign_levels(self, system, dt):
+        """
+        @brief Choisit le niveau de subdivision de chaque corps.
+
+        @param system: Le NBodySystem.
+        @param dt: Pas de temps global en secondes.
+        @return: Tableau (N,) d'entiers.
+        """
+        times, dominant = system.dynamical_times(return_dominant=True)
+        with np.errstate(divide="ignore"):
+            levels = np.ceil(np.log2(dt / (self.eta * times)))
+        levels = np.clip(levels, 0, self.max_level).astype(np.int64)
+        promoted = levels.copy()
+        np.maximum.at(promoted, dominant, levels)
+        return promoted
+
+    def step(self, system, dt):
+        """
+        @brief Avance le système d'un pas de temps global.
+
+        @param system: Le NBodySystem à faire avancer.
+        @param dt: Pas de temps global en secondes.
+        """
+        levels = self.assign_levels(system, dt)
+        self.levels = levels
+        top = int(levels.max())
+        n_sub = 1 << top
+        h = dt / n_sub
+        own_dt = dt / (2.0 ** levels)
+        period = 1 << (top - levels)  # Nombre de sous-pas entre deux évaluations de chaque corps
+
+        # Demi-impulsion d'ouverture pour tous les corps
+        acc = system.current_accelerations()
+        system.velocities += 0.5 * own_dt[:, np.newaxis] * acc
+        for s in range(1, n_sub + 1):
+            system.positions += np.multiply(system.velocities, h, out=system._delta)
+            system.time += h
+            if s == n_sub:
+                # Fin du pas global : tous les corps se synchronisent (demi-impulsion de fermeture)
+                acc = system.compute_accelerations()
+                system.velocities += 0.5 * own_dt[:, np.newaxis] * acc
+            else:
+                active = np.flatnonzero(s % period == 0)
+                if len(active):
+                    # Fermeture du sous-pas courant et ouverture du suivant
+                    acc = system.compute_accelerations(targets=active)
+                    system.velocities[active] += own_dt[active, np.newaxis] * acc[active]
+
+
+class DriftMonitor:
+    """
+    @class DriftMonitor
+    @brief Compteurs de dérive de l'énergie et du moment cinétique d'un NBodySystem.
+
+    Les valeurs de référence et les compteurs de coût sont relevés à la création.
+
+    @param system Le NBodySystem surveillé.
+    """
+    def __init__(self, system):
+        self.system = system
+        self.reset()
+
+    def reset(self):
+        """
+        @brief Relève les valeurs de référence à l'état courant.
+        """
+        self.energy0 = self.system.total_energy()
+        self.angular_momentum0 = self.system.angular_momentum()
+        self.force_evaluations0 = self.system.force_evaluations
+        self.cpu0 = time.process_time()
+        self.max_energy_drift = 0.0
+        self.max_angular_momentum_drift = 0.0
+
+    def sample(self):
+        """
+        @brief Mesure les dérives relatives depuis la référence.
+
+        @return: Dictionnaire energy_drift, angular_momentum_drift (relatives, courantes et maximales),
+        cpu_time (s) et force_evaluations.
+        """
+        energy_drift = abs((self.system.total_energy() - self.energy0) / self.energy0)
+        angular_momentum_drift = abs(
+            (self.system.angular_momentum() - self.angular_momentum0) / self.angular_momentum0)
+        self.max_energy_drift = max(self.max_energy_drift, energy_drift)
+        self.max_angular_momentum_drift = max(self.max_angular_momentum_drift, angular_momentum_drift)
+        return {
+            "energy_drift": energy_drift,
+            "max_energy_drift": self.max_energy_drift,
+            "angular_momentum_drift": angular_momentum_drift,
+            "max_angular_momentum_drift": self.max_angular_momentum_drift,
+            "cpu_time": time.process_time() - self.cpu0,
+            "force_evaluations": self.system.force_evaluations - self.force_evaluations0,
+        }
+
+
+def compare_integrators(make_system, integrators, duration, dt, samples=20):
+    """
+    @brief Fait tourner un même scénario avec plusieurs intégrateurs et relève dérives et coût.
+
+    @param make_system: Fonction sans argument qui construit un NBodySystem neuf (intégrateur en argument nommé).
+    @param integrators: Dictionnaire nom -> intégrateur.
+    @param duration: Durée simulée en secondes.
+    @param dt: Pas de temps global en secondes.
+    @param samples: Nombre de mesures de dérive pendant la simulation.
+    @return: Dictionnaire nom -> dernier relevé de DriftMonitor.sample().
+    """
+    results = {}
+    n_steps = int(math.ceil(duration / dt))
+    every = max(1, n_steps // samples)
+    for name, integrator in integrators.items():
+        system = make_system(integrator=integrator)
+        monitor = DriftMonitor(system)
+        report = monitor.sample()
+        for i in range(1, n_steps + 1):
+            system.step(dt)
+            if i % every == 0 or i == n_steps:
+                report = monitor.sample()
+        results[name] = report
+    return results
+
+
+if __name__ == "__main__":
+    from nbody import reference_scenario, TIME_STEP
+
+    def phobos_error(system):
+        """
+        @brief Écart relatif de la distance Phobos-Mars par rapport à sa valeur initiale (9380 km).
+        """
+        d = system.positions[system.index("Phobos")] - system.positions[system.index("Mars")]
+        return abs(math.hypot(*d) - 9.38e6) / 9.38e6
+
+    systems = {}
+
+    def make_system(integrator):
+        system = reference_scenario(integrator=integrator)
+        systems[type(integrator).__name__] = system
+        return system
+
+    print("Scénario de référence, 1 an, pas global d'un jour")
+    print("| Intégrateur      | Dérive énergie max | Dérive moment cinétique max | Orbite de Phobos | CPU     | Évaluations |")
+    print("|------------------|--------------------|-----------------------------|------------------|---------|-------------|")
+    results = compare_integrators(
+        make_system,
+        {
+            "Euler": SemiImplicitEuler(),
+            "Leapfrog": Leapfrog(),
+            "Yoshida4": Yoshida4(),
+            "Blocs (eta=0.05)": BlockTimestep(eta=0.05),
+        },
+        duration=365 * TIME_STEP,
+        dt=TIME_STEP,
+    )
+    for (name, report), system in zip(results.items(), systems.values()):
+        print("| %-16s | %18.2e | %27.2e | %16.1e | %5.2f s | %11d |" % (
+            name, report["max_energy_drift"], report["max_angular_momentum_drift"],
+            phobos_error(system), report["cpu_time"], report["force_evaluations"]))
@@ -0,0 +1,146 @@
+"""
+@file kepler.py
+@brief Propagateur képlérien vectorisé pour les planètes et leurs lunes.
+
+Ce fichier contient la classe KeplerPropagator, qui stocke les éléments orbitaux
+de toutes les planètes et lunes dans des tableaux NumPy, et la fonction solve_kepler,
+qui résout l'équation de Kepler M = E - e sin(E) par la méthode de Newton pour
+tous les corps à la fois.
+
+Une seule évaluation donne la position de chaque corps pour une date, ou pour
+tout un lot de dates. La relation lune -> planète est un tableau d'indices.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+
+
+def solve_kepler(mean_anomaly, eccentricity, tol=1e-12, max_iter=30):
+    """
+    @brief Résout l'équation de Kepler M = E - e sin(E) par la méthode de Newton.
+
+    Toutes les valeurs sont traitées simultanément ; l'itération s'arrête dès que
+    la plus grande correction est inférieure à tol.
+
+    @param mean_anomaly: Anomalies moyennes en radians (tableau de forme quelconque).
+    @param eccentricity: Excentricités (0 <= e < 1), diffusables avec mean_anomaly.
+    @param tol: Tolérance sur E en radians.
+    @param max_iter: Nombre maximal d'itérations.
+    @return: Anomalies excentriques E en radians.
+    """
+    M = np.remainder(mean_anomaly, 2 * np.pi)
+    e = np.broadcast_to(eccentricity, M.shape)
+    # Point de départ robuste pour les fortes excentricités
+    E = np.where(e < 0.8, M, np.pi)
+    for _ in range(max_iter):
+        delta = (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+        E = E - delta
+        if np.max(np.abs(delta), initial=0.0) < tol:
+            break
+    return E
+
+
+class KeplerPropagator:
+    """
+    @class KeplerPropagator
+    @brief Positions des planètes (orbites képlériennes) et des lunes (orbites circulaires) à partir de tableaux.
+
+    Les corps sont rangés planètes d'abord, lunes ensuite, dans l'ordre des listes données.
+    Les lunes dont la planète n'est pas dans la liste des planètes sont ignorées.
+
+    L'anomalie moyenne vaut t / période : le mouvement moyen est celui de l'ancienne
+    animation (anomalie vraie égale à t / période), mais la vitesse varie désormais
+    le long de l'orbite conformément à la deuxième loi de Kepler.
+
+    @param planets Liste des objets Planet.
+    @param moons Liste des objets Moon.
+    """
+    def __init__(self, planets, moons=()):
+        planets = list(planets)
+        moons = [moon for moon in moons if any(moon.planet == planet for planet in planets)]
+        self.planets = planets
+        self.moons = moons
+        self.names = [planet.name for planet in planets] + [moon.name for moon in moons]
+
+        self.semi_major_axis = np.array([planet.semi_major_axis for planet in planets], dtype=float)
+        self.eccentricity = np.array([planet.eccentricity for planet in planets], dtype=float)
+        self.period = np.array([planet.period for planet in planets], dtype=float)
+        self.semi_minor_axis = self.semi_major_axis * np.sqrt(1 - self.eccentricity ** 2)
+
+        self.moon_radius = np.array([moon.orbit_radius for moon in moons], dtype=float)
+        self.moon_speed = np.array([moon.orbit_speed for moon in moons], dtype=float)
+        # Indice de la planète de chaque lune dans le tableau des planètes
+        self.moon_parent = np.array(
+            [next(i for i, planet in enumerate(planets) if moon.planet == planet) for moon in moons],
+            dtype=np.int64)
+
+    def __len__(self):
+        return len(self.names)
+
+    def index(self, name):
+        """
+        @brief Renvoie l'indice d'un corps dans les tableaux de positions.
+
+        @param name: Nom du corps.
+        @return: Indice du corps.
+        """
+        return self.names.index(name)
+
+    def positions(self, t):
+        """
+        @brief Calcule la position de tous les corps à une ou plusieurs dates.
+
+        @param t: Date (scalaire) ou tableau de T dates, dans l'unité de temps des périodes.
+        @return: Tableau (N, 2) pour une date, (T, N, 2) pour un tableau de dates.
+        """
+        t = np.asarray(t, dtype=float)
+        scalar = t.ndim == 0
+        t = np.atleast_1d(t)[:, np.newaxis]
+
+        E = solve_kepler(t / self.period, self.eccentricity)
+        planet_x = self.semi_major_axis * (np.cos(E) - self.eccentricity)
+        planet_y = self.semi_minor_axis * np.sin(E)
+
+        angle = self.moon_speed * t
+        moon_x = planet_x[:, self.moon_parent] + self.moon_radius * np.cos(angle)
+        moon_y = planet_y[:, self.moon_parent] + self.moon_radius * np.sin(angle)
+
+        out = np.empty((t.shape[0], len(self.names), 2))
+        n_planets = len(self.planets)
+        out[:, :n_planets, 0] = planet_x
+        out[:, :n_planets, 1] = planet_y
+        out[:, n_planets:, 0] = moon_x
+        out[:, n_planets:, 1] = moon_y
+        return out[0] if scalar else out
+
+    def velocities(self, t):
+        """
+        @brief Calcule la vitesse de tous les corps à une ou plusieurs dates.
+
+        @param t: Date (scalaire) ou tableau de T dates, dans l'unité de temps des périodes.
+        @return: Tableau (N, 2) pour une date, (T, N, 2) pour un tableau de dates,
+        en unités de longueur par unité de temps.
+        """
+        t = np.asarray(t, dtype=float)
+        scalar = t.ndim == 0
+        t = np.atleast_1d(t)[:, np.newaxis]
+
+        E = solve_kepler(t / self.period, self.eccentricity)
+        # dE/dt = n / (1 - e cos E), avec un mouvement moyen n = 1 / période
+        rate = 1.0 / (self.period * (1 - self.eccentricity * np.cos(E)))
+        planet_vx = -self.semi_major_axis * np.sin(E) * rate
+        planet_vy = self.semi_minor_axis * np.cos(E) * rate
+
+        angle = self.moon_speed * t
+        moon_vx = planet_vx[:, self.moon_parent] - self.moon_radius * self.moon_speed * np.sin(angle)
+        moon_vy = planet_vy[:, self.moon_parent] + self.moon_radius * self.moon_speed * np.cos(angle)
+
+        out = np.empty((t.shape[0], len(self.names), 2))
+        n_planets = len(self.planets)
+        out[:, :n_planets, 0] = planet_vx
+        out[:, :n_planets, 1] = planet_vy
+        out[:, n_planets:, 0] = moon_vx
+        out[:, n_planets:, 1] = moon_vy
+        return out[0] if scalar else out
@@ -0,0 +1,508 @@
+"""
+@file nbody.py
+@brief Moteur de simulation N-corps vectorisé avec NumPy.
+
+Ce fichier contient la classe NBodySystem, qui stocke positions, vitesses et masses
+dans des tableaux contigus et calcule toutes les accélérations gravitationnelles
+en une seule passe vectorisée. Les tampons de travail sont alloués une seule fois
+et réutilisés à chaque pas : la boucle de simulation n'alloue pas de mémoire.
+
+Le module est indépendant de pygame, test.py n'en est qu'un affichage possible.
+Le scénario de référence (Soleil, Terre, Mars, Jupiter et leurs lunes) est celui
+que test.py affiche (voir reference_state).
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import math
+import time
+
+import numpy as np
+
+from integrators import SemiImplicitEuler
+from state import SystemState, KIND_STAR, KIND_PLANET, KIND_MOON
+
+# Constantes
+G = 6.67430e-11
+TIME_STEP = 3600 * 24  # 1 jour en secondes
+
+
+class DirectSolver:
+    """
+    @class DirectSolver
+    @brief Calcul exact des accélérations par sommation directe sur toutes les paires, en O(N²).
+
+    Les tampons de travail (N, N) sont conservés d'un appel à l'autre et ne sont
+    réalloués que si le nombre de corps change.
+    """
+    def __init__(self):
+        self._n = -1
+
+    def __getstate__(self):
+        """
+        @brief État enregistré par pickle (points de contrôle) : sans les tampons, réalloués au premier appel.
+        """
+        return {"_n": -1}
+
+    def _allocate_buffers(self, n):
+        """
+        @brief Alloue les tampons de travail pour n corps.
+
+        @param n: Nombre de corps.
+        """
+        self._n = n
+        self._dx = np.empty((n, n))
+        self._dy = np.empty((n, n))
+        self._r2 = np.empty((n, n))
+        self._tmp = np.empty((n, n))
+
+    def accelerations(self, positions, masses, softening, out, targets=None):
+        """
+        @brief Calcule les accélérations de tous les corps en une seule passe.
+
+        Les différences de positions et les termes m/r³ de toutes les paires sont
+        calculés dans des tampons préalloués, puis réduits ligne par ligne.
+
+        @param positions: Positions en mètres, tableau (N, 2).
+        @param masses: Masses en kilogrammes, tableau (N,).
+        @param softening: Longueur d'adoucissement en mètres.
+        @param out: Tableau (N, 2) qui reçoit les accélérations en m/s².
+        @param targets: Indices des corps dont on veut l'accélération (tous par défaut) ;
+        les autres lignes de out ne sont pas modifiées.
+        @return: Le tableau out.
+        """
+        if targets is not None:
+            return self._partial_accelerations(positions, masses, softening, out, targets)
+        n = len(masses)
+        if n != self._n:
+            self._allocate_buffers(n)
+        x = positions[:, 0]
+        y = positions[:, 1]
+        dx, dy, r2, tmp = self._dx, self._dy, self._r2, self._tmp
+
+        np.subtract(x[np.newaxis, :], x[:, np.newaxis], out=dx)
+        np.subtract(y[np.newaxis, :], y[:, np.newaxis], out=dy)
+        np.multiply(dx, dx, out=r2)
+        np.multiply(dy, dy, out=tmp)
+        r2 += tmp
+        r2 += softening ** 2
+        # Pas d'auto-interaction : 1/r³ vaut 0 sur la diagonale
+        np.fill_diagonal(r2, np.inf)
+        np.sqrt(r2, out=tmp)
+        tmp *= r2
+        np.divide(G, tmp, out=tmp)
+        tmp *= masses[np.newaxis, :]
+
+        # a_i = somme_j G m_j (x_j - x_i) / r_ij³
+        np.sum(np.multiply(tmp, dx, out=dx), axis=1, out=out[:, 0])
+        np.sum(np.multiply(tmp, dy, out=dy), axis=1, out=out[:, 1])
+        return out
+
+    def _partial_accelerations(self, positions, masses, softening, out, targets):
+        """
+        @brief Calcule les accélérations d'un sous-ensemble de corps (pas de temps par blocs).
+
+        @param positions: Positions en mètres, tableau (N, 2).
+        @param masses: Masses en kilogrammes, tableau (N,).
+        @param softening: Longueur d'adoucissement en mètres.
+        @param out: Tableau (N, 2) dont les lignes targets sont remplies.
+        @param targets: Indices des corps cibles.
+        @return: Le tableau out.
+        """
+        dx = positions[np.newaxis, :, 0] - positions[targets, np.newaxis, 0]
+        dy = positions[np.newaxis, :, 1] - positions[targets, np.newaxis, 1]
+        r2 = dx * dx + dy * dy + softening ** 2
+        r2[np.arange(len(targets)), targets] = np.inf
+        f = G * masses / (r2 * np.sqrt(r2))
+        out[targets, 0] = (f * dx).sum(axis=1)
+        out[targets, 1] = (f * dy).sum(axis=1)
+        return out
+
+
+class NBodySystem:
+    """
+    @class NBodySystem
+    @brief Système de corps en interaction gravitationnelle, stocké en tableaux contigus.
+
+    @param names Noms des corps.
+    @param positions Positions initiales en mètres, tableau (N, 2).
+    @param velocities Vitesses initiales en m/s, tableau (N, 2).
+    @param masses Masses en kilogrammes, tableau (N,).
+    @param softening Longueur d'adoucissement en mètres (0 par défaut, comme test.py).
+    @param solver Méthode de calcul des forces (DirectSolver par défaut, ou BarnesHutSolver).
+    @param integrator Schéma d'intégration (SemiImplicitEuler par défaut, comme test.py).
+    """
+    def __init__(self, names, positions, velocities, masses, softening=0.0, solver=None,
+                 integrator=None):
+        self.names = list(names)
+        self.positions = np.array(positions, dtype=np.float64).reshape(-1, 2)
+        self.velocities = np.array(velocities, dtype=np.float64).reshape(-1, 2)
+        self.masses = np.array(masses, dtype=np.float64).reshape(-1)
+        self.softening = softening
+        self.solver = solver if solver is not None else DirectSolver()
+        self.integrator = integrator if integrator is not None else SemiImplicitEuler()
+        self.time = 0.0
+        self.force_evaluations = 0  # Nombre d'accélérations individuelles calculées
+        self._acc_time = None  # Date à laquelle self.accelerations a été calculé
+        self.state = None  # SystemState dont les tableaux sont partagés (voir from_state)
+        self._allocate_buffers()
+
+    @classmethod
+    def from_state(cls, state, softening=0.0, solver=None, integrator=None):
+        """
+        @brief Crée un système qui travaille directement sur les tableaux d'un SystemState.
+
+        Les positions, vitesses et masses ne sont pas copiées : faire avancer le système met
+        à jour le SystemState, donc aussi les objets Star, Planet et Moon qui le regardent.
+        Le SystemState ne doit plus recevoir de corps tant que le système est utilisé.
+
+        @param state: Le SystemState (positions en mètres, vitesses en m/s, masses en kg).
+        @param softening: Longueur d'adoucissement en mètres.
+        @param solver: Méthode de calcul des forces.
+        @param integrator: Schéma d'intégration.
+        @return: Objet NBodySystem.
+        """
+        if np.isnan(state.mass).any():
+            raise ValueError("Tous les corps du SystemState doivent avoir une masse")
+        system = cls.__new__(cls)
+        system.names = [state.name(i) for i in range(len(state))]
+        system.positions = state.position
+        system.velocities = state.velocity
+        system.masses = state.mass
+        system.softening = softening
+        system.solver = solver if solver is not None else DirectSolver()
+        system.integrator = integrator if integrator is not None else SemiImplicitEuler()
+        system.time = 0.0
+        system.force_evaluations = 0
+        system._acc_time = None
+        system.state = state
+        system._allocate_buffers()
+        return system
+
+    def _allocate_buffers(self):
+        """
+        @brief Alloue les tampons de travail réutilisés d'un pas à l'autre.
+        """
+        n = len(self.masses)
+        self.accelerations = np.zeros((n, 2))
+        self._delta = np.empty((n, 2))
+
+    def __len__(self):
+        return len(self.masses)
+
+    def index(self, name):
+        """
+        @brief Renvoie l'indice du corps portant ce nom.
+
+        @param name: Nom du corps.
+        @return: Indice du corps dans les tableaux.
+        """
+        return self.names.index(name)
+
+    def compute_accelerations(self, targets=None):
+        """
+        @brief Calcule les accélérations avec le solveur choisi.
+
+        @param targets: Indices des corps à mettre à jour (tous par défaut).
+        @return: Tableau (N, 2) des accélérations en m/s².
+        """
+        self.solver.accelerations(self.positions, self.masses, self.softening,
+                                  out=self.accelerations, targets=targets)
+        if targets is None:
+            self.force_evaluations += len(self.masses)
+            self._acc_time = self.time
+        else:
+            self.force_evaluations += len(targets)
+            self._acc_time = None
+        return self.accelerations
+
+    def current_accelerations(self):
+        """
+        @brief Renvoie les accélérations à la date courante, sans les recalculer si elles sont à jour.
+
+        Les schémas symplectiques réutilisent ainsi la dernière évaluation du pas précédent.
+        Après une modification directe des positions ou des masses, appeler invalidate().
+
+        @return: Tableau (N, 2) des accélérations en m/s².
+        """
+        if self._acc_time != self.time:
+            self.compute_accelerations()
+        return self.accelerations
+
+    def invalidate(self):
+        """
+        @brief Signale que positions ou masses ont été modifiées hors de l'intégrateur.
+        """
+        self._acc_time = None
+
+    def remove(self, indices):
+        """
+        @brief Retire des corps du système (après une fusion, par exemple).
+
+        Les indices des corps suivants sont décalés ; les tampons sont réalloués. Un système
+        créé par from_state retire aussi les corps de son SystemState et reste lié à ses tableaux.
+
+        @param indices: Indices des corps à retirer.
+        """
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        if len(indices) == 0:
+            return
+        removed = set(indices.tolist())
+        self.names = [name for i, name in enumerate(self.names) if i not in removed]
+        if self.state is not None:
+            self.state.remove(indices)
+            self.positions = self.state.position
+            self.velocities = self.state.velocity
+            self.masses = self.state.mass
+        else:
+            self.positions = np.delete(self.positions, indices, axis=0)
+            self.velocities = np.delete(self.velocities, indices, axis=0)
+            self.masses = np.delete(self.masses, indices)
+        self._allocate_buffers()
+        self.invalidate()
+
+    def step(self, dt=TIME_STEP):
+        """
+        @brief Avance la simulation d'un pas de temps avec l'intégrateur choisi.
+
+        @param dt: Pas de temps en secondes.
+        """
+        self.integrator.step(self, dt)
+
+    def run(self, n_steps, dt=TIME_STEP):
+        """
+        @brief Avance la simulation de plusieurs pas de temps.
+
+        @param n_steps: Nombre de pas.
+        @param dt: Pas de temps en secondes.
+        """
+        for _ in range(n_steps):
+            self.step(dt)
+
+    def kinetic_energy(self):
+        """
+        @brief Calcule l'énergie cinétique totale.
+
+        @return: Énergie en joules.
+        """
+        return 0.5 * float(np.sum(self.masses * np.einsum("ij,ij->i", self.velocities, self.velocities)))
+
+    def potential_energy(self, chunk_size=256):
+        """
+        @brief Calcule l'énergie potentielle gravitationnelle totale, par blocs de lignes.
+
+        @param chunk_size: Nombre de lignes de la matrice des paires traitées ensemble.
+        @return: Énergie en joules.
+        """
+        total = 0.0
+        n = len(self.masses)
+        for begin in range(0, n, chunk_size):
+            rows = np.arange(begin, min(begin + chunk_size, n))
+            d = self.positions[np.newaxis, :, :] - self.positions[rows, np.newaxis, :]
+            r = np.sqrt(np.einsum("ijk,ijk->ij", d, d) + self.softening ** 2)
+            # Chaque paire n'est comptée qu'une fois (j > i)
+            r[np.arange(n)[np.newaxis, :] <= rows[:, np.newaxis]] = np.inf
+            total -= G * float(np.sum(self.masses[rows, np.newaxis] * self.masses / r))
+        return total
+
+    def total_energy(self):
+        """
+        @brief Calcule l'énergie mécanique totale (cinétique + potentielle).
+
+        @return: Énergie en joules.
+        """
+        return self.kinetic_energy() + self.potential_energy()
+
+    def angular_momentum(self):
+        """
+        @brief Calcule le moment cinétique total (composante z, le modèle étant plan).
+
+        @return: Moment cinétique en kg.m²/s.
+        """
+        x, y = self.positions[:, 0], self.positions[:, 1]
+        vx, vy = self.velocities[:, 0], self.velocities[:, 1]
+        return float(np.sum(self.masses * (x * vy - y * vx)))
+
+    def dynamical_times(self, chunk_size=256, return_dominant=False):
+        """
+        @brief Calcule le temps dynamique sqrt(r³ / G(m_i + m_j)) de la paire qui domine l'accélération de chaque corps.
+
+        Ce temps vaut période / 2π pour l'orbite principale du corps : Phobos autour de Mars,
+        mais Mars autour du Soleil (l'attraction de Phobos sur Mars est négligeable).
+
+        @param chunk_size: Nombre de lignes de la matrice des paires traitées ensemble.
+        @param return_dominant: Renvoie aussi l'indice du corps dominant de chaque corps.
+        @return: Tableau (N,) de temps en secondes (et tableau (N,) d'indices si demandé).
+        """
+        n = len(self.masses)
+        times = np.empty(n)
+        dominants = np.empty(n, dtype=np.int64)
+        for begin in range(0, n, chunk_size):
+            rows = np.arange(begin, min(begin + chunk_size, n))
+            local = np.arange(len(rows))
+            d = self.positions[np.newaxis, :, :] - self.positions[rows, np.newaxis, :]
+            r2 = np.einsum("ijk,ijk->ij", d, d) + self.softening ** 2
+            r2[local, rows] = np.inf
+            dominant = np.argmax(self.masses[np.newaxis, :] / r2, axis=1)
+            r2 = r2[local, dominant]
+            times[rows] = np.sqrt(r2 * np.sqrt(r2) / (G * (self.masses[rows] + self.masses[dominant])))
+            dominants[rows] = dominant
+        if return_dominant:
+            return times, dominants
+        return times
+
+
+def circular_velocity(central_mass, distance):
+    """
+    @brief Calcule la vitesse d'une orbite circulaire.
+
+    @param central_mass: Masse du corps central en kilogrammes.
+    @param distance: Rayon de l'orbite en mètres.
+    @return: Vitesse orbitale en m/s.
+    """
+    return math.sqrt(G * central_mass / distance)
+
+
+def reference_state(state=None):
+    """
+    @brief Construit les corps de test.py (le scénario de référence) dans un SystemState.
+
+    Soleil, Terre, Mars et Jupiter avec leurs positions et vitesses initiales, puis la Lune,
+    Phobos et Deimos placés au-dessus de leur planète (angle de 90°) sur une orbite circulaire.
+    La vitesse d'une lune inclut celle de sa planète : la lune reste liée à sa planète sans
+    réduire les autres forces, et le système se simule en N-corps pur. La taille (rayon
+    d'affichage en pixels) et la couleur (RVB) sont celles de la fenêtre pygame ; le diamètre
+    réel sert à la détection des collisions.
+
+    @param state: SystemState qui reçoit les corps (un nouveau par défaut).
+    @return: Le SystemState.
+    """
+    state = state if state is not None else SystemState()
+    # (nom, nature, position en m, vitesse en m/s, masse en kg, taille, diamètre en km, couleur)
+    for name, kind, position, velocity, mass, size, diameter_km, color in (
+        ("Soleil", KIND_STAR, (0, 0), (0, 0), 1.989e30, 30, 1392700, (255, 255, 0)),
+        ("Terre", KIND_PLANET, (1.5e11, 0), (0, 29780), 5.972e24, 10, 12742, (0, 0, 255)),
+        ("Mars", KIND_PLANET, (2.28e11, 0), (0, 24070), 6.39e23, 7, 6779, (255, 0, 0)),
+        ("Jupiter", KIND_PLANET, (7.78e11, 0), (0, 13070), 1.898e27, 20, 139820, (255, 165, 0)),
+    ):
+        state.add(kind, name, color=color, position=position, velocity=velocity, mass=mass, size=size,
+                  diameter_km=diameter_km)
+
+    # (nom, planète, distance en m, masse en kg, taille, diamètre en km)
+    for name, planet, distance, mass, size, diameter_km in (
+        ("Lune", "Terre", 3.84e8, 7.35e22, 3, 3474),
+        ("Phobos", "Mars", 9.38e6, 1.07e16, 2, 22.4),
+        ("Deimos", "Mars", 2.34e7, 1.48e15, 2, 12.4),
+    ):
+        p = state.index(planet)
+        v = circular_velocity(state.mass[p], distance)
+        x, y = state.position[p]
+        vx, vy = state.velocity[p]
+        state.add(KIND_MOON, name, color=(128, 128, 128), parent=p, position=(x, y + distance),
+                  velocity=(vx - v, vy), mass=mass, size=size, diameter_km=diameter_km)
+    return state
+
+
+def reference_scenario(softening=0.0, solver=None, integrator=None):
+    """
+    @brief Construit le scénario de référence de test.py (voir reference_state).
+
+    @param softening: Longueur d'adoucissement en mètres.
+    @param solver: Solveur de forces (DirectSolver par défaut).
+    @param integrator: Schéma d'intégration (SemiImplicitEuler par défaut).
+    @return: Un NBodySystem, indépendant de tout SystemState.
+    """
+    state = reference_state()
+    return NBodySystem(state.names, state.position, state.velocity, state.mass, softening=softening,
+                       solver=solver, integrator=integrator)
+
+
+def random_scenario(n, seed=0, softening=0.0, solver=None):
+    """
+    @brief Construit un système de n corps : le Soleil et n-1 petits corps en orbite circulaire.
+
+    @param n: Nombre total de corps.
+    @param seed: Graine du générateur aléatoire.
+    @param softening: Longueur d'adoucissement en mètres.
+    @param solver: Solveur de forces (DirectSolver par défaut).
+    @return: Un NBodySystem.
+    """
+    rng = np.random.default_rng(seed)
+    sun_mass = 1.989e30
+    r = rng.uniform(0.3e11, 8e11, n - 1)
+    angle = rng.uniform(0, 2 * np.pi, n - 1)
+    v = np.sqrt(G * sun_mass / r)
+    positions = np.zeros((n, 2))
+    velocities = np.zeros((n, 2))
+    positions[1:, 0] = r * np.cos(angle)
+    positions[1:, 1] = r * np.sin(angle)
+    velocities[1:, 0] = -v * np.sin(angle)
+    velocities[1:, 1] = v * np.cos(angle)
+    masses = np.concatenate(([sun_mass], rng.uniform(1e20, 1e25, n - 1)))
+    names = ["Soleil"] + ["Corps %d" % i for i in range(1, n)]
+    return NBodySystem(names, positions, velocities, masses, softening=softening, solver=solver)
+
+
+def _python_step(positions, velocities, masses, dt):
+    """
+    @brief Pas de simulation en Python pur, paire par paire, comme l'ancien CelestialBody.update_position de test.py.
+
+    Sert uniquement de référence pour mesurer le gain du moteur vectorisé.
+    """
+    n = len(masses)
+    for i in range(n):
+        total_fx = total_fy = 0
+        for j in range(n):
+            if i == j:
+                continue
+            dx = positions[j][0] - positions[i][0]
+            dy = positions[j][1] - positions[i][1]
+            distance = math.sqrt(dx**2 + dy**2)
+            force = (G * masses[i] * masses[j]) / (distance**2)
+            theta = math.atan2(dy, dx)
+            total_fx += math.cos(theta) * force
+            total_fy += math.sin(theta) * force
+        velocities[i][0] += (total_fx / masses[i]) * dt
+        velocities[i][1] += (total_fy / masses[i]) * dt
+        positions[i][0] += velocities[i][0] * dt
+        positions[i][1] += velocities[i][1] * dt
+
+
+def benchmark(sizes=(10, 100, 1000), repeat=5):
+    """
+    @brief Mesure le temps d'un pas de simulation en Python pur et avec NBodySystem.
+
+    @param sizes: Nombres de corps à tester.
+    @param repeat: Nombre de pas mesurés pour chaque taille.
+    @return: Liste de tuples (N, temps Python en s, temps NumPy en s).
+    """
+    results = []
+    for n in sizes:
+        system = random_scenario(n)
+        positions = system.positions.tolist()
+        velocities = system.velocities.tolist()
+        masses = system.masses.tolist()
+
+        python_repeat = max(1, repeat if n <= 100 else 1)
+        start = time.perf_counter()
+        for _ in range(python_repeat):
+            _python_step(positions, velocities, masses, TIME_STEP)
+        python_time = (time.perf_counter() - start) / python_repeat
+
+        system.step()  # Préchauffage
+        start = time.perf_counter()
+        for _ in range(repeat):
+            system.step()
+        numpy_time = (time.perf_counter() - start) / repeat
+
+        results.append((n, python_time, numpy_time))
+    return results
+
+
+if __name__ == "__main__":
+    print("| N    | Python pur  | NBodySystem | Gain   |")
+    print("|------|-------------|-------------|--------|")
+    for n, python_time, numpy_time in benchmark():
+        print("| %-4d | %8.3f ms | %8.3f ms | x%-5.1f |" % (
+            n, python_time * 1e3, numpy_time * 1e3, python_time / numpy_time))
@@ -0,0 +1,245 @@
+"""
+@file orbits.py
+@brief Tracés d'orbites mis en cache, à résolution adaptée au zoom, regroupés dans un seul LineCollection.
+
+Ce fichier contient la classe OrbitPaths, qui calcule les points des ellipses orbitales
+(comme get_orbit de functions.py), et la classe OrbitCollection, qui les affiche toutes
+dans un seul objet graphique Matplotlib.
+
+Les points sont répartis uniformément en anomalie excentrique E : x = a (cos E - e),
+y = b sin E. Ils se resserrent ainsi là où l'ellipse est la plus courbée (au périhélie et
+à l'aphélie), et la flèche entre un segment et l'ellipse ne dépasse pas a ΔE² / 8 quelle
+que soit l'excentricité. Le nombre de points est choisi pour que cette erreur reste sous
+une tolérance en pixels, puis arrondi à une puissance de 2 : un tracé n'est recalculé
+que lorsque le zoom change de niveau de détail, et les courbes sont mémorisées par
+(a, e, résolution).
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import math
+from collections import OrderedDict
+
+import numpy as np
+from matplotlib.collections import LineCollection
+
+MIN_POINTS = 16
+MAX_POINTS = 8192
+
+
+def resolution(a, pixels_per_unit, tolerance=0.25):
+    """
+    @brief Nombre de points (puissance de 2) pour que l'écart entre tracé et ellipse reste sous tolerance pixels.
+
+    @param a: Demi-grand axe (scalaire ou tableau).
+    @param pixels_per_unit: Pixels par unité de longueur à l'écran.
+    @param tolerance: Écart maximal toléré, en pixels.
+    @return: Entier ou tableau d'entiers entre MIN_POINTS et MAX_POINTS.
+    """
+    a_pixels = np.maximum(np.asarray(a, dtype=np.float64) * pixels_per_unit, 1e-9)
+    step = np.sqrt(8 * tolerance / a_pixels)  # ΔE tel que a ΔE² / 8 = tolerance
+    n = np.ceil(2 * np.pi / step) + 1
+    n = 2 ** np.ceil(np.log2(np.clip(n, MIN_POINTS, MAX_POINTS)))
+    return n.astype(np.int64) if n.ndim else int(n)
+
+
+class OrbitPaths:
+    """
+    @class OrbitPaths
+    @brief Calcul et mémorisation des tracés d'orbites elliptiques (foyer à l'origine, périhélie sur +x).
+
+    @param max_entries Nombre maximal de courbes gardées en cache (les moins récemment utilisées sont oubliées).
+    """
+    def __init__(self, max_entries=65536):
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def compute(a, e, n):
+        """
+        @brief Calcule les tracés de plusieurs orbites ayant le même nombre de points.
+
+        @param a: Tableau (k,) de demi-grands axes.
+        @param e: Tableau (k,) d'excentricités.
+        @param n: Nombre de points (le premier et le dernier coïncident pour fermer la courbe).
+        @return: Tableau (k, n, 2).
+        """
+        a = np.asarray(a, dtype=np.float64)[:, np.newaxis]
+        e = np.asarray(e, dtype=np.float64)[:, np.newaxis]
+        anomaly = np.linspace(0, 2 * np.pi, n)
+        paths = np.empty((a.shape[0], n, 2))
+        paths[..., 0] = a * (np.cos(anomaly) - e)
+        paths[..., 1] = a * np.sqrt(1 - e ** 2) * np.sin(anomaly)
+        return paths
+
+    def path(self, a, e, n):
+        """
+        @brief Tracé d'une orbite, lu dans le cache si possible.
+
+        @param a: Demi-grand axe.
+        @param e: Excentricité.
+        @param n: Nombre de points.
+        @return: Tableau (n, 2) (partagé par le cache : à ne pas modifier).
+        """
+        return self.paths([a], [e], [n])[0]
+
+    def paths(self, a, e, n):
+        """
+        @brief Tracés de plusieurs orbites ; les courbes absentes du cache sont calculées ensemble, par résolution.
+
+        @param a: Demi-grands axes.
+        @param e: Excentricités.
+        @param n: Nombres de points (un par orbite).
+        @return: Liste de tableaux (n_i, 2) (partagés par le cache : à ne pas modifier).
+        """
+        keys = list(zip(np.asarray(a, dtype=np.float64).tolist(), np.asarray(e, dtype=np.float64).tolist(),
+                        np.asarray(n, dtype=np.int64).tolist()))
+        result = [None] * len(keys)
+        missing = {}
+        for k, key in enumerate(keys):
+            cached = self._cache.get(key)
+            if cached is None:
+                missing.setdefault(key[2], []).append(k)
+            else:
+                self._cache.move_to_end(key)
+                result[k] = cached
+        self.hits += len(keys) - sum(len(group) for group in missing.values())
+        for points, group in missing.items():
+            self.misses += len(group)
+            computed = self.compute([keys[k][0] for k in group], [keys[k][1] for k in group], points)
+            for k, path in zip(group, computed):
+                result[k] = path
+                self._cache[keys[k]] = path
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return result
+
+    def adaptive(self, a, e, pixels_per_unit, tolerance=0.25):
+        """
+        @brief Tracés de plusieurs orbites avec le nombre de points adapté au zoom.
+
+        @param a: Demi-grands axes.
+        @param e: Excentricités.
+        @param pixels_per_unit: Pixels par unité de longueur à l'écran.
+        @param tolerance: Écart maximal toléré, en pixels.
+        @return: Liste de tableaux (n_i, 2).
+        """
+        return self.paths(a, e, resolution(a, pixels_per_unit, tolerance))
+
+
+default_paths = OrbitPaths()
+
+
+class OrbitCollection:
+    """
+    @class OrbitCollection
+    @brief Toutes les orbites d'une scène dans un seul LineCollection, recalculé quand le zoom change de niveau de détail.
+
+    @param ax Axes Matplotlib.
+    @param a Demi-grands axes.
+    @param e Excentricités.
+    @param colors Couleurs des orbites.
+    @param tolerance Écart maximal toléré entre tracé et ellipse, en pixels.
+    @param paths OrbitPaths utilisé (cache partagé default_paths par défaut).
+    @param kwargs Options transmises au LineCollection (linestyles, alpha, linewidths...).
+    """
+    def __init__(self, ax, a, e, colors=None, tolerance=0.25, paths=None, **kwargs):
+        self.ax = ax
+        self.a = np.asarray(a, dtype=np.float64)
+        self.e = np.asarray(e, dtype=np.float64)
+        self.tolerance = tolerance
+        self.paths = paths if paths is not None else default_paths
+        self.levels = None
+        self.collection = LineCollection([], colors=colors, **kwargs)
+        ax.add_collection(self.collection, autolim=False)
+        self.refresh()
+        # Fonction (et non méthode liée) : les axes gardent une référence forte vers l'objet
+        ax.callbacks.connect("xlim_changed", lambda ax: self.refresh())
+        ax.callbacks.connect("ylim_changed", lambda ax: self.refresh())
+
+    def pixels_per_unit(self):
+        """
+        @brief Échelle courante des axes, en pixels par unité de longueur.
+        """
+        width = self.ax.get_window_extent().width
+        x0, x1 = self.ax.get_xlim()
+        return width / abs(x1 - x0) if x1 != x0 else 1.0
+
+    def refresh(self):
+        """
+        @brief Recalcule les tracés si le niveau de détail nécessaire a changé.
+
+        @return: Vrai si les tracés ont été remplacés.
+        """
+        levels = resolution(self.a, self.pixels_per_unit(), self.tolerance)
+        if self.levels is not None and np.array_equal(levels, self.levels):
+            return False
+        self.levels = levels
+        self.collection.set_segments(self.paths.paths(self.a, self.e, levels))
+        return True
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    from functions import get_orbit
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    rng = np.random.default_rng(0)
+    a = rng.uniform(0.5, 30, n)
+    e = rng.uniform(0, 0.9, n)
+
+    # Écart maximal entre le tracé de get_orbit (200 points en anomalie vraie) et l'ellipse, pour Mercure
+    def chord_error(points, a_, e_):
+        mid = 0.5 * (points[1:] + points[:-1])
+        b_ = a_ * math.sqrt(1 - e_ ** 2)
+        # Distance approchée du milieu de corde à l'ellipse, par l'équation implicite normalisée
+        u = (mid[:, 0] + a_ * e_) / a_
+        v = mid[:, 1] / b_
+        return float(np.max((1 - np.hypot(u, v)) * b_))
+
+    x, y = get_orbit(0.39, 0.205)
+    fixed = chord_error(np.column_stack((x, y)), 0.39, 0.205)
+    adaptive = default_paths.adaptive([0.39], [0.205], 600 / 60.0)[0]
+    print("Mercure, zoom de main.py (full) : get_orbit %d points, écart %.1e UA ; adaptatif %d points, écart %.1e UA"
+          % (len(x), fixed, len(adaptive), chord_error(adaptive, 0.39, 0.205)))
+
+    print("%d orbites :" % n)
+    fig, ax = plt.subplots(figsize=(6, 6))
+    ax.set_xlim(-40, 40)
+    ax.set_ylim(-40, 40)
+    start = time.perf_counter()
+    for ai, ei in zip(a, e):
+        ax.plot(*get_orbit(ai, ei), '--', alpha=0.5)
+    fig.canvas.draw()
+    print("  un Line2D par orbite (get_orbit)   : %.3f s" % (time.perf_counter() - start))
+    plt.close(fig)
+
+    fig, ax = plt.subplots(figsize=(6, 6))
+    ax.set_xlim(-40, 40)
+    ax.set_ylim(-40, 40)
+    start = time.perf_counter()
+    orbits = OrbitCollection(ax, a, e, linestyles='--', alpha=0.5)
+    fig.canvas.draw()
+    print("  un LineCollection (OrbitCollection) : %.3f s, %d points" % (
+        time.perf_counter() - start, int(sum(len(p) for p in orbits.collection.get_segments()))))
+    start = time.perf_counter()
+    ax.set_xlim(-20, 20)
+    ax.set_ylim(-20, 20)
+    fig.canvas.draw()
+    print("  zoom x2 (nouveau niveau de détail)   : %.3f s" % (time.perf_counter() - start))
+    start = time.perf_counter()
+    ax.set_xlim(-40, 40)
+    ax.set_ylim(-40, 40)
+    fig.canvas.draw()
+    print("  retour au zoom initial (cache)       : %.3f s (%d courbes en cache, %d succès)" % (
+        time.perf_counter() - start, len(default_paths._cache), default_paths.hits))
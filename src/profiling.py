@@ -0,0 +1,244 @@
+"""
+@file profiling.py
+@brief Chronométrage par phase et compteurs de la boucle de simulation et d'affichage.
+
+Ce fichier contient la classe Profiler, qui mesure la durée de phases nommées (pas de
+physique, propagation, mise à jour des objets graphiques, dessin, blit ou flip...) et
+tient des compteurs (corps, paires évaluées, points de traînée). Il fournit des
+statistiques glissantes (p50, p95 du temps par image et de chaque phase), des lignes de
+texte pour un affichage à l'écran, et l'export en JSON ou au format Chrome trace
+(chrome://tracing, Perfetto).
+
+Les phases peuvent aussi être chronométrées depuis un autre fil (la physique de test.py,
+sur son SimulationThread) : elles comptent dans l'image pendant laquelle elles se terminent,
+et apparaissent sur une ligne à part dans la trace Chrome.
+
+Désactivé, un Profiler ne mesure rien : phase() renvoie un contexte vide partagé,
+count() et frame() reviennent immédiatement, instrument() ne modifie rien.
+
+Exemple :
+
+    profiler = Profiler()
+    while running:
+        with profiler.phase("physique"):
+            system.step()
+        profiler.count("corps", len(system))
+        profiler.frame()
+    profiler.save_chrome_trace("trace.json")
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class _NullPhase:
+    """
+    @class _NullPhase
+    @brief Contexte vide renvoyé par un Profiler désactivé.
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase:
+    """
+    @class _Phase
+    @brief Contexte qui chronomètre une phase d'un Profiler actif.
+    """
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._add(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    """
+    @class Profiler
+    @brief Chronomètres de phases nommées et compteurs, agrégés par image.
+
+    @param enabled Active les mesures (sinon toutes les méthodes sont quasi gratuites).
+    @param window Nombre d'images des statistiques glissantes.
+    @param max_events Nombre maximal d'événements gardés pour l'export Chrome trace.
+    """
+    def __init__(self, enabled=True, window=300, max_events=200000):
+        self.enabled = enabled
+        self.window = window
+        self.origin = time.perf_counter()
+        self.frames = deque(maxlen=window)  # Durées des dernières images, en secondes
+        self.phases = {}  # Nom -> deque des durées par image
+        self.counters = {}  # Nom -> deque des valeurs par image
+        self.events = deque(maxlen=max_events)  # (nom, début, fin, fil) en secondes depuis origin
+        self.frame_count = 0
+        self._frame_start = None
+        self._phase_totals = {}
+        self._counter_totals = {}
+        self._lock = threading.Lock()  # Phases terminées sur d'autres fils pendant frame()
+
+    def phase(self, name):
+        """
+        @brief Renvoie un contexte qui chronomètre une phase : with profiler.phase("physique"): ...
+
+        Une phase peut se répéter dans une image (une fois par corps, par exemple) : ses durées s'additionnent.
+
+        @param name: Nom de la phase.
+        @return: Gestionnaire de contexte.
+        """
+        if not self.enabled:
+            return _NULL_PHASE
+        return _Phase(self, name)
+
+    def _add(self, name, start, end):
+        thread = 1 if threading.current_thread() is threading.main_thread() else 2
+        with self._lock:
+            self._phase_totals[name] = self._phase_totals.get(name, 0.0) + (end - start)
+        self.events.append((name, start - self.origin, end - self.origin, thread))
+
+    def count(self, name, value=1):
+        """
+        @brief Ajoute value au compteur name de l'image courante.
+
+        @param name: Nom du compteur.
+        @param value: Valeur à ajouter.
+        """
+        if self.enabled:
+            self._counter_totals[name] = self._counter_totals.get(name, 0) + value
+
+    def frame(self):
+        """
+        @brief Termine l'image courante : la durée depuis l'appel précédent, les phases et les compteurs sont enregistrés.
+        """
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self._frame_start is not None:
+            self.frames.append(now - self._frame_start)
+            self.events.append(("image", self._frame_start - self.origin, now - self.origin, 0))
+        self._frame_start = now
+        with self._lock:
+            phase_totals, self._phase_totals = self._phase_totals, {}
+        for name, total in phase_totals.items():
+            self.phases.setdefault(name, deque(maxlen=self.window)).append(total)
+        for name, total in self._counter_totals.items():
+            self.counters.setdefault(name, deque(maxlen=self.window)).append(total)
+        self._counter_totals = {}
+        self.frame_count += 1
+
+    def instrument(self, obj, method, name=None):
+        """
+        @brief Chronomètre toutes les exécutions d'une méthode d'un objet (par exemple Figure.draw ou canvas.blit).
+
+        La méthode est remplacée par un attribut d'instance ; rien n'est modifié si le Profiler est désactivé.
+
+        @param obj: Objet dont la méthode est chronométrée.
+        @param method: Nom de la méthode.
+        @param name: Nom de la phase (nom de la méthode par défaut).
+        """
+        if not self.enabled:
+            return
+        original = getattr(obj, method)
+        phase = name or method
+
+        def timed(*args, **kwargs):
+            with self.phase(phase):
+                return original(*args, **kwargs)
+        setattr(obj, method, timed)
+
+    def stats(self):
+        """
+        @brief Statistiques glissantes sur les dernières images.
+
+        @return: Dictionnaire frames (nombre d'images), frame et phases (p50, p95, moyenne en ms),
+        counters (dernière valeur et moyenne par image).
+        """
+        def summary(values):
+            values = np.fromiter(values, dtype=np.float64) * 1e3
+            if len(values) == 0:
+                return {"p50": 0.0, "p95": 0.0, "mean": 0.0}
+            p50, p95 = np.percentile(values, (50, 95))
+            return {"p50": float(p50), "p95": float(p95), "mean": float(values.mean())}
+
+        return {
+            "frames": self.frame_count,
+            "frame": summary(self.frames),
+            "phases": {name: summary(values) for name, values in self.phases.items()},
+            "counters": {name: {"last": values[-1], "mean": float(np.mean(values))}
+                         for name, values in self.counters.items() if values},
+        }
+
+    def overlay_lines(self):
+        """
+        @brief Lignes de texte résumant les statistiques, pour un affichage à l'écran.
+
+        @return: Liste de chaînes.
+        """
+        if not self.enabled:
+            return []
+        stats = self.stats()
+        frame = stats["frame"]
+        fps = 1e3 / frame["mean"] if frame["mean"] else 0.0
+        lines = ["image  p50 %6.2f ms  p95 %6.2f ms  (%.1f img/s)" % (frame["p50"], frame["p95"], fps)]
+        for name, phase in stats["phases"].items():
+            lines.append("%-12s p50 %6.2f ms  p95 %6.2f ms" % (name, phase["p50"], phase["p95"]))
+        for name, counter in stats["counters"].items():
+            lines.append("%-12s %d" % (name, counter["last"]))
+        return lines
+
+    def save_json(self, path):
+        """
+        @brief Écrit les statistiques glissantes en JSON.
+
+        @param path: Chemin du fichier.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.stats(), f, indent=2, ensure_ascii=False)
+
+    def save_chrome_trace(self, path):
+        """
+        @brief Écrit les phases et les images au format Chrome trace (à ouvrir dans chrome://tracing ou Perfetto).
+
+        @param path: Chemin du fichier.
+        """
+        pid = os.getpid()
+        trace = [{"name": name, "ph": "X", "ts": start * 1e6, "dur": (end - start) * 1e6, "pid": pid, "tid": thread}
+                 for name, start, end, thread in self.events]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+    def save(self, path):
+        """
+        @brief Écrit les mesures au format Chrome trace si le nom se termine par .trace.json, en JSON de statistiques sinon.
+
+        @param path: Chemin du fichier.
+        """
+        if path.endswith(".trace.json"):
+            self.save_chrome_trace(path)
+        else:
+            self.save_json(path)
+
+
+NULL_PROFILER = Profiler(enabled=False)
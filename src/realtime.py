@@ -0,0 +1,173 @@
+"""
+@file realtime.py
+@brief Simulation à cadence fixe sur un fil dédié, et interpolation des positions à la cadence d'affichage.
+
+Ce fichier contient la classe SimulationThread. Elle fait avancer une simulation (une
+fonction step qui avance d'un pas dt) à une cadence fixe, multipliée par un facteur
+d'accélération du temps (warp), indépendamment de la boucle d'affichage. Après chaque
+série de pas, les positions sont copiées dans un instantané. L'affichage lit à tout moment
+les positions interpolées entre les deux derniers instantanés, sans attendre la physique.
+
+Le dessin a donc un instantané de retard sur la simulation, mais les corps se déplacent
+de façon fluide quelle que soit la cadence de la physique. À fort warp, des milliers de pas
+sont faits entre deux images sans ralentir la gestion des événements. Si la physique ne
+suit pas, le retard est abandonné plutôt que rattrapé et warp_effectif diminue.
+
+Les instantanés tournent dans trois tableaux : le précédent, le courant, et celui en cours
+d'écriture. Ce dernier est rempli hors verrou. Le verrou ne protège que la rotation des
+tableaux et la lecture interpolée, qui coûtent quelques microsecondes.
+
+Exemple :
+
+    simulation = SimulationThread(system.step, lambda: system.positions, dt=TIME_STEP, rate=20)
+    simulation.start()
+    while running:
+        positions, time = simulation.interpolate()
+        ...
+    simulation.stop()
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import threading
+import time
+
+import numpy as np
+
+
+class SimulationThread(threading.Thread):
+    """
+    @class SimulationThread
+    @brief Fil qui fait avancer une simulation à cadence fixe et publie des instantanés de positions.
+
+    @param step Fonction sans argument qui avance la simulation d'un pas dt (appelée uniquement par ce fil).
+    @param source Fonction sans argument qui renvoie le tableau (N, 2) des positions courantes.
+    @param dt Durée simulée d'un pas, en secondes.
+    @param rate Nombre de pas par seconde réelle quand warp vaut 1.
+    @param warp Facteur d'accélération du temps (0 : pause).
+    @param publish_rate Nombre maximal d'instantanés publiés par seconde.
+    @param start_time Temps simulé au démarrage, en secondes (reprise sur point de contrôle).
+    """
+    def __init__(self, step, source, dt, rate=20.0, warp=1.0, publish_rate=60.0, start_time=0.0):
+        super().__init__(name="simulation", daemon=True)
+        self.step = step
+        self.source = source
+        self.dt = dt
+        self.rate = rate
+        self.warp = warp
+        self.publish_rate = publish_rate
+        self.steps = 0  # Nombre total de pas effectués
+        self.time = start_time  # Temps simulé du dernier pas, en secondes
+        self.effective_warp = 0.0  # Warp réellement atteint entre les deux derniers instantanés
+        self.sequence = 0  # Numéro du dernier instantané publié
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._buffers = [np.array(source(), dtype=np.float64) for _ in range(3)]
+        self._times = [start_time] * 3  # Temps simulé de chaque instantané
+        self._walls = [time.perf_counter()] * 3  # Instant réel de publication de chaque instantané
+        self._previous, self._current, self._back = 0, 1, 2
+
+    def run(self):
+        period = 1.0 / self.publish_rate
+        last = time.perf_counter()
+        owed = 0.0  # Pas dus (fraction comprise) depuis le début
+        while not self._stop_event.is_set():
+            start = time.perf_counter()
+            owed += (start - last) * self.rate * self.warp
+            last = start
+            # Au plus une période de calcul par série, pour publier régulièrement
+            deadline = start + period
+            done = 0
+            while done < int(owed):
+                self.step()
+                done += 1
+                if time.perf_counter() > deadline:
+                    owed = done  # La physique ne suit pas : le retard est abandonné
+                    break
+            owed -= done
+            if done:
+                self.steps += done
+                self.time += done * self.dt
+                self._publish()
+            self._stop_event.wait(max(0.0, deadline - time.perf_counter()))
+
+    def _publish(self):
+        back = self._back
+        np.copyto(self._buffers[back], self.source())
+        self._times[back] = self.time
+        self._walls[back] = time.perf_counter()
+        with self._lock:
+            elapsed = self._walls[back] - self._walls[self._current]
+            if elapsed > 0:
+                self.effective_warp = (self.time - self._times[self._current]) / (elapsed * self.rate * self.dt)
+            self._previous, self._current, self._back = self._current, back, self._previous
+            self.sequence += 1
+
+    def interpolate(self, out=None):
+        """
+        @brief Positions interpolées entre les deux derniers instantanés, à l'instant réel présent.
+
+        Le passage de l'avant-dernier au dernier instantané est rejoué avec le même intervalle
+        que leur publication ; sans nouvel instantané (pause), les positions restent au dernier.
+
+        @param out: Tableau (N, 2) où écrire les positions (alloué si None).
+        @return: Positions (N, 2) et temps simulé correspondant, en secondes.
+        """
+        with self._lock:
+            previous = self._buffers[self._previous]
+            current = self._buffers[self._current]
+            interval = self._walls[self._current] - self._walls[self._previous]
+            alpha = (time.perf_counter() - self._walls[self._current]) / interval if interval > 0 else 1.0
+            alpha = min(max(alpha, 0.0), 1.0)
+            if out is None:
+                out = np.empty_like(current)
+            np.subtract(current, previous, out=out)
+            out *= alpha
+            out += previous
+            t0, t1 = self._times[self._previous], self._times[self._current]
+        return out, t0 + alpha * (t1 - t0)
+
+    def stop(self, timeout=None):
+        """
+        @brief Arrête le fil et attend la fin de la série de pas en cours.
+
+        @param timeout: Attente maximale, en secondes.
+        """
+        self._stop_event.set()
+        if self.is_alive():
+            self.join(timeout)
+
+
+if __name__ == "__main__":
+    import sys
+
+    from encounters import EncounterDetector
+    from nbody import TIME_STEP, NBodySystem, reference_state
+
+    # Pas faits par image affichée à 60 images/s, selon le warp, avec le pas de test.py (sans le dessin)
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+    for warp in (1, 10, 100, 1000, 10000):
+        state = reference_state()
+        system = NBodySystem.from_state(state, softening=1e5)
+        detector = EncounterDetector(state.diameter_km * 500, hill_factor=0)
+
+        def step():
+            detector.step(system, TIME_STEP)
+            state.position.copy()
+        simulation = SimulationThread(step, lambda: state.position, dt=TIME_STEP, rate=20, warp=warp)
+        simulation.start()
+        frames = 0
+        positions = None
+        latencies = []
+        end = time.perf_counter() + duration
+        while time.perf_counter() < end:
+            start = time.perf_counter()
+            positions, sim_time = simulation.interpolate(positions)
+            latencies.append(time.perf_counter() - start)
+            frames += 1
+            time.sleep(1 / 60)
+        simulation.stop()
+        print("warp %6d : %8.1f pas par image, warp effectif %7.1f, lecture interpolée p95 %.1f µs"
+              % (warp, simulation.steps / frames, simulation.effective_warp,
+                 np.percentile(latencies, 95) * 1e6))
@@ -0,0 +1,257 @@
+"""
+@file render.py
+@brief Rendu hors écran de l'animation en séquence d'images PNG ou en vidéo MP4.
+
+Ce script produit les images de l'animation sans fenêtre ni affichage, aussi vite que
+le processeur le permet : les positions de toutes les images d'un lot sont calculées
+en un seul appel au propagateur képlérien, le décor (Soleil, orbites, légende) est
+dessiné une seule fois par le moteur Agg puis restauré à chaque image, et seul le
+nuage de points des corps est redessiné. Les images peuvent être réparties entre plusieurs processus.
+
+Exemples :
+
+    python render.py --system full --frames 600 --out images/
+    python render.py --system small --frames 600 --out orbites.mp4 --workers 4
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import argparse
+import os
+import subprocess
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import matplotlib.image as mimage
+
+from functions import draw_background, draw_bodies
+from kepler import KeplerPropagator
+
+FRAME_TIME = 0.02  # Temps simulé entre deux images, comme dans functions.update
+
+
+def frame_shape(size=6, dpi=100):
+    """
+    @brief Dimensions (hauteur, largeur) en pixels des images d'un FrameRenderer, sans le construire.
+
+    @param size: Taille de la figure en pouces.
+    @param dpi: Résolution en points par pouce.
+    """
+    # Le canevas Agg donne la taille exacte de son tampon : ni int() ni round() sur size x dpi ne
+    # reproduisent à coup sûr son arrondi en virgule flottante
+    width, height = FigureCanvasAgg(Figure(figsize=(size * 1.5, size), dpi=dpi)).get_width_height()
+    return height, width
+
+
+class FrameRenderer:
+    """
+    @class FrameRenderer
+    @brief Dessine des images de l'animation sur un canevas Agg, en réutilisant le décor.
+
+    @param sun L'objet Star.
+    @param planets Liste des objets Planet.
+    @param moons Liste des objets Moon (déjà filtrées sur les planètes affichées).
+    @param size Taille de la figure en pouces.
+    @param dpi Résolution en points par pouce.
+    """
+    def __init__(self, sun, planets, moons, size=6, dpi=100):
+        self.propagator = KeplerPropagator(planets, moons)
+        # Figure élargie pour laisser la place à la légende, à droite des axes
+        self.figure = Figure(figsize=(size * 1.5, size), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_axes((0.02, 0.05, 0.62, 0.88))
+        scale_factor, self.orbits = draw_background(self.ax, sun, planets, moons)
+        self.bodies = draw_bodies(self.ax, self.propagator, scale_factor)
+
+        # Décor dessiné une seule fois, sans les corps (artistes animés)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+
+    @property
+    def shape(self):
+        """
+        @brief Dimensions (hauteur, largeur) des images en pixels.
+        """
+        width, height = self.canvas.get_width_height()
+        return height, width
+
+    def render(self, positions):
+        """
+        @brief Dessine une image à partir des positions de tous les corps.
+
+        @param positions: Tableau (N, 2) dans l'ordre de propagator.names.
+        @return: Image RGBA, tableau (hauteur, largeur, 4) d'octets (vue sur le tampon Agg).
+        """
+        self.canvas.restore_region(self.background)
+        self.bodies.set_offsets(positions)
+        self.ax.draw_artist(self.bodies)
+        return np.asarray(self.canvas.buffer_rgba())
+
+    def frames(self, times, batch=256):
+        """
+        @brief Génère les images pour une suite de dates, positions calculées par lots.
+
+        @param times: Tableau de dates.
+        @param batch: Nombre d'images dont les positions sont calculées ensemble.
+        @return: Itérateur d'images RGBA (chaque image n'est valide que jusqu'à la suivante).
+        """
+        for begin in range(0, len(times), batch):
+            for positions in self.propagator.positions(times[begin:begin + batch]):
+                yield self.render(positions)
+
+
+_worker_renderer = None
+
+
+def _init_worker(sun, planets, moons, size, dpi):
+    """
+    @brief Crée le FrameRenderer propre à un processus de la réserve.
+    """
+    global _worker_renderer
+    _worker_renderer = FrameRenderer(sun, planets, moons, size=size, dpi=dpi)
+
+
+def _render_chunk(task):
+    """
+    @brief Rend un lot d'images dans un processus de la réserve.
+
+    @param task: (indices des images, dates, motif des fichiers PNG ou None).
+    @return: Nombre d'images écrites, ou octets RGBA concaténés si aucun motif n'est donné.
+    """
+    indices, times, pattern = task
+    raw = []
+    for index, image in zip(indices, _worker_renderer.frames(times)):
+        if pattern is None:
+            raw.append(image.tobytes())
+        else:
+            mimage.imsave(pattern % index, image)
+    return b"".join(raw) if pattern is None else len(indices)
+
+
+def _ffmpeg(path, shape, fps):
+    """
+    @brief Lance ffmpeg pour encoder des images RGBA brutes reçues sur son entrée standard.
+
+    @param path: Fichier vidéo à écrire.
+    @param shape: (hauteur, largeur) des images.
+    @param fps: Images par seconde.
+    @return: Le processus ffmpeg.
+    @exception RuntimeError: ffmpeg n'est pas installé.
+    """
+    height, width = shape
+    command = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "rawvideo", "-pix_fmt", "rgba", "-s", "%dx%d" % (width, height), "-r", str(fps),
+        "-i", "-",
+        "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+        "-vcodec", "libx264", "-pix_fmt", "yuv420p", path,
+    ]
+    try:
+        return subprocess.Popen(command, stdin=subprocess.PIPE)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg introuvable : installez-le (et ajoutez-le au PATH) pour écrire une vidéo, "
+                           "ou donnez un dossier pour écrire des images PNG") from None
+
+
+def render(sun, planets, moons, output, t0=0.0, t1=None, n_frames=500, fps=20, workers=1,
+           chunk_size=50, size=6, dpi=100, max_pending=None):
+    """
+    @brief Rend l'animation entre deux dates en PNG (dossier) ou en vidéo (fichier .mp4).
+
+    @param sun: L'objet Star.
+    @param planets: Liste des objets Planet.
+    @param moons: Liste des objets Moon (déjà filtrées sur les planètes affichées).
+    @param output: Dossier des images PNG, ou chemin d'un fichier .mp4 (encodé par ffmpeg).
+    @param t0: Date de la première image.
+    @param t1: Date de la dernière image (par défaut t0 + n_frames x FRAME_TIME, comme main.py).
+    @param n_frames: Nombre d'images.
+    @param fps: Images par seconde de la vidéo.
+    @param workers: Nombre de processus (1 : tout dans le processus courant).
+    @param chunk_size: Nombre d'images confiées à un processus à la fois.
+    @param size: Taille de la figure en pouces.
+    @param dpi: Résolution en points par pouce.
+    @param max_pending: Nombre maximal de lots soumis et non encore consommés (par défaut 2 par processus).
+    @return: Nombre d'images produites.
+    """
+    if t1 is None:
+        t1 = t0 + (n_frames - 1) * FRAME_TIME
+    times = np.linspace(t0, t1, n_frames)
+    video = output.lower().endswith(".mp4")
+    pattern = None
+    if not video:
+        os.makedirs(output, exist_ok=True)
+        pattern = os.path.join(output, "frame_%05d.png")
+
+    if workers <= 1:
+        renderer = FrameRenderer(sun, planets, moons, size=size, dpi=dpi)
+        encoder = _ffmpeg(output, renderer.shape, fps) if video else None
+        for index, image in enumerate(renderer.frames(times)):
+            if video:
+                encoder.stdin.write(image.tobytes())
+            else:
+                mimage.imsave(pattern % index, image)
+        if video:
+            encoder.stdin.close()
+            encoder.wait()
+        return n_frames
+
+    tasks = ((range(begin, min(begin + chunk_size, n_frames)), times[begin:begin + chunk_size], pattern)
+             for begin in range(0, n_frames, chunk_size))
+    max_pending = max_pending or 2 * workers
+    # ffmpeg est lancé avant le rendu : s'il manque, l'erreur est immédiate
+    encoder = _ffmpeg(output, frame_shape(size, dpi), fps) if video else None
+    # Au plus max_pending lots soumis à la fois : les images rendues (quelques Mo par lot) n'attendent
+    # pas en mémoire que ffmpeg ou le disque les absorbent. Les lots sont rendus en parallèle mais
+    # consommés (transmis à ffmpeg) dans l'ordre.
+    pending = deque()
+
+    def consume():
+        result = pending.popleft().result()
+        if video:
+            encoder.stdin.write(result)
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(sun, planets, moons, size, dpi)) as pool:
+        for task in tasks:
+            pending.append(pool.submit(_render_chunk, task))
+            if len(pending) >= max_pending:
+                consume()
+        while pending:
+            consume()
+    if video:
+        # Après l'arrêt des processus, qui ont hérité du tube vers ffmpeg : sinon ffmpeg attend sans fin la fin du flux
+        encoder.stdin.close()
+        encoder.wait()
+    return n_frames
+
+
+if __name__ == "__main__":
+    import time
+
+    from main import sun, systems
+
+    parser = argparse.ArgumentParser(description="Rendu hors écran de l'animation du système solaire.")
+    parser.add_argument("--system", choices=sorted(systems), default="small", help="Système à afficher.")
+    parser.add_argument("--out", required=True, help="Dossier des images PNG ou fichier .mp4.")
+    parser.add_argument("--frames", type=int, default=500, help="Nombre d'images.")
+    parser.add_argument("--t0", type=float, default=0.0, help="Date de la première image.")
+    parser.add_argument("--t1", type=float, default=None, help="Date de la dernière image.")
+    parser.add_argument("--fps", type=int, default=20, help="Images par seconde de la vidéo.")
+    parser.add_argument("--workers", type=int, default=1, help="Nombre de processus.")
+    parser.add_argument("--dpi", type=int, default=100, help="Résolution.")
+    args = parser.parse_args()
+
+    planets, moons, planets_with_moons = systems[args.system]
+    moons = [moon for moon in moons if moon.planet in planets_with_moons]
+    start = time.perf_counter()
+    try:
+        count = render(sun, planets, moons, args.out, t0=args.t0, t1=args.t1, n_frames=args.frames,
+                       fps=args.fps, workers=args.workers, dpi=args.dpi)
+    except RuntimeError as error:
+        parser.exit(1, "%s\n" % error)
+    elapsed = time.perf_counter() - start
+    print("%d images en %.2f s (%.1f images/s)" % (count, elapsed, count / elapsed))
@@ -0,0 +1,539 @@
+"""
+@file server.py
+@brief Serveur asyncio qui diffuse les positions d'une simulation unique à plusieurs clients (TCP, trames binaires).
+
+Ce fichier contient la classe StreamServer. Elle fait tourner une seule simulation et envoie
+les positions des corps à tous les clients connectés. La simulation peut être le propagateur
+képlérien de functions.update (KeplerStream) ou un NBodySystem sur un SimulationThread
+(NBodyStream). La source nbody fait le même pas que test.py : corps de reference_state,
+NBodySystem.from_state adouci et détection des collisions. Chaque client choisit sa cadence
+(au plus celle du serveur) et les corps qu'il reçoit.
+
+Un client lent ne ralentit ni la simulation ni les autres clients. Chaque client n'a qu'une
+trame en attente d'envoi : une nouvelle trame remplace celle qui n'est pas encore partie, et
+le numéro de séquence des trames révèle les trames perdues.
+
+Protocole : chaque message est précédé de sa longueur (uint32 petit-boutiste, type compris),
+puis d'un octet de type.
+- MSG_JSON (0) : objet JSON en UTF-8. Le serveur envoie à la connexion
+  {"names": [...], "unit": ..., "rate": ...}. Le client peut envoyer à tout moment
+  {"rate": 10, "bodies": ["Terre", "Mars"]} (bodies null : tous les corps). Le serveur répond
+  {"subscribed": [indices], "rate": ...}, ou {"error": ...}.
+- MSG_FRAME (1) : en-tête FRAME_HEADER (numéro de séquence uint64, temps simulé float64,
+  nombre de corps k uint32), puis k positions (x, y) en float32, dans l'ordre de l'abonnement.
+
+Exemple :
+
+    python server.py --source nbody --port 8765
+    python server.py --client --rate 5 --bodies Terre Lune
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import asyncio
+import json
+import math
+import socket
+import struct
+import time
+
+import numpy as np
+
+MSG_JSON = 0
+MSG_FRAME = 1
+MESSAGE_HEADER = struct.Struct("<IB")  # Longueur (type compris), type
+FRAME_HEADER = struct.Struct("<QdI")  # Séquence, temps simulé, nombre de corps
+MAX_MESSAGE = 1 << 20  # Taille maximale d'un message reçu d'un client
+
+
+class KeplerStream:
+    """
+    @class KeplerStream
+    @brief Source de positions képlériennes (propagateur de functions.update), calculées à la demande.
+
+    @param propagator Le KeplerPropagator.
+    @param speed Unités de temps simulé par seconde réelle (0.4 : cadence de main.py, 0.02 par image de 50 ms).
+    """
+    unit = "UA"
+
+    def __init__(self, propagator, speed=0.4):
+        self.propagator = propagator
+        self.names = list(propagator.names)
+        self.speed = speed
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def __call__(self, elapsed):
+        """
+        @brief Positions à un instant donné.
+
+        @param elapsed: Secondes réelles écoulées depuis le démarrage du serveur.
+        @return: Temps simulé et tableau (N, 2) des positions.
+        """
+        t = elapsed * self.speed
+        return t, self.propagator.positions(t)
+
+
+class NBodyStream:
+    """
+    @class NBodyStream
+    @brief Source de positions d'un NBodySystem intégré à cadence fixe sur un SimulationThread (realtime.py).
+
+    Le pas de gravitation tourne sur son propre fil : la boucle asyncio ne fait que lire les
+    positions interpolées entre les deux derniers instantanés.
+
+    @param system Le NBodySystem.
+    @param dt Pas d'intégration en secondes.
+    @param rate Pas par seconde réelle quand warp vaut 1.
+    @param warp Facteur d'accélération du temps.
+    @param step Fonction sans argument qui avance le système d'un pas dt (par défaut system.step(dt)).
+    """
+    unit = "m"
+
+    def __init__(self, system, dt, rate=20.0, warp=1.0, step=None):
+        from realtime import SimulationThread
+
+        self.system = system
+        self.names = list(system.names)
+        if step is None:
+            def step():
+                system.step(dt)
+        self.simulation = SimulationThread(step, lambda: system.positions, dt=dt, rate=rate, warp=warp)
+        self._positions = None
+
+    def start(self):
+        self.simulation.start()
+
+    def stop(self):
+        self.simulation.stop()
+
+    def __call__(self, elapsed):
+        """
+        @brief Positions interpolées à l'instant présent.
+
+        @param elapsed: Secondes réelles écoulées depuis le démarrage du serveur (inutilisé : le fil a sa propre horloge).
+        @return: Temps simulé et tableau (N, 2) des positions.
+        """
+        self._positions, t = self.simulation.interpolate(self._positions)
+        return t, self._positions
+
+
+def pack_message(kind, payload):
+    """
+    @brief Préfixe un message de sa longueur et de son type.
+
+    @param kind: MSG_JSON ou MSG_FRAME.
+    @param payload: Contenu (bytes).
+    @return: Message complet (bytes).
+    """
+    return MESSAGE_HEADER.pack(len(payload) + 1, kind) + payload
+
+
+def pack_json(obj):
+    """
+    @brief Message MSG_JSON contenant obj.
+    """
+    return pack_message(MSG_JSON, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+
+def pack_frame(sequence, t, positions):
+    """
+    @brief Message MSG_FRAME : en-tête puis positions en float32.
+
+    @param sequence: Numéro de la trame.
+    @param t: Temps simulé.
+    @param positions: Tableau (k, 2).
+    @return: Message complet (bytes).
+    """
+    data = np.ascontiguousarray(positions, dtype="<f4")
+    return pack_message(MSG_FRAME, FRAME_HEADER.pack(sequence, t, len(data)) + data.tobytes())
+
+
+def unpack_frame(payload):
+    """
+    @brief Décode le contenu d'un message MSG_FRAME.
+
+    @param payload: Contenu du message, sans longueur ni type.
+    @return: Numéro de séquence, temps simulé et tableau (k, 2) de positions float32.
+    """
+    sequence, t, count = FRAME_HEADER.unpack_from(payload)
+    positions = np.frombuffer(payload, dtype="<f4", count=2 * count, offset=FRAME_HEADER.size)
+    return sequence, t, positions.reshape(count, 2)
+
+
+async def read_message(reader):
+    """
+    @brief Lit un message complet.
+
+    @param reader: asyncio.StreamReader.
+    @return: Type et contenu du message.
+    """
+    length, kind = MESSAGE_HEADER.unpack(await reader.readexactly(MESSAGE_HEADER.size))
+    if not 1 <= length <= MAX_MESSAGE:
+        raise ValueError("Longueur de message invalide : %d" % length)
+    return kind, await reader.readexactly(length - 1)
+
+
+class _Subscriber:
+    """
+    @class _Subscriber
+    @brief Connexion d'un client : abonnement, trame en attente et envoi.
+    """
+    def __init__(self, writer, rate):
+        self.writer = writer
+        self.interval = 1.0 / rate
+        self.indices = None  # None : tous les corps
+        self.next_due = 0.0
+        self.pending = None  # Dernière trame pas encore envoyée
+        self.ready = asyncio.Event()
+        self.sent = 0
+        self.dropped = 0
+
+    def offer(self, frame):
+        """
+        @brief Propose une trame : elle remplace la précédente si celle-ci n'est pas encore partie.
+        """
+        if self.pending is not None:
+            self.dropped += 1
+        self.pending = frame
+        self.ready.set()
+
+    async def send_loop(self):
+        while True:
+            await self.ready.wait()
+            self.ready.clear()
+            frame, self.pending = self.pending, None
+            self.writer.write(frame)
+            self.sent += 1
+            # Attend que le système vide le tampon d'envoi : pendant ce temps, les trames se remplacent
+            try:
+                await self.writer.drain()
+            except ConnectionError:
+                # Client parti : fermer la connexion termine sa lecture, et le gestionnaire le retire
+                self.writer.close()
+                return
+
+
+class StreamServer:
+    """
+    @class StreamServer
+    @brief Serveur TCP qui diffuse les positions d'une source (KeplerStream, NBodyStream) à tous ses abonnés.
+
+    @param source Source de positions : names, unit, start(), stop(), et appel source(elapsed) -> (t, positions).
+    @param rate Cadence maximale d'envoi, en trames par seconde.
+    """
+    def __init__(self, source, rate=60.0):
+        self.source = source
+        self.rate = rate
+        self.sequence = 0
+        self.subscribers = set()
+        self._handlers = set()
+        self._server = None
+        self._broadcast_task = None
+
+    async def start(self, host="127.0.0.1", port=8765):
+        """
+        @brief Démarre la simulation et l'écoute des connexions.
+
+        @param host: Adresse d'écoute (locale par défaut).
+        @param port: Port d'écoute (0 : port libre choisi par le système).
+        @return: Port effectivement utilisé.
+        """
+        self.source.start()
+        self._server = await asyncio.start_server(self._handle, host, port)
+        self._broadcast_task = asyncio.create_task(self._broadcast())
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """
+        @brief Ferme les connexions et arrête la simulation.
+        """
+        if self._broadcast_task is not None:
+            self._broadcast_task.cancel()
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for subscriber in list(self.subscribers):
+            # Sans attendre l'envoi des données en attente (un client bloqué ne les lirait jamais)
+            subscriber.writer.transport.abort()
+        # Les connexions fermées terminent leur lecture d'elles-mêmes
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        self.source.stop()
+
+    def stats(self):
+        """
+        @brief Trames envoyées et perdues par abonné.
+
+        @return: Liste de dictionnaires (adresse, cadence, corps, envoyées, perdues).
+        """
+        return [{"peer": str(s.writer.get_extra_info("peername")), "rate": 1.0 / s.interval,
+                 "bodies": len(self.source.names) if s.indices is None else len(s.indices),
+                 "sent": s.sent, "dropped": s.dropped}
+                for s in self.subscribers]
+
+    def _subscribe(self, subscriber, request):
+        """
+        @brief Applique une demande d'abonnement {"rate": ..., "bodies": [...]}.
+
+        Sans "rate" (ou avec null), la cadence du serveur est utilisée ; une cadence plus élevée est ramenée à celle-ci.
+
+        @return: Réponse à envoyer au client.
+        """
+        rate = request.get("rate")
+        rate = self.rate if rate is None else float(rate)
+        if not (math.isfinite(rate) and rate > 0):
+            raise ValueError("Cadence invalide : %g" % rate)
+        rate = min(rate, self.rate)
+        bodies = request.get("bodies")
+        indices = None
+        if bodies is not None:
+            unknown = [name for name in bodies if name not in self.source.names]
+            if unknown:
+                raise ValueError("Corps inconnus : %s" % ", ".join(unknown))
+            indices = np.array([self.source.names.index(name) for name in bodies], dtype=np.int64)
+        subscriber.interval = 1.0 / rate
+        subscriber.indices = indices
+        subscribed = list(range(len(self.source.names))) if indices is None else indices.tolist()
+        return {"subscribed": subscribed, "rate": rate}
+
+    async def _handle(self, reader, writer):
+        # drain() attend que chaque trame ait quitté le tampon d'asyncio : sinon jusqu'à 64 Ko de
+        # trames périmées s'y accumuleraient, au lieu d'être remplacées par la plus récente
+        writer.transport.set_write_buffer_limits(high=0)
+        subscriber = _Subscriber(writer, self.rate)
+        handler = asyncio.current_task()
+        self._handlers.add(handler)
+        writer.write(pack_json({"names": self.source.names, "unit": self.source.unit, "rate": self.rate}))
+        self.subscribers.add(subscriber)
+        sender = asyncio.create_task(subscriber.send_loop())
+        try:
+            while True:
+                kind, payload = await read_message(reader)
+                if kind != MSG_JSON:
+                    continue
+                try:
+                    reply = self._subscribe(subscriber, json.loads(payload))
+                except (ValueError, TypeError, AttributeError) as error:
+                    reply = {"error": str(error)}
+                # Les réponses ne sont jamais remplacées par une trame : écrites directement
+                writer.write(pack_json(reply))
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            self.subscribers.discard(subscriber)
+            self._handlers.discard(handler)
+            sender.cancel()
+            writer.close()
+
+    async def _broadcast(self):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        next_tick = start
+        while True:
+            now = loop.time()
+            due = [s for s in self.subscribers if s.next_due <= now]
+            if due:
+                t, positions = self.source(now - start)
+                self.sequence += 1
+                frames = {}  # Une trame par sélection de corps distincte
+                for subscriber in due:
+                    subscriber.next_due = max(subscriber.next_due + subscriber.interval, now)
+                    key = None if subscriber.indices is None else subscriber.indices.tobytes()
+                    frame = frames.get(key)
+                    if frame is None:
+                        selected = positions if subscriber.indices is None else positions[subscriber.indices]
+                        frame = frames[key] = pack_frame(self.sequence, t, selected)
+                    subscriber.offer(frame)
+            next_tick = max(next_tick + 1.0 / self.rate, now)
+            await asyncio.sleep(next_tick - loop.time())
+
+    async def serve_forever(self, host="127.0.0.1", port=8765):
+        """
+        @brief Démarre le serveur et le fait tourner jusqu'à son annulation.
+        """
+        await self.start(host, port)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+
+class StreamClient:
+    """
+    @class StreamClient
+    @brief Client asyncio du protocole de StreamServer.
+
+    Après connect(), names et unit décrivent les corps diffusés ; frames() produit les trames reçues.
+    """
+    def __init__(self):
+        self.reader = None
+        self.writer = None
+        self.names = []
+        self.unit = None
+        self.indices = None
+
+    async def connect(self, host="127.0.0.1", port=8765, receive_buffer=None):
+        sock = None
+        if receive_buffer is not None:
+            # Avant la connexion, pour que la fenêtre TCP annoncée au serveur en tienne compte
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+            sock.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(sock, (host, port))
+            host = port = None
+        self.reader, self.writer = await asyncio.open_connection(host, port, sock=sock)
+        kind, payload = await read_message(self.reader)
+        hello = json.loads(payload)
+        self.names = hello["names"]
+        self.unit = hello["unit"]
+        self.indices = list(range(len(self.names)))
+        return self
+
+    async def subscribe(self, rate=None, bodies=None):
+        """
+        @brief Demande une cadence et une sélection de corps ; la réponse est lue par frames().
+
+        @param rate: Trames par seconde (cadence du serveur si None).
+        @param bodies: Noms des corps (tous si None).
+        """
+        self.writer.write(pack_json({"rate": rate, "bodies": bodies}))
+        await self.writer.drain()
+
+    async def frames(self):
+        """
+        @brief Itérateur asynchrone des trames reçues.
+
+        @return: Tuples (séquence, temps simulé, positions (k, 2)).
+        """
+        while True:
+            kind, payload = await read_message(self.reader)
+            if kind == MSG_FRAME:
+                yield unpack_frame(payload)
+            elif kind == MSG_JSON:
+                reply = json.loads(payload)
+                if "error" in reply:
+                    raise ValueError(reply["error"])
+                self.indices = reply["subscribed"]
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+def make_source(source, system="small", speed=0.4, warp=1.0, random_bodies=None):
+    """
+    @brief Construit la source demandée en ligne de commande.
+
+    @param source: "kepler" (propagateur de main.py) ou "nbody" (pas de test.py).
+    @param system: Système du catalogue pour "kepler".
+    @param speed: Unités de temps simulé par seconde pour "kepler".
+    @param warp: Facteur d'accélération du temps pour "nbody".
+    @param random_bodies: Pour "nbody", nombre de corps d'un scénario aléatoire (random_scenario) au lieu de celui de test.py.
+    """
+    if source == "kepler":
+        from catalog import load_system
+        from kepler import KeplerPropagator
+
+        sun, systems = load_system()
+        planets, moons, planets_with_moons = systems[system]
+        propagator = KeplerPropagator(planets, [moon for moon in moons if moon.planet in planets_with_moons])
+        return KeplerStream(propagator, speed)
+    from nbody import TIME_STEP, NBodySystem, random_scenario, reference_state
+
+    if random_bodies:
+        return NBodyStream(random_scenario(random_bodies), TIME_STEP, warp=warp)
+    from encounters import EncounterDetector
+
+    # Comme test.py : SystemState de reference_state, adoucissement de 100 km et collisions détectées
+    state = reference_state()
+    system = NBodySystem.from_state(state, softening=1e5)
+    detector = EncounterDetector(state.diameter_km * 500, hill_factor=0)
+    return NBodyStream(system, TIME_STEP, warp=warp, step=lambda: detector.step(system, TIME_STEP))
+
+
+async def _client(host, port, rate, bodies):
+    client = await StreamClient().connect(host, port)
+    await client.subscribe(rate, bodies)
+    print("Corps :", ", ".join(client.names), "(%s)" % client.unit)
+    async for sequence, t, positions in client.frames():
+        print("%8d  t=%-12.6g " % (sequence, t) + "  ".join(
+            "%s (%.4g, %.4g)" % (client.names[i], x, y) for i, (x, y) in zip(client.indices, positions)))
+
+
+async def _bench(source, clients, duration):
+    """
+    @brief Mesure la diffusion à plusieurs clients, dont un qui ne lit presque jamais.
+    """
+    server = StreamServer(source)
+    port = await server.start(port=0)
+    received = [0] * clients
+
+    async def consume(k):
+        client = await StreamClient().connect(port=port, receive_buffer=4096 if k == 0 else None)
+        if k == 0:
+            # Client bloqué : il demande tout, à pleine cadence, mais ne lit plus rien. Ses tampons
+            # de socket sont réduits, de part et d'autre, à ceux d'une liaison lente : sinon le noyau
+            # absorberait des mégaoctets de petites trames avant que le serveur n'en remplace une
+            await client.subscribe()
+            client.writer.transport.pause_reading()
+            local = client.writer.get_extra_info("sockname")
+            for subscriber in server.subscribers:
+                if subscriber.writer.get_extra_info("peername") == local:
+                    subscriber.writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 4096)
+            await asyncio.sleep(duration)
+            return
+        await client.subscribe(None if k % 2 else 10, None if k % 3 else client.names[:2])
+        async for _ in client.frames():
+            received[k] += 1
+
+    tasks = [asyncio.create_task(consume(k)) for k in range(clients)]
+    start = time.perf_counter()
+    ticks = server.sequence
+    await asyncio.sleep(duration)
+    elapsed = time.perf_counter() - start
+    print("%d clients, %.1f s : %.1f trames/s produites (cible %g)" % (
+        clients, elapsed, (server.sequence - ticks) / elapsed, server.rate))
+    for k, stat in enumerate(sorted(server.stats(), key=lambda s: s["peer"])):
+        print("  cadence %5.1f, %d corps : %6d envoyées, %6d perdues" % (
+            stat["rate"], stat["bodies"], stat["sent"], stat["dropped"]))
+    for task in tasks:
+        task.cancel()
+    await server.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Diffusion des positions d'une simulation à plusieurs clients.")
+    parser.add_argument("--source", choices=("kepler", "nbody"), default="kepler",
+                        help="Propagateur képlérien de main.py ou gravitation de test.py.")
+    parser.add_argument("--system", default="small", help="Système du catalogue (source kepler).")
+    parser.add_argument("--speed", type=float, default=0.4, help="Temps simulé par seconde (source kepler).")
+    parser.add_argument("--warp", type=float, default=1.0, help="Accélération du temps (source nbody).")
+    parser.add_argument("--random", type=int, metavar="N", help="Scénario aléatoire de N corps (source nbody).")
+    parser.add_argument("--host", default="127.0.0.1", help="Adresse d'écoute ou du serveur.")
+    parser.add_argument("--port", type=int, default=8765, help="Port d'écoute ou du serveur.")
+    parser.add_argument("--rate", type=float, default=None, help="Trames par seconde (60 pour le serveur).")
+    parser.add_argument("--client", action="store_true", help="Se connecte à un serveur et affiche les trames.")
+    parser.add_argument("--bodies", nargs="+", help="Corps demandés par le client (tous par défaut).")
+    parser.add_argument("--bench", type=int, metavar="CLIENTS", help="Mesure la diffusion à CLIENTS clients locaux.")
+    args = parser.parse_args()
+
+    try:
+        if args.client:
+            asyncio.run(_client(args.host, args.port, args.rate, args.bodies))
+        elif args.bench:
+            asyncio.run(_bench(make_source(args.source, args.system, args.speed, args.warp, args.random), args.bench, 5.0))
+        else:
+            server = StreamServer(make_source(args.source, args.system, args.speed, args.warp, args.random), args.rate or 60.0)
+            print("Diffusion sur %s:%d" % (args.host, args.port))
+            asyncio.run(server.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    except (ValueError, ConnectionError) as error:
+        parser.exit(1, "%s\n" % error)
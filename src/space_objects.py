@@ -5,10 +5,76 @@
 Ce fichier contient les classes CelestialBody, Star, Planet et Moon,
 qui permettent de modéliser les objets du système solaire.
 
+Les objets ne stockent rien eux-mêmes : ce sont des vues légères (__slots__) sur une ligne
+d'un SystemState (state.py), où chaque grandeur est un tableau NumPy. Sans state explicite,
+les objets sont ajoutés à default_state (catalog.load_system, lui, crée son propre SystemState).
+
 @author Pierre JAUFFRES
 @date 2025-02-22
 """
 
+import numpy as np
+
+from state import SystemState, KIND_BODY, KIND_STAR, KIND_PLANET, KIND_MOON
+
+default_state = SystemState()
+
+
+def _field(field):
+    """
+    @brief Crée la propriété qui lit et écrit une grandeur scalaire du corps dans son SystemState.
+    """
+    def getter(self):
+        return self._state._arrays[field][self._index]
+
+    def setter(self, value):
+        self._state._arrays[field][self._index] = np.nan if value is None else value
+    return property(getter, setter)
+
+
+def _optional_field(field):
+    """
+    @brief Comme _field, mais renvoie None lorsque la grandeur n'est pas renseignée (NaN).
+    """
+    def getter(self):
+        value = self._state._arrays[field][self._index]
+        return None if value != value else value  # NaN, sans passer par np.isnan
+
+    def setter(self, value):
+        self._state._arrays[field][self._index] = np.nan if value is None else value
+    return property(getter, setter)
+
+
+def _component(field, axis):
+    """
+    @brief Crée la propriété qui lit et écrit une composante d'une grandeur vectorielle.
+    """
+    def getter(self):
+        return self._state._arrays[field][self._index, axis]
+
+    def setter(self, value):
+        self._state._arrays[field][self._index, axis] = value
+    return property(getter, setter)
+
+
+def _parent(kind_name):
+    """
+    @brief Crée la propriété qui lit et écrit le corps parent (stocké comme indice).
+    """
+    def getter(self):
+        parent = self._state._arrays["parent"][self._index]
+        return body_view(self._state, parent) if parent >= 0 else None
+
+    def setter(self, body):
+        if body is None:
+            self._state._arrays["parent"][self._index] = -1
+            return
+        if body._state is not self._state:
+            raise ValueError("%s doit appartenir au même SystemState que %s" % (kind_name, self.name))
+        self._state._arrays["parent"][self._index] = body._index
+    return property(getter, setter)
+
+
 class CelestialBody:
     """
     @class CelestialBody
@@ -17,11 +83,73 @@ class CelestialBody:
     @param name Nom de l'objet céleste.
     @param size Taille de l'objet (utilisée pour la représentation graphique).
     @param diameter_km Diamètre réelle de l'objet (donnée en km)
+    @param state SystemState qui stocke l'objet (default_state par défaut).
     """
-    def __init__(self, name, size, diameter_km=None):
-        self.name = name
-        self.size = size  # Taille pour l'affichage
-        self.diameter_km = diameter_km  # Diamètre réel en kilomètres (facultatif)
+    __slots__ = ("_state", "_index")
+    KIND = KIND_BODY
+
+    def __init__(self, name, size, diameter_km=None, state=None):
+        self._state = state if state is not None else default_state
+        self._index = self._state.add(self.KIND, name, size=size, diameter_km=diameter_km)
+
+    @classmethod
+    def _view(cls, state, index):
+        """
+        @brief Crée une vue sur un corps existant, sans rien ajouter au SystemState.
+        """
+        body = cls.__new__(cls)
+        body._state = state
+        body._index = int(index)
+        return body
+
+    @property
+    def state(self):
+        """
+        @brief SystemState qui stocke l'objet.
+        """
+        return self._state
+
+    @property
+    def index(self):
+        """
+        @brief Indice de l'objet dans son SystemState.
+        """
+        return self._index
+
+    @property
+    def name(self):
+        return self._state.name(self._index)
+
+    @name.setter
+    def name(self, value):
+        self._state.names[self._index] = value
+
+    @property
+    def color(self):
+        return self._state.colors[self._index]
+
+    @color.setter
+    def color(self, value):
+        self._state.colors[self._index] = value
+
+    size = _field("size")  # Taille pour l'affichage
+    diameter_km = _optional_field("diameter_km")  # Diamètre réel en kilomètres (facultatif)
+    mass = _optional_field("mass")
+    x = _component("position", 0)
+    y = _component("position", 1)
+    velocity_x = _component("velocity", 0)
+    velocity_y = _component("velocity", 1)
+
+    def __eq__(self, other):
+        if not isinstance(other, CelestialBody):
+            return NotImplemented
+        return self._state is other._state and self._index == other._index
+
+    def __hash__(self):
+        return hash((id(self._state), self._index))
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.name)
     
     def get_scaled_size(self, scale_factor=1e9):
         """
@@ -45,8 +173,11 @@ class Star(CelestialBody):
     @param diameter_km Diamètre réelle de l'étoile (donnée en km)
     @param color: Couleur de létoile pour l'affichage.
     """
-    def __init__(self, name, size, mass, diameter_km,color="yellow"):
-        super().__init__(name, size, diameter_km)
+    __slots__ = ()
+    KIND = KIND_STAR
+
+    def __init__(self, name, size, mass, diameter_km,color="yellow", state=None):
+        super().__init__(name, size, diameter_km, state=state)
         self.mass = mass
         self.color = color
     
@@ -83,8 +214,16 @@ class Planet(CelestialBody):
     @param diameter_km Diamètre réelle de la planète (donnée en km)
     @param color: Couleur de la planète pour l'affichage.
     """
-    def __init__(self, name, size, star, semi_major_axis, eccentricity, period, diameter_km, color):
-        super().__init__(name, size)
+    __slots__ = ()
+    KIND = KIND_PLANET
+
+    star = _parent("L'étoile")
+    semi_major_axis = _field("semi_major_axis")
+    eccentricity = _field("eccentricity")
+    period = _field("period")
+
+    def __init__(self, name, size, star, semi_major_axis, eccentricity, period, diameter_km, color, state=None):
+        super().__init__(name, size, state=state if state is not None else star.state)
         self.star = star
         self.semi_major_axis = semi_major_axis
         self.eccentricity = eccentricity
@@ -106,9 +245,42 @@ class Moon(CelestialBody):
     @param diameter_km Diamètre réelle de la lune (donnée en km)
     @param color: Couleur de la lune pour l'affichage.
     """
-    def __init__(self, name, size, planet, orbit_radius, orbit_speed, diameter_km,color="gray"):
-        super().__init__(name, size, diameter_km)
+    __slots__ = ()
+    KIND = KIND_MOON
+
+    planet = _parent("La planète")
+    orbit_radius = _field("orbit_radius")
+    orbit_speed = _field("orbit_speed")
+
+    def __init__(self, name, size, planet, orbit_radius, orbit_speed, diameter_km,color="gray", state=None):
+        super().__init__(name, size, diameter_km, state=state if state is not None else planet.state)
         self.planet = planet
         self.orbit_radius = orbit_radius
         self.orbit_speed = orbit_speed
         self.color = color
+
+
+_VIEW_CLASSES = {KIND_BODY: CelestialBody, KIND_STAR: Star, KIND_PLANET: Planet, KIND_MOON: Moon}
+
+
+def body_view(state, index):
+    """
+    @brief Renvoie une vue du bon type (Star, Planet, Moon...) sur le corps index d'un SystemState.
+
+    @param state: Le SystemState.
+    @param index: Indice du corps.
+    @return: Objet vue.
+    """
+    return _VIEW_CLASSES[int(state.kind[index])]._view(state, index)
+
+
+def bodies(state, kind=None):
+    """
+    @brief Renvoie des vues sur les corps d'un SystemState, éventuellement filtrés par nature.
+
+    @param state: Le SystemState.
+    @param kind: Nature des corps (KIND_STAR, KIND_PLANET, ...), ou None pour tous.
+    @return: Liste de vues.
+    """
+    indices = range(len(state)) if kind is None else state.select(kind)
+    return [body_view(state, i) for i in indices]
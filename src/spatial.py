@@ -0,0 +1,218 @@
+"""
+@file spatial.py
+@brief Index spatial des corps en coordonnées écran : élimination hors champ, regroupement et désignation à la souris.
+
+Ce fichier contient la classe ScreenIndex. C'est une grille de cellules carrées (en pixels)
+qui couvre la fenêtre et une marge autour. Les corps y sont rangés par numéro de cellule,
+et les hors-champ sont placés à la fin. Le début de chaque cellule dans cet ordre est
+tabulé, ce qui permet de répondre sans parcourir tous les corps :
+- visible() : corps dans le champ (les seuls à dessiner) ;
+- clusters() : cellules trop peuplées, dessinées par un seul représentant quand on dézoome ;
+- pick() : corps sous le curseur, en n'examinant que les cellules voisines.
+
+L'index est reconstruit à chaque image, mais de façon incrémentale. Les corps bougent peu
+d'une image à l'autre, donc l'ordre de l'image précédente est presque trié : le tri stable de
+NumPy (Timsort pour des clés int64) le termine en un temps proche de linéaire.
+
+Exemple :
+
+    index = ScreenIndex(WIDTH, HEIGHT, margin=30)
+    index.update(screen_positions)
+    for i in index.visible():
+        ...
+    body = index.pick(pygame.mouse.get_pos())
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import math
+
+import numpy as np
+
+
+class ScreenIndex:
+    """
+    @class ScreenIndex
+    @brief Grille triée des positions écran des corps, mise à jour à chaque image.
+
+    @param width Largeur de la zone affichée, en pixels.
+    @param height Hauteur de la zone affichée, en pixels.
+    @param cell_size Côté d'une cellule, en pixels.
+    @param margin Marge autour de la zone affichée (rayon du plus gros corps : un disque à cheval sur le bord reste visible).
+    """
+    def __init__(self, width, height, cell_size=16, margin=0):
+        self.cell_size = cell_size
+        self.resize(width, height, margin)
+        self.screen = np.zeros((0, 2))
+        self.order = np.zeros(0, dtype=np.int64)  # Corps triés par cellule, hors-champ à la fin
+        self.keys_sorted = np.zeros(0, dtype=np.int64)
+        self.starts = np.zeros(self.n_cells + 1, dtype=np.int64)  # Début de chaque cellule dans order
+
+    def __len__(self):
+        return len(self.order)
+
+    def resize(self, width, height, margin=0):
+        """
+        @brief Change la zone couverte (fenêtre redimensionnée, marge adaptée au zoom) ; prise en compte au prochain update.
+
+        @param width: Largeur de la zone affichée, en pixels.
+        @param height: Hauteur de la zone affichée, en pixels.
+        @param margin: Marge autour de la zone affichée, en pixels.
+        """
+        self.width = width
+        self.height = height
+        self.margin = margin
+        self.columns = math.ceil((width + 2 * margin) / self.cell_size)
+        self.rows = math.ceil((height + 2 * margin) / self.cell_size)
+        self.n_cells = self.columns * self.rows
+
+    def _cells(self, points):
+        """
+        @brief Colonne et ligne de cellule de chaque point (éventuellement hors de la grille).
+        """
+        cells = np.floor((np.asarray(points, dtype=np.float64) + self.margin) / self.cell_size)
+        return cells[..., 0], cells[..., 1]
+
+    def update(self, screen):
+        """
+        @brief Range les positions écran de l'image courante.
+
+        @param screen: Tableau (N, 2) de positions en pixels (flottants ; non copié).
+        """
+        column, row = self._cells(screen)
+        inside = (column >= 0) & (column < self.columns) & (row >= 0) & (row < self.rows)
+        keys = np.where(inside, column * self.rows + row, self.n_cells).astype(np.int64)
+        if len(self.order) == len(keys):
+            # Ordre précédent presque trié : le tri stable ne fait presque que vérifier
+            self.order = self.order[np.argsort(keys[self.order], kind="stable")]
+        else:
+            self.order = np.argsort(keys, kind="stable")
+        self.screen = screen
+        self.keys_sorted = keys[self.order]
+        self.starts = np.searchsorted(self.keys_sorted, np.arange(self.n_cells + 1))
+
+    def visible(self):
+        """
+        @brief Corps dans la zone affichée (marge comprise), rangés par cellule.
+
+        @return: Tableau d'indices.
+        """
+        return self.order[:self.starts[-1]]
+
+    def cell_counts(self):
+        """
+        @brief Nombre de corps de chaque cellule, tableau (colonnes x lignes).
+        """
+        return np.diff(self.starts)
+
+    def clusters(self, min_count=2, weights=None):
+        """
+        @brief Cellules d'au moins min_count corps, à dessiner par un seul représentant.
+
+        @param min_count: Population à partir de laquelle une cellule est regroupée.
+        @param weights: Poids des corps (taille, masse...) ; le représentant est le plus lourd (le premier par défaut).
+        @return: Indices des représentants, nombre de corps de leur cellule, et masque (N,) des corps
+        masqués (membres d'un groupe autres que son représentant).
+        """
+        counts = self.cell_counts()
+        crowded = np.flatnonzero(counts >= min_count)
+        hidden = np.zeros(len(self.order), dtype=bool)
+        if len(crowded) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), hidden
+        members = self.visible()
+        cell = self.keys_sorted[:len(members)]
+        if weights is not None:
+            # Dans chaque cellule, le plus lourd en tête (les cellules restent dans le même ordre)
+            members = members[np.lexsort((-np.asarray(weights, dtype=np.float64)[members], cell))]
+        representatives = members[self.starts[crowded]]
+        in_crowded = counts[cell] >= min_count
+        hidden[members[in_crowded]] = True
+        hidden[representatives] = False
+        return representatives, counts[crowded], hidden
+
+    def pick(self, point, tolerance=4.0, radii=None):
+        """
+        @brief Corps sous un point de l'écran (le plus proche, bord du disque compris).
+
+        Seules les cellules recouvertes par le rayon de recherche sont examinées.
+
+        @param point: Coordonnées (x, y) en pixels.
+        @param tolerance: Distance maximale au bord du corps, en pixels.
+        @param radii: Rayons des corps à l'écran, en pixels (points si None).
+        @return: Indice du corps, ou -1 si aucun.
+        """
+        reach = tolerance + (float(np.max(radii)) if radii is not None and len(radii) else 0.0)
+        (c0, c1), (r0, r1) = self._cells([np.subtract(point, reach), np.add(point, reach)])
+        c0, c1 = max(int(c0), 0), min(int(c1), self.columns - 1)
+        r0, r1 = max(int(r0), 0), min(int(r1), self.rows - 1)
+        if c0 > c1 or r0 > r1:
+            return -1
+        # Dans une colonne, les cellules r0..r1 sont consécutives dans l'ordre de l'index
+        columns = np.arange(c0, c1 + 1) * self.rows
+        lo = self.starts[columns + r0]
+        hi = self.starts[columns + r1 + 1]
+        candidates = np.concatenate([self.order[a:b] for a, b in zip(lo, hi)])
+        if len(candidates) == 0:
+            return -1
+        d = np.hypot(*(self.screen[candidates] - point).T)
+        if radii is not None:
+            d = d - np.asarray(radii)[candidates]
+        best = int(np.argmin(d))
+        return int(candidates[best]) if d[best] <= tolerance else -1
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    width, height = 800, 800
+    rng = np.random.default_rng(0)
+    # Corps sur des orbites circulaires, dont une partie hors de la fenêtre
+    radius = rng.uniform(0, 800, n)
+    angle = rng.uniform(0, 2 * np.pi, n)
+    speed = 0.02 / np.sqrt(np.maximum(radius, 1) / 800)
+
+    def screen_at(frame):
+        a = angle + speed * frame
+        return np.column_stack((width / 2 + radius * np.cos(a), height / 2 + radius * np.sin(a)))
+
+    index = ScreenIndex(width, height, margin=10)
+    start = time.perf_counter()
+    index.update(screen_at(0))
+    full = time.perf_counter() - start
+    frames = 20
+    start = time.perf_counter()
+    for frame in range(1, frames + 1):
+        index.update(screen_at(frame))
+    incremental = (time.perf_counter() - start) / frames
+    screen = screen_at(frames)
+    start = time.perf_counter()
+    for frame in range(frames):
+        screen_at(frame)
+    transform = (time.perf_counter() - start) / frames
+    print("%d corps, %d dans le champ" % (n, len(index.visible())))
+    print("  construction complète      : %.2f ms" % (full * 1e3))
+    print("  mise à jour par image      : %.2f ms (dont %.2f ms de calcul des positions)"
+          % (incremental * 1e3, transform * 1e3))
+
+    points = rng.uniform(0, width, (1000, 2))
+    start = time.perf_counter()
+    picked = [index.pick(p, tolerance=3) for p in points]
+    indexed = (time.perf_counter() - start) / len(points)
+    start = time.perf_counter()
+    brute = []
+    for p in points[:100]:
+        d = np.hypot(*(screen - p).T)
+        best = int(np.argmin(d))
+        brute.append(best if d[best] <= 3 else -1)
+    scan = (time.perf_counter() - start) / 100
+    assert picked[:100] == brute
+    print("  désignation                : %.1f µs (parcours complet : %.1f µs)" % (indexed * 1e6, scan * 1e6))
+
+    start = time.perf_counter()
+    representatives, counts, hidden = index.clusters(min_count=8)
+    print("  regroupement (>= 8/cellule) : %.2f ms, %d groupes, %d corps dessinés sur %d"
+          % ((time.perf_counter() - start) * 1e3, len(representatives),
+             len(index.visible()) - int(hidden.sum()), len(index.visible())))
@@ -0,0 +1,212 @@
+"""
+@file state.py
+@brief Stockage compact de l'état d'un système : un tableau NumPy par grandeur physique.
+
+Ce fichier contient la classe SystemState, qui range les corps en « structure de tableaux » :
+masse, éléments orbitaux, position, vitesse, taille, diamètre et indice du corps parent
+sont chacun un tableau contigu. Les classes de space_objects.py ne sont que des vues
+légères (__slots__) sur une ligne de ces tableaux ; les calculs physiques et le rendu
+peuvent travailler directement sur les tableaux entiers.
+
+Un corps occupe ~100 octets (plus son nom, facultatif pour les grandes populations) :
+100 000 astéroïdes tiennent dans une dizaine de Mo.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+
+# Nature des corps (tableau kind)
+KIND_BODY = 0
+KIND_STAR = 1
+KIND_PLANET = 2
+KIND_MOON = 3
+
+# Grandeurs scalaires, en float64 (NaN lorsqu'elles ne s'appliquent pas au corps)
+FLOAT_FIELDS = (
+    "mass",             # kg
+    "semi_major_axis",  # UA
+    "eccentricity",
+    "period",           # années terrestres
+    "orbit_radius",     # rayon de l'orbite d'une lune autour de sa planète, UA
+    "orbit_speed",      # vitesse angulaire d'une lune autour de sa planète
+    "size",             # taille d'affichage
+    "diameter_km",
+)
+# Grandeurs vectorielles (x, y)
+VECTOR_FIELDS = ("position", "velocity")
+
+
+class SystemState:
+    """
+    @class SystemState
+    @brief Ensemble de corps stocké en structure de tableaux, extensible.
+
+    Les tableaux publics (state.mass, state.position, ...) sont des vues sur les n premiers
+    éléments de tableaux de capacité supérieure, agrandis par doublement. Une vue obtenue
+    avant un agrandissement ne suit plus les modifications ultérieures.
+
+    @param capacity Capacité initiale.
+    """
+    def __init__(self, capacity=16):
+        self._n = 0
+        self._arrays = {}
+        for field in FLOAT_FIELDS:
+            self._arrays[field] = np.full(capacity, np.nan)
+        for field in VECTOR_FIELDS:
+            self._arrays[field] = np.zeros((capacity, 2))
+        self._arrays["parent"] = np.full(capacity, -1, dtype=np.int64)
+        self._arrays["kind"] = np.zeros(capacity, dtype=np.int8)
+        self.names = []
+        self.colors = []
+
+    def __len__(self):
+        return self._n
+
+    @property
+    def capacity(self):
+        """
+        @brief Nombre de corps que les tableaux peuvent recevoir sans être agrandis.
+        """
+        return len(self._arrays["kind"])
+
+    def _reserve(self, count):
+        """
+        @brief Agrandit les tableaux pour recevoir count corps de plus.
+
+        @param count: Nombre de corps à ajouter.
+        """
+        needed = self._n + count
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, 2 * self.capacity)
+        for field, array in self._arrays.items():
+            grown = np.full((capacity,) + array.shape[1:], -1 if field == "parent" else 0, dtype=array.dtype)
+            if array.dtype.kind == "f" and array.ndim == 1:
+                grown[:] = np.nan
+            grown[:self._n] = array[:self._n]
+            self._arrays[field] = grown
+
+    def add(self, kind, name, color=None, parent=-1, **fields):
+        """
+        @brief Ajoute un corps.
+
+        @param kind: Nature du corps (KIND_STAR, KIND_PLANET, ...).
+        @param name: Nom du corps.
+        @param color: Couleur d'affichage.
+        @param parent: Indice du corps parent (-1 si aucun).
+        @param fields: Valeurs des grandeurs de FLOAT_FIELDS et VECTOR_FIELDS (None pour NaN).
+        @return: Indice du corps.
+        """
+        self._reserve(1)
+        i = self._n
+        self._n += 1
+        self._arrays["kind"][i] = kind
+        self._arrays["parent"][i] = parent
+        for field, value in fields.items():
+            if field not in self._arrays:
+                raise KeyError("Grandeur inconnue : %s" % field)
+            self._arrays[field][i] = np.nan if value is None else value
+        self.names.append(name)
+        self.colors.append(color)
+        return i
+
+    def add_many(self, kind, count, names=None, colors=None, parent=-1, **fields):
+        """
+        @brief Ajoute count corps d'un coup à partir de tableaux, sans objet Python par corps.
+
+        @param kind: Nature des corps.
+        @param count: Nombre de corps.
+        @param names: Liste de noms (facultative : les corps sans nom s'appellent « #indice »).
+        @param colors: Liste de couleurs (facultative).
+        @param parent: Indice du parent commun, ou tableau d'indices.
+        @param fields: Tableaux (ou scalaires) des grandeurs de FLOAT_FIELDS et VECTOR_FIELDS.
+        @return: Intervalle range des indices ajoutés.
+        """
+        self._reserve(count)
+        first = self._n
+        rows = slice(first, first + count)
+        self._arrays["kind"][rows] = kind
+        self._arrays["parent"][rows] = parent
+        for field, values in fields.items():
+            if field not in self._arrays:
+                raise KeyError("Grandeur inconnue : %s" % field)
+            self._arrays[field][rows] = values
+        self.names.extend(names if names is not None else [None] * count)
+        self.colors.extend(colors if colors is not None else [None] * count)
+        self._n += count
+        return range(first, first + count)
+
+    def remove(self, indices):
+        """
+        @brief Retire des corps en compactant les tableaux sur place (la capacité est conservée).
+
+        Les corps suivants sont décalés vers le début et les indices de parent sont renumérotés
+        (-1 pour les corps dont le parent est retiré). Les vues (Planet, Moon...) créées avant
+        ne désignent plus les mêmes corps : les recréer avec body_view.
+
+        @param indices: Indices des corps à retirer.
+        """
+        indices = np.unique(np.asarray(indices, dtype=np.int64))
+        if len(indices) == 0:
+            return
+        keep = np.ones(self._n, dtype=bool)
+        keep[indices] = False
+        count = int(keep.sum())
+        renumber = np.where(keep, np.cumsum(keep) - 1, -1)
+        for field, array in self._arrays.items():
+            array[:count] = array[:self._n][keep]
+            if array.dtype.kind == "f" and array.ndim == 1:
+                array[count:self._n] = np.nan
+            else:
+                array[count:self._n] = -1 if field == "parent" else 0
+        parent = self._arrays["parent"][:count]
+        has_parent = parent >= 0
+        parent[has_parent] = renumber[parent[has_parent]]
+        removed = set(indices.tolist())
+        self.names = [name for i, name in enumerate(self.names) if i not in removed]
+        self.colors = [color for i, color in enumerate(self.colors) if i not in removed]
+        self._n = count
+
+    def name(self, i):
+        """
+        @brief Nom du corps i (« #i » s'il n'en a pas).
+        """
+        name = self.names[i]
+        return name if name is not None else "#%d" % i
+
+    def index(self, name):
+        """
+        @brief Indice du corps portant ce nom.
+        """
+        return self.names.index(name)
+
+    def select(self, kind):
+        """
+        @brief Indices des corps d'une nature donnée.
+
+        @param kind: Nature recherchée.
+        @return: Tableau d'indices.
+        """
+        return np.flatnonzero(self.kind == kind)
+
+    @property
+    def nbytes(self):
+        """
+        @brief Mémoire occupée par les tableaux (capacité comprise), en octets.
+        """
+        return sum(array.nbytes for array in self._arrays.values())
+
+
+def _array_property(field):
+    """
+    @brief Crée la propriété qui expose le tableau field limité aux corps existants.
+    """
+    def getter(self):
+        return self._arrays[field][:self._n]
+    return property(getter, doc="Tableau %s des corps du système." % field)
+
+
+for _field in FLOAT_FIELDS + VECTOR_FIELDS + ("parent", "kind"):
+    setattr(SystemState, _field, _array_property(_field))
@@ -1,5 +1,28 @@
 import pygame
 import math
+import argparse
+from collections import deque
+
+import numpy as np
+
+from trails import TrailBuffer, screen_trail, visible_runs
+from spatial import ScreenIndex
+from nbody import TIME_STEP, NBodySystem, reference_state
+from space_objects import CelestialBody as BodyView
+from encounters import COLLISION, EncounterDetector
+from trajectory import TrajectoryWriter, resume, save_checkpoint
+from profiling import Profiler
+from realtime import SimulationThread
+
+# Options de la ligne de commande
+parser = argparse.ArgumentParser(description="Démonstration gravitationnelle avec pygame.")
+parser.add_argument("trajectory", nargs="?", help="Chemin (sans extension) où enregistrer la trajectoire complète.")
+parser.add_argument("--profile", action="store_true", help="Affiche le temps par phase (p50/p95) et les compteurs.")
+parser.add_argument("--profile-out", help="Écrit les mesures à la fermeture (.trace.json : Chrome trace, .json : statistiques).")
+parser.add_argument("--warp", type=float, default=1.0, help="Accélération du temps au démarrage (Droite / Gauche la modifient).")
+parser.add_argument("--checkpoint", help="Point de contrôle (.npz) enregistré régulièrement et à la fermeture.")
+parser.add_argument("--resume", help="Reprend la simulation depuis ce point de contrôle (.npz).")
+args = parser.parse_args()
 
 # Initialisation de Pygame
 pygame.init()
@@ -9,172 +32,215 @@ WIDTH, HEIGHT = 800, 800
 screen = pygame.display.set_mode((WIDTH, HEIGHT))
 pygame.display.set_caption("Système Solaire")
 
-# Couleurs
+# Couleurs (celles des corps sont rangées dans le SystemState)
 BLACK = (0, 0, 0)
 WHITE = (255, 255, 255)
-YELLOW = (255, 255, 0)
-BLUE = (0, 0, 255)
-RED = (255, 0, 0)
-ORANGE = (255, 165, 0)
-GRAY = (128, 128, 128)
 
 # Constantes
-G = 6.67430e-11
 SCALE = 100 / 1.5e11  # 1.5e11 m = 100 pixels
-TIME_STEP = 3600 * 24  # 1 jour en secondes
+STEPS_PER_SECOND = 20  # Pas de simulation par seconde réelle, sans accélération du temps
+FPS = 60  # Cadence d'affichage
 zoom_factor = 1.0
-
-class CelestialBody:
-    def __init__(self, name, x, y, radius, color, mass, velocity_x, velocity_y):
-        self.name = name
-        self.x = x
-        self.y = y
-        self.radius = radius
-        self.color = color
-        self.mass = mass
-        self.velocity_x = velocity_x
-        self.velocity_y = velocity_y
-        self.orbit = []
-
-    def update_position(self, bodies):
-        total_fx = total_fy = 0
-        for other in bodies:
-            if self == other:
-                continue
-            dx = other.x - self.x
-            dy = other.y - self.y
-            distance = math.sqrt(dx**2 + dy**2)
-            force = (G * self.mass * other.mass) / (distance**2)
-            theta = math.atan2(dy, dx)
-            fx = math.cos(theta) * force
-            fy = math.sin(theta) * force
-            total_fx += fx
-            total_fy += fy
-        
-        self.velocity_x += (total_fx / self.mass) * TIME_STEP
-        self.velocity_y += (total_fy / self.mass) * TIME_STEP
-        self.x += self.velocity_x * TIME_STEP
-        self.y += self.velocity_y * TIME_STEP
-        self.orbit.append((self.x, self.y))
-
-    def draw(self):
-        x = int(self.x * SCALE * zoom_factor + WIDTH // 2)
-        y = int(self.y * SCALE * zoom_factor + HEIGHT // 2)
+pan = [0.0, 0.0]  # Décalage de la vue en pixels (glisser avec le bouton gauche)
+CLUSTER_PIXELS = 8  # En dessous de cet écart, les corps d'une même cellule sont dessinés par le plus gros
+TRAIL_LENGTH = 2000  # Nombre de positions conservées dans la traînée de chaque corps
+SOFTENING = 1e5  # Longueur d'adoucissement en mètres : la force reste finie si deux corps se rapprochent
+CHECKPOINT_EVERY = 1000  # Pas entre deux points de contrôle
+# Reprise : python test.py trajectoire --resume etat.npz (la trajectoire et le point de contrôle sont poursuivis)
+CHECKPOINT_FILE = args.checkpoint or args.resume
+# Chemin (sans extension) où enregistrer la trajectoire complète : python test.py trajectoire
+TRAJECTORY_FILE = args.trajectory
+
+# Chronométrage des phases de la boucle (interpolation, traînées, événements, flip) : python test.py --profile
+profiler = Profiler(enabled=args.profile or args.profile_out is not None)
+
+# Les corps (Soleil, Terre, Mars, Jupiter et leurs lunes) sont ceux du scénario de référence de nbody.py,
+# rangés dans un SystemState : la physique travaille sur ses tableaux, les objets n'en sont que des vues
+state = reference_state()
+writer = None
+if args.resume:
+    # Le point de contrôle est recopié dans le SystemState : les vues suivent la reprise
+    system, writer = resume(args.resume, TRAJECTORY_FILE, state=state)
+else:
+    system = NBodySystem.from_state(state, softening=SOFTENING)
+    if TRAJECTORY_FILE:
+        writer = TrajectoryWriter(TRAJECTORY_FILE, system.names)
+        writer.record(system)
+# Collisions (distance inférieure à la somme des rayons réels), signalées sans fusion : les vues
+# et les traînées gardent leurs corps
+detector = EncounterDetector(state.diameter_km * 500, hill_factor=0)
+
+
+class CelestialBody(BodyView):
+    # La vue garde sa traînée ; couleur et rayon sont lus une fois pour toutes dans le SystemState
+    __slots__ = ("orbit", "draw_color")
+
+    def draw_trail(self):
+        # Seules les portions de la traînée qui traversent l'écran sont tracées
         if len(self.orbit) > 2:
-            pygame.draw.lines(screen, self.color, False, [(int(px * SCALE * zoom_factor + WIDTH // 2), int(py * SCALE * zoom_factor + HEIGHT // 2)) for px, py in self.orbit], 1)
-        pygame.draw.circle(screen, self.color, (x, y), max(1, int(self.radius * zoom_factor)))
-
-class Moon(CelestialBody):
-    def __init__(self, name, planet, distance, radius, color, mass, velocity):
-        # Position de la lune à une distance initiale de la planète sur une orbite circulaire
-        # Placer la lune à un angle de 90° (en haut de la planète sur l'axe Y)
-        angle = math.pi / 2  # Placer la lune au-dessus de la planète
-        
-        x_position = planet.x + distance * math.cos(angle)
-        y_position = planet.y + distance * math.sin(angle)
-        
-        # Calcul de la vitesse orbitale initiale pour maintenir l'orbite circulaire
-        orbital_velocity = math.sqrt(G * planet.mass / distance)
-        
-        # Initialisation avec une vitesse perpendiculaire à la ligne reliant la planète et la lune
-        velocity_x = -orbital_velocity * math.sin(angle)  # Vitesse horizontale perpendiculaire
-        velocity_y = orbital_velocity * math.cos(angle)   # Vitesse verticale perpendiculaire
-        
-        super().__init__(name, x_position, y_position, radius, color, mass, velocity_x, velocity_y)
-        self.planet = planet
-        self.distance = distance  # Garde la distance par rapport à la planète
-
-    def update_position(self, bodies):
-        # Calcul de la force gravitationnelle de la planète
-        dx = self.planet.x - self.x
-        dy = self.planet.y - self.y
-        distance_to_planet = math.sqrt(dx**2 + dy**2)
-        
-        # Calculer la force gravitationnelle exercée par la planète sur la lune
-        force_planet = (G * self.mass * self.planet.mass) / (distance_to_planet**2)
-        angle = math.atan2(dy, dx)
-        
-        # Mise à jour de la vitesse de la lune en fonction de la gravité de la planète
-        fx_planet = math.cos(angle) * force_planet
-        fy_planet = math.sin(angle) * force_planet
-        
-        # Appliquer la vitesse à la lune (mouvement à cause de la planète)
-        self.velocity_x += (fx_planet / self.mass) * TIME_STEP
-        self.velocity_y += (fy_planet / self.mass) * TIME_STEP
-        
-        # Maintenant, on doit prendre en compte l'attraction des autres corps, mais de façon limitée
-        total_fx = total_fy = 0
-        for other in bodies:
-            if self == other or other == self.planet:
-                continue
-            dx = other.x - self.x
-            dy = other.y - self.y
-            distance = math.sqrt(dx**2 + dy**2)
-            force = (G * self.mass * other.mass) / (distance**2)
-            angle = math.atan2(dy, dx)
-            fx = math.cos(angle) * force
-            fy = math.sin(angle) * force
-            
-            # Limiter l'effet de ces autres corps sur la lune pour éviter qu'elle s'éloigne trop
-            total_fx += fx / 10  # Diviser par 10 pour réduire l'impact
-            total_fy += fy / 10  # Diviser par 10 pour réduire l'impact
-        
-        # Réduire l'influence gravitationnelle du Soleil sur la lune
-        if isinstance(self.planet, CelestialBody) and self.planet == earth:  # Si c'est une lune de la Terre, réduire l'influence du Soleil
-            for other in bodies:
-                if other == sun:  # Si le corps en question est le Soleil
-                    dx = other.x - self.x
-                    dy = other.y - self.y
-                    distance = math.sqrt(dx**2 + dy**2)
-                    force_sun = (G * self.mass * other.mass) / (distance**2)
-                    force_sun /= 50  # Réduire l'influence gravitationnelle du Soleil (facteur de 50)
-                    angle_sun = math.atan2(dy, dx)
-                    fx_sun = math.cos(angle_sun) * force_sun
-                    fy_sun = math.sin(angle_sun) * force_sun
-                    total_fx += fx_sun / 10
-                    total_fy += fy_sun / 10
-
-        # Appliquer ces forces supplémentaires à la vitesse de la lune
-        self.velocity_x += (total_fx / self.mass) * TIME_STEP
-        self.velocity_y += (total_fy / self.mass) * TIME_STEP
-        
-        # Mise à jour de la position de la lune
-        self.x += self.velocity_x * TIME_STEP
-        self.y += self.velocity_y * TIME_STEP
-        
-        # Ajouter l'orbite de la lune
-        self.orbit.append((self.x, self.y))
-
-
-# Création des planètes et lunes
-sun = CelestialBody("Soleil", 0, 0, 30, YELLOW, 1.989e30, 0, 0)
-earth = CelestialBody("Terre", 1.5e11, 0, 10, BLUE, 5.972e24, 0, 29780)
-mars = CelestialBody("Mars", 2.28e11, 0, 7, RED, 6.39e23, 0, 24070)
-jupiter = CelestialBody("Jupiter", 7.78e11, 0, 20, ORANGE, 1.898e27, 0, 13070)
-
-moon = Moon("Lune", earth, 3.84e8, 3, GRAY, 7.35e22, 1022)
-phobos = Moon("Phobos", mars, 9.38e6, 2, GRAY, 1.07e16, 2138)
-deimos = Moon("Deimos", mars, 2.34e7, 2, GRAY, 1.48e15, 1351)
-
-bodies = [sun, earth, mars, jupiter, moon, phobos, deimos]
+            points = screen_trail(self.orbit, SCALE, zoom_factor, WIDTH, HEIGHT, offset=pan)
+            for run in visible_runs(points, WIDTH, HEIGHT):
+                pygame.draw.lines(screen, self.draw_color, False, run.tolist(), 1)
+                profiler.count("points", len(run))
+
+    def draw(self, position, radius):
+        # position : coordonnées écran interpolées par le fil de simulation (l'état peut être en cours de modification)
+        pygame.draw.circle(screen, self.draw_color, (int(position[0]), int(position[1])), int(radius))
+
+
+bodies = []
+for i in range(len(state)):
+    body = CelestialBody._view(state, i)
+    body.orbit = TrailBuffer(TRAIL_LENGTH)
+    body.draw_color = body.color
+    bodies.append(body)
+
+# Positions après chaque pas, en attente d'être ajoutées aux traînées par la boucle d'affichage :
+# un point par pas de simulation, quels que soient la cadence d'affichage et le warp
+trail_samples = deque(maxlen=TRAIL_LENGTH)
+
+
+def checkpoint():
+    # La trajectoire est écrite jusqu'à cet état avant que le point de contrôle n'y fasse référence
+    if writer:
+        writer.flush()
+    save_checkpoint(CHECKPOINT_FILE, system, writer.records if writer else 0)
+
+
+def step():
+    # Exécuté par le fil de simulation uniquement
+    with profiler.phase("physique"):
+        events = detector.step(system, TIME_STEP)
+        trail_samples.append((system.time, state.position.copy()))
+    for event in events[events["kind"] == COLLISION] if len(events) else ():
+        print("Collision à t = %.0f j : %s et %s (%.0f m/s)" % (
+            event["time"] / 86400, event["body1"], event["body2"], event["speed"]))
+    if writer:
+        with profiler.phase("écriture"):
+            writer.record(system)
+    if CHECKPOINT_FILE and round(system.time / TIME_STEP) % CHECKPOINT_EVERY == 0:
+        with profiler.phase("écriture"):
+            checkpoint()
+
+
+# La physique avance sur son propre fil, à cadence fixe multipliée par le warp ; l'affichage
+# interpole entre ses deux derniers instantanés : python test.py, puis Droite / Gauche / Espace
+warp = max(1.0, args.warp)
+simulation = SimulationThread(step, lambda: state.position, dt=TIME_STEP, rate=STEPS_PER_SECOND, warp=warp,
+                              start_time=system.time)
+simulation.start()
+pygame.display.set_caption("Système Solaire (x%g)" % warp)
+paused = False
+positions = None
+steps_drawn = 0
+clock = pygame.time.Clock()
+
+# Index des positions écran : corps hors champ ignorés, corps confondus regroupés, corps sous le curseur
+index = ScreenIndex(WIDTH, HEIGHT, cell_size=CLUSTER_PIXELS)
+body_radii = state.size.astype(np.float64)
+label_font = pygame.font.Font(None, 20)
+followed = -1  # Corps suivi par la vue (clic sur un corps), -1 : aucun
+dragged = False
+
+font = pygame.font.SysFont("monospace", 12) if profiler.enabled else None
 
 running = True
 while running:
     screen.fill(BLACK)
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_UP:
-                zoom_factor *= 1.1  # Zoom in
-            elif event.key == pygame.K_DOWN:
-                zoom_factor /= 1.1  # Zoom out
-    
-    for body in bodies:
-        body.update_position(bodies)
-        body.draw()
-    
-    pygame.display.flip()
-    pygame.time.delay(50)
-
+    with profiler.phase("événements"):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_UP:
+                    zoom_factor *= 1.1  # Zoom in
+                    pan = [pan[0] * 1.1, pan[1] * 1.1]
+                elif event.key == pygame.K_DOWN:
+                    zoom_factor /= 1.1  # Zoom out
+                    pan = [pan[0] / 1.1, pan[1] / 1.1]
+                elif event.key == pygame.K_RIGHT:
+                    warp *= 2  # Accélère le temps
+                elif event.key == pygame.K_LEFT:
+                    warp = max(1.0, warp / 2)  # Ralentit le temps
+                elif event.key == pygame.K_SPACE:
+                    paused = not paused
+                simulation.warp = 0.0 if paused else warp
+                pygame.display.set_caption("Système Solaire (x%g%s)" % (warp, ", pause" if paused else ""))
+            elif event.type == pygame.MOUSEWHEEL:
+                # Zoom autour du curseur : le point sous le curseur reste en place
+                factor = 1.1 ** event.y
+                mx, my = pygame.mouse.get_pos()
+                zoom_factor *= factor
+                pan = [mx - WIDTH // 2 - (mx - WIDTH // 2 - pan[0]) * factor,
+                       my - HEIGHT // 2 - (my - HEIGHT // 2 - pan[1]) * factor]
+            elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+                dragged = False
+            elif event.type == pygame.MOUSEMOTION and event.buttons[0]:
+                pan = [pan[0] + event.rel[0], pan[1] + event.rel[1]]
+                dragged = True
+                followed = -1
+            elif event.type == pygame.MOUSEBUTTONUP and event.button == 1 and not dragged:
+                # Clic : la vue suit le corps désigné (ou plus aucun)
+                followed = index.pick(event.pos, radii=np.maximum(1, body_radii * zoom_factor))
+
+    # Positions interpolées entre les deux derniers instantanés de la simulation
+    with profiler.phase("interpolation"):
+        positions, shown_time = simulation.interpolate(positions)
+    with profiler.phase("traînées"):
+        # Pas déjà atteints par l'affichage : la traînée s'arrête au corps dessiné
+        samples = []
+        while trail_samples and trail_samples[0][0] <= shown_time:
+            samples.append(trail_samples.popleft()[1])
+        if samples:
+            samples = np.stack(samples)
+            for i, body in enumerate(bodies):
+                body.orbit.extend(samples[:, i])
+    steps = simulation.steps
+    profiler.count("corps", len(bodies))
+    profiler.count("pas", steps - steps_drawn)
+    profiler.count("paires", (steps - steps_drawn) * len(bodies) * (len(bodies) - 1))
+    profiler.count("warp", simulation.effective_warp)
+    steps_drawn = steps
+    with profiler.phase("index"):
+        if followed >= 0:
+            pan = [-positions[followed, 0] * SCALE * zoom_factor, -positions[followed, 1] * SCALE * zoom_factor]
+        screen_positions = positions * (SCALE * zoom_factor)
+        screen_positions += (WIDTH // 2 + pan[0], HEIGHT // 2 + pan[1])
+        radii = np.maximum(1, body_radii * zoom_factor)
+        margin = math.ceil(radii.max())
+        if margin != index.margin:
+            index.resize(WIDTH, HEIGHT, margin)
+        index.update(screen_positions)
+        # Corps confondus à l'écran : seul le plus gros est dessiné, avec sa traînée
+        _, _, hidden = index.clusters(weights=body_radii)
+    with profiler.phase("dessin"):
+        for i, body in enumerate(bodies):
+            if not hidden[i]:
+                body.draw_trail()
+        drawn = [i for i in index.visible() if not hidden[i]]
+        for i in drawn:
+            bodies[i].draw(screen_positions[i], radii[i])
+    profiler.count("dessinés", len(drawn))
+
+    # Nom du corps sous le curseur
+    hovered = index.pick(pygame.mouse.get_pos(), radii=radii)
+    if hovered >= 0:
+        mx, my = pygame.mouse.get_pos()
+        screen.blit(label_font.render(bodies[hovered].name, True, WHITE), (mx + 12, my + 4))
+
+    if font:
+        for i, line in enumerate(profiler.overlay_lines()):
+            screen.blit(font.render(line, True, WHITE), (10, 10 + 14 * i))
+    with profiler.phase("flip"):
+        pygame.display.flip()
+    profiler.frame()
+    clock.tick(FPS)
+
+simulation.stop()
+if CHECKPOINT_FILE:
+    checkpoint()
+if writer:
+    writer.close()
+if args.profile_out:
+    profiler.save(args.profile_out)
 pygame.quit()
\ No newline at end of file
@@ -0,0 +1,167 @@
+"""
+@file trails.py
+@brief Stockage borné des traînées d'orbite et préparation vectorisée de leur tracé.
+
+Ce fichier contient la classe TrailBuffer, un tampon circulaire NumPy de capacité fixe,
+et les fonctions qui convertissent une traînée en coordonnées écran et l'allègent selon
+le zoom. La mémoire et le coût de tracé par image ne dépendent plus de la durée simulée.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+
+
+class TrailBuffer:
+    """
+    @class TrailBuffer
+    @brief Tampon circulaire des dernières positions d'un corps.
+
+    Chaque point est écrit deux fois, à l'indice i et à l'indice i + capacité :
+    les points, du plus ancien au plus récent, forment donc toujours une tranche
+    contiguë du tableau, lue sans copie.
+
+    @param capacity Nombre maximal de points conservés.
+    """
+    def __init__(self, capacity=2000):
+        self.capacity = capacity
+        self._data = np.zeros((2 * capacity, 2))
+        self._next = 0  # Indice d'écriture du prochain point, dans [0, capacity)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def append(self, point):
+        """
+        @brief Ajoute une position ; la plus ancienne est oubliée si le tampon est plein.
+
+        @param point: Coordonnées (x, y).
+        """
+        i = self._next
+        self._data[i] = point
+        self._data[i + self.capacity] = point
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, points):
+        """
+        @brief Ajoute plusieurs positions d'un coup, de la plus ancienne à la plus récente.
+
+        @param points: Tableau (k, 2) ; seuls les capacity derniers points sont gardés si k est plus grand.
+        """
+        points = np.asarray(points)[-self.capacity:]
+        if len(points) == 0:
+            return
+        rows = (self._next + np.arange(len(points))) % self.capacity
+        self._data[rows] = points
+        self._data[rows + self.capacity] = points
+        self._next = (self._next + len(points)) % self.capacity
+        self._size = min(self._size + len(points), self.capacity)
+
+    def clear(self):
+        """
+        @brief Efface la traînée.
+        """
+        self._next = 0
+        self._size = 0
+
+    def points(self):
+        """
+        @brief Renvoie les points du plus ancien au plus récent.
+
+        @return: Vue (n, 2) sur le tampon (à ne pas modifier).
+        """
+        end = self._next + self.capacity
+        return self._data[end - self._size:end]
+
+
+def world_to_screen(points, scale, zoom, width, height, offset=(0, 0)):
+    """
+    @brief Convertit des coordonnées en mètres en pixels, centrées sur l'écran.
+
+    @param points: Tableau (n, 2) de positions en mètres.
+    @param scale: Pixels par mètre.
+    @param zoom: Facteur de zoom.
+    @param width: Largeur de l'écran en pixels.
+    @param height: Hauteur de l'écran en pixels.
+    @param offset: Décalage (x, y) de la vue, en pixels.
+    @return: Tableau (n, 2) d'entiers.
+    """
+    screen = points * (scale * zoom)
+    screen[:, 0] += width // 2 + offset[0]
+    screen[:, 1] += height // 2 + offset[1]
+    return screen.astype(np.int32)
+
+
+def decimation_stride(points, pixels_per_meter, min_pixels=2.0, sample=16):
+    """
+    @brief Choisit un pas de sous-échantillonnage pour que deux points tracés soient espacés d'au moins min_pixels.
+
+    L'espacement est estimé sur les derniers segments de la traînée : en dézoomant,
+    les points se resserrent à l'écran et un point sur k suffit.
+
+    @param points: Tableau (n, 2) de positions en mètres, du plus ancien au plus récent.
+    @param pixels_per_meter: Échelle courante (échelle x zoom).
+    @param min_pixels: Espacement minimal à l'écran entre deux points tracés.
+    @param sample: Nombre de segments récents utilisés pour l'estimation.
+    @return: Pas entier >= 1.
+    """
+    if len(points) < 2:
+        return 1
+    recent = points[-(sample + 1):]
+    d = np.diff(recent, axis=0)
+    step = float(np.mean(np.hypot(d[:, 0], d[:, 1]))) * pixels_per_meter
+    if step <= 0:
+        return len(points)
+    return max(1, int(min_pixels / step))
+
+
+def screen_trail(trail, scale, zoom, width, height, min_pixels=2.0, offset=(0, 0)):
+    """
+    @brief Prépare le tracé d'une traînée : sous-échantillonnage selon le zoom puis conversion en pixels.
+
+    Le point le plus récent est toujours conservé, pour que la traînée rejoigne le corps.
+
+    @param trail: Le TrailBuffer.
+    @param scale: Pixels par mètre.
+    @param zoom: Facteur de zoom.
+    @param width: Largeur de l'écran en pixels.
+    @param height: Hauteur de l'écran en pixels.
+    @param min_pixels: Espacement minimal à l'écran entre deux points tracés.
+    @param offset: Décalage (x, y) de la vue, en pixels.
+    @return: Tableau (m, 2) d'entiers.
+    """
+    points = trail.points()
+    stride = decimation_stride(points, scale * zoom, min_pixels)
+    if stride > 1:
+        points = points[(len(points) - 1) % stride::stride]
+    return world_to_screen(points, scale, zoom, width, height, offset)
+
+
+def visible_runs(points, width, height):
+    """
+    @brief Découpe une traînée en portions dont les segments peuvent traverser l'écran.
+
+    Un segment est éliminé si ses deux extrémités sont du même côté extérieur de l'écran
+    (toutes deux à gauche, à droite, au-dessus ou au-dessous).
+
+    @param points: Tableau (m, 2) de points en pixels.
+    @param width: Largeur de l'écran en pixels.
+    @param height: Hauteur de l'écran en pixels.
+    @return: Liste de tableaux (k, 2), k >= 2, à tracer chacun d'un seul trait.
+    """
+    if len(points) < 2:
+        return []
+    x, y = points[:, 0], points[:, 1]
+    left, right, above, below = x < 0, x >= width, y < 0, y >= height
+    hidden = ((left[1:] & left[:-1]) | (right[1:] & right[:-1])
+              | (above[1:] & above[:-1]) | (below[1:] & below[:-1]))
+    if not hidden.any():
+        return [points]
+    # Débuts et fins des suites de segments visibles
+    edges = np.diff(np.concatenate(([True], hidden, [True])).astype(np.int8))
+    starts = np.flatnonzero(edges == -1)
+    ends = np.flatnonzero(edges == 1)
+    return [points[a:b + 1] for a, b in zip(starts, ends)]
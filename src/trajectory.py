@@ -0,0 +1,336 @@
+"""
+@file trajectory.py
+@brief Enregistrement des trajectoires sur disque au fil de la simulation, et reprise sur point de contrôle.
+
+Ce fichier contient :
+- TrajectoryWriter, qui ajoute les positions et vitesses de tous les corps, à une cadence
+  choisie, à la fin d'un fichier .npy ouvert en ajout. Les enregistrements sont écrits par
+  lots et l'en-tête du fichier est mis à jour après chaque lot : le fichier est lisible
+  à tout moment, même pendant la simulation ou après un arrêt brutal ;
+- Trajectory, qui projette ce fichier en mémoire et en extrait un corps ou un intervalle
+  de temps sans tout charger ;
+- save_checkpoint et load_checkpoint, qui enregistrent l'état complet d'un NBodySystem
+  (positions, vitesses, masses, date, accélérations en cache, solveur et intégrateur) pour
+  reprendre une longue simulation exactement où elle s'est arrêtée ;
+- run, qui fait avancer un système en alimentant ces deux sorties.
+
+Exemple :
+
+    system = reference_scenario()
+    with TrajectoryWriter("traj", system.names, interval=TIME_STEP) as writer:
+        run(system, 3650, TIME_STEP, writer=writer, checkpoint="etat.npz")
+    # Après une interruption :
+    system, writer = resume("etat.npz", "traj")
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import json
+import os
+import pickle
+import struct
+
+import numpy as np
+
+from nbody import NBodySystem, TIME_STEP
+
+_MAGIC = np.lib.format.magic(1, 0)
+
+
+def record_dtype(n_bodies, dtype=np.float64):
+    """
+    @brief Type d'un enregistrement : date, puis positions et vitesses de tous les corps.
+
+    @param n_bodies: Nombre de corps.
+    @param dtype: Type des flottants enregistrés (float32 divise la taille du fichier par deux).
+    @return: dtype NumPy structuré.
+    """
+    dtype = np.dtype(dtype).str
+    return np.dtype([("time", "<f8"), ("position", dtype, (n_bodies, 2)), ("velocity", dtype, (n_bodies, 2))])
+
+
+def _header(dtype, count):
+    """
+    @brief Construit l'en-tête .npy d'un tableau de count enregistrements, de taille fixe pour un dtype donné.
+
+    Le nombre d'enregistrements est réservé sur 20 chiffres : l'en-tête peut être réécrit
+    sur place quand le fichier grandit, sans déplacer les données.
+    """
+    text = "{'descr': %r, 'fortran_order': False, 'shape': (%20d,), }" % (
+        np.lib.format.dtype_to_descr(dtype), count)
+    size = -(-(len(_MAGIC) + 2 + len(text) + 1) // 64) * 64
+    text = text.ljust(size - len(_MAGIC) - 2 - 1) + "\n"
+    return _MAGIC + struct.pack("<H", len(text)) + text.encode("latin1")
+
+
+class TrajectoryWriter:
+    """
+    @class TrajectoryWriter
+    @brief Écrit les positions et vitesses des corps dans un fichier .npy en ajout, par lots.
+
+    Écrit path.npy (tableau d'enregistrements, voir record_dtype) et path.json (noms des corps
+    et cadence). Un enregistrement est pris dès que la date du système atteint la date de
+    sortie suivante : avec interval = 10 pas de temps, un pas sur dix est conservé.
+
+    @param path Chemin sans extension.
+    @param names Noms des corps.
+    @param interval Durée simulée entre deux enregistrements, en secondes (0 : à chaque appel).
+    @param chunk_size Nombre d'enregistrements gardés en mémoire avant d'être écrits.
+    @param dtype Type des flottants enregistrés.
+    @param records Pour reprendre un fichier existant : nombre d'enregistrements à conserver
+                   (ceux écrits après le point de contrôle sont effacés). None crée un nouveau fichier.
+    """
+    def __init__(self, path, names, interval=0.0, chunk_size=256, dtype=np.float64, records=None):
+        self.path = path
+        self.names = list(names)
+        self.interval = interval
+        self.dtype = record_dtype(len(self.names), dtype)
+        self._buffer = np.zeros(chunk_size, dtype=self.dtype)
+        self._pending = 0
+        self._header_size = len(_header(self.dtype, 0))
+
+        if records is None:
+            self._file = open(path + ".npy", "w+b")
+            self._file.write(_header(self.dtype, 0))
+            self.count = 0
+            self.next_time = None
+            meta = {"names": self.names, "interval": interval, "dtype": np.dtype(dtype).str}
+            with open(path + ".json", "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False)
+        else:
+            self._file = open(path + ".npy", "r+b")
+            self._file.truncate(self._header_size + records * self.dtype.itemsize)
+            self.count = records
+            self._write_header()
+            self.next_time = None
+            if records:
+                self._file.seek(self._header_size + (records - 1) * self.dtype.itemsize)
+                last = np.frombuffer(self._file.read(self.dtype.itemsize), dtype=self.dtype)
+                self.next_time = float(last["time"][0]) + interval
+        self._file.seek(0, os.SEEK_END)
+
+    def _write_header(self):
+        self._file.seek(0)
+        self._file.write(_header(self.dtype, self.count))
+        self._file.seek(0, os.SEEK_END)
+
+    def write(self, time, positions, velocities):
+        """
+        @brief Ajoute un enregistrement si la date de sortie suivante est atteinte.
+
+        @param time: Date en secondes.
+        @param positions: Tableau (N, 2).
+        @param velocities: Tableau (N, 2).
+        @return: Vrai si l'enregistrement a été pris.
+        """
+        if self.next_time is not None and time < self.next_time - 1e-9 * max(self.interval, 1.0):
+            return False
+        record = self._buffer[self._pending]
+        record["time"] = time
+        record["position"] = positions
+        record["velocity"] = velocities
+        self._pending += 1
+        self.next_time = time + self.interval
+        if self._pending == len(self._buffer):
+            self.flush()
+        return True
+
+    def record(self, system):
+        """
+        @brief Ajoute l'état courant d'un NBodySystem (voir write).
+
+        @param system: Le NBodySystem.
+        @return: Vrai si l'enregistrement a été pris.
+        """
+        return self.write(system.time, system.positions, system.velocities)
+
+    @property
+    def records(self):
+        """
+        @brief Nombre total d'enregistrements, écrits ou en attente.
+        """
+        return self.count + self._pending
+
+    def flush(self):
+        """
+        @brief Écrit les enregistrements en attente puis met à jour l'en-tête.
+
+        Les données sont écrites avant l'en-tête : après un arrêt brutal, le fichier
+        reste lisible et contient tous les lots complets.
+        """
+        if self._pending:
+            self._file.write(self._buffer[:self._pending].tobytes())
+            self._file.flush()
+            self.count += self._pending
+            self._pending = 0
+            self._write_header()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """
+        @brief Écrit les enregistrements en attente et ferme le fichier.
+        """
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Trajectory:
+    """
+    @class Trajectory
+    @brief Lecture d'un fichier écrit par TrajectoryWriter, projeté en mémoire.
+
+    @param path Chemin sans extension.
+    """
+    def __init__(self, path):
+        with open(path + ".json", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.names = meta["names"]
+        self.interval = meta["interval"]
+        self.data = np.load(path + ".npy", mmap_mode="r")
+        self.times = self.data["time"]
+
+    def __len__(self):
+        return len(self.data)
+
+    def _rows(self, t0, t1):
+        """
+        @brief Tranche des enregistrements dont la date est comprise entre t0 et t1 (bornes incluses).
+        """
+        first = 0 if t0 is None else int(np.searchsorted(self.times, t0, side="left"))
+        last = len(self.data) if t1 is None else int(np.searchsorted(self.times, t1, side="right"))
+        return slice(first, last)
+
+    def _columns(self, bodies):
+        if bodies is None:
+            return slice(None)
+        if isinstance(bodies, str):
+            return self.names.index(bodies)
+        return [self.names.index(name) for name in bodies]
+
+    def positions(self, bodies=None, t0=None, t1=None):
+        """
+        @brief Positions d'un ou plusieurs corps entre deux dates.
+
+        Seules les pages du fichier qui contiennent la tranche demandée sont lues.
+
+        @param bodies: Nom d'un corps, liste de noms, ou None pour tous.
+        @param t0: Date de début (None : depuis le début).
+        @param t1: Date de fin (None : jusqu'à la fin).
+        @return: Tableau (T, 2) pour un corps, (T, k, 2) sinon.
+        """
+        return self.data["position"][self._rows(t0, t1), self._columns(bodies)]
+
+    def velocities(self, bodies=None, t0=None, t1=None):
+        """
+        @brief Vitesses d'un ou plusieurs corps entre deux dates (voir positions).
+        """
+        return self.data["velocity"][self._rows(t0, t1), self._columns(bodies)]
+
+
+def save_checkpoint(path, system, records=0):
+    """
+    @brief Enregistre l'état complet d'un système, de façon atomique.
+
+    Le fichier est d'abord écrit sous un nom temporaire puis renommé : un arrêt pendant
+    l'écriture laisse intact le point de contrôle précédent.
+
+    @param path: Fichier .npz.
+    @param system: Le NBodySystem.
+    @param records: Nombre d'enregistrements de trajectoire correspondant à cet état.
+    """
+    config = pickle.dumps((system.solver, system.integrator))
+    temporary = path + ".tmp.npz"
+    np.savez(temporary,
+             names=np.array(system.names), positions=system.positions, velocities=system.velocities,
+             masses=system.masses, accelerations=system.accelerations,
+             acc_time=np.nan if system._acc_time is None else system._acc_time,
+             time=system.time, softening=system.softening, force_evaluations=system.force_evaluations,
+             records=records, config=np.frombuffer(config, dtype=np.uint8))
+    os.replace(temporary, path)
+
+
+def load_checkpoint(path, state=None):
+    """
+    @brief Recrée un système à partir d'un point de contrôle.
+
+    Avec un SystemState, l'état est recopié dans ses tableaux et le système travaille
+    directement dessus (NBodySystem.from_state) : les vues sur ses corps suivent la reprise.
+
+    @param path: Fichier .npz écrit par save_checkpoint.
+    @param state: SystemState qui reçoit l'état, avec les mêmes corps dans le même ordre, ou None.
+    @return: (NBodySystem, nombre d'enregistrements de trajectoire correspondant).
+    """
+    with np.load(path) as data:
+        solver, integrator = pickle.loads(data["config"].tobytes())
+        names = data["names"].tolist()
+        if state is None:
+            system = NBodySystem(names, data["positions"], data["velocities"], data["masses"],
+                                 softening=float(data["softening"]), solver=solver, integrator=integrator)
+        else:
+            if [state.name(i) for i in range(len(state))] != names:
+                raise ValueError("Le point de contrôle %s ne contient pas les corps du SystemState" % path)
+            state.position[:] = data["positions"]
+            state.velocity[:] = data["velocities"]
+            state.mass[:] = data["masses"]
+            system = NBodySystem.from_state(state, softening=float(data["softening"]), solver=solver,
+                                            integrator=integrator)
+        system.time = float(data["time"])
+        system.force_evaluations = int(data["force_evaluations"])
+        acc_time = float(data["acc_time"])
+        if not np.isnan(acc_time):
+            system.accelerations[:] = data["accelerations"]
+            system._acc_time = acc_time
+        return system, int(data["records"])
+
+
+def resume(checkpoint, trajectory=None, chunk_size=256, state=None):
+    """
+    @brief Reprend une simulation interrompue : système du point de contrôle et trajectoire tronquée à ce point.
+
+    @param checkpoint: Fichier .npz du point de contrôle.
+    @param trajectory: Chemin (sans extension) de la trajectoire à poursuivre, ou None.
+    @param chunk_size: Taille des lots du TrajectoryWriter.
+    @param state: SystemState qui reçoit l'état (voir load_checkpoint), ou None.
+    @return: (NBodySystem, TrajectoryWriter ou None).
+    """
+    system, records = load_checkpoint(checkpoint, state=state)
+    if trajectory is None:
+        return system, None
+    with open(trajectory + ".json", encoding="utf-8") as f:
+        meta = json.load(f)
+    writer = TrajectoryWriter(trajectory, meta["names"], interval=meta["interval"], chunk_size=chunk_size,
+                              dtype=meta["dtype"], records=records)
+    return system, writer
+
+
+def run(system, n_steps, dt=TIME_STEP, writer=None, checkpoint=None, checkpoint_every=1000):
+    """
+    @brief Fait avancer un système en enregistrant sa trajectoire et des points de contrôle réguliers.
+
+    @param system: Le NBodySystem.
+    @param n_steps: Nombre de pas.
+    @param dt: Pas de temps en secondes.
+    @param writer: TrajectoryWriter, ou None.
+    @param checkpoint: Fichier .npz des points de contrôle, ou None.
+    @param checkpoint_every: Nombre de pas entre deux points de contrôle.
+    """
+    if writer is not None and writer.records == 0:
+        writer.record(system)
+    for step in range(1, n_steps + 1):
+        system.step(dt)
+        if writer is not None:
+            writer.record(system)
+        if checkpoint is not None and (step % checkpoint_every == 0 or step == n_steps):
+            # La trajectoire est écrite jusqu'à cet état avant que le point de contrôle n'y fasse référence
+            if writer is not None:
+                writer.flush()
+            save_checkpoint(checkpoint, system, writer.records if writer is not None else 0)
@@ -0,0 +1,12 @@
+"""
+@file conftest.py
+@brief Configuration pytest : les modules de src/ s'importent directement (import nbody), comme dans les scripts.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
@@ -0,0 +1,51 @@
+"""
+@file test_barnes_hut.py
+@brief Tests du solveur de Barnes-Hut, comparé à la sommation directe.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+
+from barnes_hut import BarnesHutSolver
+from nbody import DirectSolver, random_scenario
+
+
+def _accelerations(solver, system, targets=None):
+    out = np.zeros((len(system), 2))
+    return solver.accelerations(system.positions, system.masses, system.softening, out, targets=targets)
+
+
+def test_theta_zero_matches_direct_summation():
+    system = random_scenario(300, seed=1)
+    direct = _accelerations(DirectSolver(), system)
+    tree = _accelerations(BarnesHutSolver(theta=0.0, leaf_size=4), system)
+    np.testing.assert_allclose(tree, direct, rtol=1e-10, atol=1e-20)
+
+
+def test_theta_zero_with_softening_and_test_particles():
+    system = random_scenario(200, seed=2, softening=1e9)
+    system.masses[150:] = 0.0  # Particules tests : subissent la gravité sans l'exercer
+    direct = _accelerations(DirectSolver(), system)
+    tree = _accelerations(BarnesHutSolver(theta=0.0), system)
+    np.testing.assert_allclose(tree, direct, rtol=1e-10, atol=1e-20)
+
+
+def test_targets_only_update_their_rows():
+    system = random_scenario(100, seed=3)
+    targets = np.array([0, 7, 42, 99])
+    out = np.full((len(system), 2), 123.0)
+    BarnesHutSolver(theta=0.0).accelerations(system.positions, system.masses, 0.0, out, targets=targets)
+    direct = _accelerations(DirectSolver(), system)
+    np.testing.assert_allclose(out[targets], direct[targets], rtol=1e-10)
+    untouched = np.setdiff1d(np.arange(len(system)), targets)
+    assert np.all(out[untouched] == 123.0)
+
+
+def test_opening_angle_error_is_small():
+    system = random_scenario(500, seed=4)
+    direct = _accelerations(DirectSolver(), system)
+    tree = _accelerations(BarnesHutSolver(theta=0.5), system)
+    error = np.linalg.norm(tree - direct, axis=1) / np.linalg.norm(direct, axis=1)
+    assert np.median(error) < 1e-3
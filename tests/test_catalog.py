@@ -0,0 +1,48 @@
+"""
+@file test_catalog.py
+@brief Tests du chargement des catalogues tabulaires (CSV, .npz, colonnes .npy) dans un SystemState.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+import pytest
+
+from catalog import Catalog, save_columns, synthetic_asteroids
+
+
+def _write_csv(path, columns):
+    header = list(columns)
+    np.savetxt(path, np.column_stack([columns[name] for name in header]), fmt="%s", delimiter=",",
+               header=",".join(header), comments="")
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".npz", ""])
+def test_formats_load_the_same_bodies(tmp_path, suffix):
+    columns = synthetic_asteroids(50)
+    path = str(tmp_path / ("asteroides" + suffix))
+    if suffix == ".csv":
+        _write_csv(path, columns)
+    else:
+        save_columns(path, columns)
+    state, rows = Catalog(path).load(where=lambda c: c["semi_major_axis"] < 5, names=True)
+    kept = columns["semi_major_axis"] < 5
+    assert len(rows) == kept.sum()
+    np.testing.assert_allclose(state.semi_major_axis, columns["semi_major_axis"][kept])
+    np.testing.assert_allclose(state.diameter_km, columns["diameter_km"][kept])
+    assert state.names == columns["name"][kept].tolist()
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".npz"])
+def test_unknown_columns_are_rejected(tmp_path, suffix):
+    columns = synthetic_asteroids(5)
+    columns["magnitude"] = np.arange(5.0)
+    columns["position_x"] = np.zeros(5)  # Sans position_y, la position ne peut pas être chargée
+    path = str(tmp_path / ("asteroides" + suffix))
+    if suffix == ".csv":
+        _write_csv(path, columns)
+    else:
+        save_columns(path, columns)
+    with pytest.raises(KeyError, match="magnitude.*position_x|position_x.*magnitude"):
+        Catalog(path).load()
@@ -0,0 +1,138 @@
+"""
+@file test_encounters.py
+@brief Tests de la détection des rencontres et collisions, comparée à l'examen de toutes les paires.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from encounters import COLLISION, ENCOUNTER, EncounterDetector, SpatialHash, hill_radii
+from nbody import NBodySystem
+from state import KIND_BODY, KIND_STAR, SystemState
+
+
+def _crowded_system(n, seed):
+    """
+    @brief Soleil, quelques planètes (grandes sphères de Hill) et une ceinture dense de petits corps.
+    """
+    rng = np.random.default_rng(seed)
+    radius = rng.uniform(2e11, 2.4e11, n)
+    angle = rng.uniform(0, 2 * np.pi, n)
+    positions = np.column_stack((radius * np.cos(angle), radius * np.sin(angle)))
+    positions[0] = 0.0
+    masses = 10 ** rng.uniform(15, 21, n)
+    masses[0] = 1.989e30
+    masses[1:4] = (6e24, 2e27, 6e23)
+    velocities = rng.normal(0, 1e3, (n, 2))
+    radii = rng.uniform(1e5, 2e9, n)
+    radii[0] = 7e8
+    names = [str(k) for k in range(n)]
+    return NBodySystem(names, positions, velocities, masses), radii
+
+
+def _brute_force(system, radii, hill_factor=1.0):
+    hill = hill_radii(system.positions, system.masses) * hill_factor
+    events = set()
+    for i, j in itertools.combinations(range(len(system)), 2):
+        distance = np.hypot(*(system.positions[j] - system.positions[i]))
+        if distance <= radii[i] + radii[j]:
+            events.add((i, j, COLLISION))
+        elif distance <= max(hill[i], hill[j]):
+            events.add((i, j, ENCOUNTER))
+    return events
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_detect_matches_brute_force(seed):
+    system, radii = _crowded_system(600, seed)
+    expected = _brute_force(system, radii)
+    events = EncounterDetector(radii).detect(system)
+    found = {(int(a), int(b), int(kind)) for a, b, kind in zip(events["body1"], events["body2"], events["kind"])}
+    assert found == expected
+    assert any(kind == COLLISION for *_, kind in expected)
+    assert any(kind == ENCOUNTER for *_, kind in expected)
+
+
+def test_few_bodies_examine_every_pair():
+    system, radii = _crowded_system(40, 5)
+    detector = EncounterDetector(radii)
+    events = detector.detect(system)
+    found = {(int(a), int(b), int(kind)) for a, b, kind in zip(events["body1"], events["body2"], events["kind"])}
+    assert found == _brute_force(system, radii)
+    assert detector.pairs_tested == 40 * 39 // 2
+
+
+def test_explicit_cell_size_gives_the_same_events():
+    system, radii = _crowded_system(400, 3)
+    expected = _brute_force(system, radii, hill_factor=0.5)
+    for cell_size in (1e8, 1e9, 1e10):
+        events = EncounterDetector(radii, hill_factor=0.5, cell_size=cell_size).detect(system)
+        assert len(events) == len(expected)
+
+
+def test_spatial_hash_finds_every_close_pair_once():
+    positions = np.random.default_rng(4).uniform(0, 100, (500, 2))
+    i, j = SpatialHash(positions, cell_size=5.0).candidate_pairs()
+    pairs = {(min(a, b), max(a, b)) for a, b in zip(i.tolist(), j.tolist())}
+    assert len(pairs) == len(i)  # Aucune paire en double
+    assert all(a != b for a, b in pairs)
+    close = {(a, b) for a, b in itertools.combinations(range(len(positions)), 2)
+             if np.hypot(*(positions[a] - positions[b])) < 5.0}
+    assert close <= pairs
+
+
+def test_events_are_logged_once():
+    system, radii = _crowded_system(300, 5)
+    detector = EncounterDetector(radii)
+    first = detector.detect(system)
+    assert len(first) > 0
+    assert len(detector.detect(system)) == 0
+    assert len(detector.log) == len(first)
+
+
+def _two_bodies_touching(state=None):
+    positions = [(0.0, 0.0), (1e6, 0.0), (5e11, 0.0)]
+    velocities = [(0.0, 1e3), (0.0, -3e3), (0.0, 0.0)]
+    masses = [3e24, 1e24, 2e30]
+    if state is None:
+        return NBodySystem(["A", "B", "Soleil"], positions, velocities, masses)
+    for name, position, velocity, mass in zip(["A", "B", "Soleil"], positions, velocities, masses):
+        state.add(KIND_STAR if name == "Soleil" else KIND_BODY, name, mass=mass, position=position, velocity=velocity)
+    return NBodySystem.from_state(state)
+
+
+def test_merge_conserves_mass_and_momentum():
+    system = _two_bodies_touching()
+    momentum = (system.masses[:, np.newaxis] * system.velocities).sum(axis=0)
+    total_mass = system.masses.sum()
+    detector = EncounterDetector([6e6, 6e6, 7e8], hill_factor=0.0, handling="merge")
+    events = detector.detect(system)
+    assert events["kind"].tolist() == [COLLISION]
+    assert system.names == ["A", "Soleil"]
+    assert system.masses.sum() == pytest.approx(total_mass)
+    np.testing.assert_allclose((system.masses[:, np.newaxis] * system.velocities).sum(axis=0), momentum)
+    assert detector.radii[0] == pytest.approx(6e6 * 2 ** (1 / 3))
+
+
+def test_merge_keeps_a_from_state_system_bound_to_its_state():
+    state = SystemState()
+    system = _two_bodies_touching(state)
+    EncounterDetector([6e6, 6e6, 7e8], hill_factor=0.0, handling="merge").detect(system)
+    assert len(state) == 2
+    assert state.names == ["A", "Soleil"]
+    system.step(60.0)
+    np.testing.assert_array_equal(state.position, system.positions)
+    assert np.shares_memory(state.position, system.positions)
+
+
+def test_bounce_reverses_the_approach():
+    system = _two_bodies_touching()
+    EncounterDetector([6e6, 6e6, 7e8], hill_factor=0.0, handling="bounce").detect(system)
+    assert len(system) == 3
+    normal = system.positions[1] - system.positions[0]
+    assert np.dot(system.velocities[1] - system.velocities[0], normal) == 0.0  # Vitesses le long de y seulement
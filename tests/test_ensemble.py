@@ -0,0 +1,75 @@
+"""
+@file test_ensemble.py
+@brief Tests des simulations d'ensemble : plus proche paire, mémoire partagée et exécution parallèle.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import itertools
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from ensemble import Ensemble, SharedArrays, closest_pair, sweep
+from nbody import TIME_STEP, reference_scenario
+
+
+def _brute_force_closest(positions):
+    return min((math.dist(positions[i], positions[j]), i, j)
+               for i, j in itertools.combinations(range(len(positions)), 2))
+
+
+@pytest.mark.parametrize("n, chunk_size", [(2, 256), (50, 256), (97, 16), (64, 64), (130, 1)])
+def test_closest_pair_matches_brute_force(n, chunk_size):
+    positions = np.random.default_rng(n).uniform(-1e11, 1e11, (n, 2))
+    distance, i, j = closest_pair(positions, chunk_size=chunk_size)
+    expected = _brute_force_closest(positions)
+    assert (i, j) == expected[1:]
+    assert distance == pytest.approx(expected[0], rel=1e-12)
+
+
+def test_closest_pair_on_the_reference_scenario():
+    system = reference_scenario()
+    distance, i, j = closest_pair(system.positions)
+    assert {system.names[i], system.names[j]} == {"Mars", "Phobos"}
+    assert distance == pytest.approx(_brute_force_closest(system.positions)[0])
+
+
+def _read_shared(spec):
+    shm, arrays = SharedArrays.attach(spec)
+    try:
+        return {name: array.copy() for name, array in arrays.items()}
+    finally:
+        shm.close()
+
+
+def test_shared_arrays_round_trip():
+    arrays = {"positions": np.arange(14.0).reshape(7, 2), "masses": np.linspace(1, 2, 7),
+              "hosts": np.array([-1, 0, 0, 1, 2, 2, 3], dtype=np.int64), "flags": np.ones(3, dtype=np.int8)}
+    with SharedArrays(arrays) as shared:
+        for name, array in arrays.items():
+            np.testing.assert_array_equal(shared.arrays[name], array)
+            assert shared.arrays[name].dtype == array.dtype
+        assert all(offset % 64 == 0 for *_, offset in shared.layout)
+        # Un autre processus voit les mêmes valeurs, y compris après une écriture du créateur
+        shared.arrays["masses"][0] = 42.0
+        with ProcessPoolExecutor(1) as pool:
+            seen = pool.submit(_read_shared, shared.spec).result()
+        assert seen["masses"][0] == 42.0
+        np.testing.assert_array_equal(seen["hosts"], arrays["hosts"])
+
+
+def test_parallel_run_matches_serial_run():
+    base = reference_scenario()
+    variations = list(sweep("mass", "Phobos", [1.07e16, 1e18, 1e20]))
+    results = {}
+    for workers in (1, 2):
+        ensemble = Ensemble(base, duration=2 * TIME_STEP, dt=3600, samples=4, workers=workers)
+        results[workers] = sorted(ensemble.run(variations), key=lambda summary: summary["index"])
+    for serial, parallel in zip(results[1], results[2]):
+        for key in ("index", "stable", "closest_approach", "closest_pair", "max_energy_drift", "steps"):
+            assert serial[key] == parallel[key]
+    assert base.time == 0.0
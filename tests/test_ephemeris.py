@@ -0,0 +1,117 @@
+"""
+@file test_ephemeris.py
+@brief Tests des éphémérides par blocs : interpolation, cache borné, source N corps et enregistrement.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+import pytest
+
+from ephemeris import Ephemeris
+from kepler import KeplerPropagator
+from nbody import NBodySystem, reference_scenario, reference_state
+from space_objects import Moon, Planet, Star
+
+
+@pytest.fixture
+def propagator():
+    sun = Star("Soleil", 30, 1.989e30, 1392700, "yellow")
+    earth = Planet("Terre", 6, sun, 1.0, 0.0167, 1.0, 12742, "blue")
+    mars = Planet("Mars", 5, sun, 1.524, 0.0934, 1.881, 6779, "red")
+    moon = Moon("Lune", 2, earth, 0.05, 13.0, 3474, "gray")
+    return KeplerPropagator([earth, mars], [moon])
+
+
+def test_samples_match_the_propagator(propagator):
+    ephemeris = Ephemeris.from_kepler(propagator, 0.0, 2.0, 0.01, block_size=32)
+    times = np.array([0.0, 0.32, 0.33, 1.0, 2.0])  # Débuts, fins de blocs et dernier échantillon
+    expected = propagator.positions(times)
+    for t, positions in zip(times, expected):
+        np.testing.assert_allclose(ephemeris.positions(t), positions, rtol=1e-6, atol=1e-6)
+
+
+def test_interpolation_between_samples(propagator):
+    ephemeris = Ephemeris.from_kepler(propagator, 0.0, 2.0, 0.01)
+    times = np.random.default_rng(0).uniform(0.0, 2.0, 50)
+    expected = propagator.positions(times)
+    for t, positions in zip(times, expected):
+        np.testing.assert_allclose(ephemeris.positions(t), positions, atol=1e-5)
+        assert np.allclose(ephemeris.position("Terre", t), positions[propagator.names.index("Terre")], atol=1e-5)
+
+
+def test_cache_respects_memory_budget(propagator):
+    ephemeris = Ephemeris.from_kepler(propagator, 0.0, 10.0, 0.01, block_size=16)
+    ephemeris.max_bytes = 3 * ephemeris.block_nbytes()
+    first = ephemeris.positions(0.05)
+    ephemeris.precompute()
+    assert len(ephemeris._blocks) == 3
+    assert ephemeris.nbytes <= ephemeris.max_bytes
+    # Bloc évincé puis recalculé : mêmes valeurs
+    np.testing.assert_array_equal(ephemeris.positions(0.05), first)
+
+
+def test_out_of_range_date(propagator):
+    ephemeris = Ephemeris.from_kepler(propagator, 0.0, 1.0, 0.1)
+    with pytest.raises(ValueError):
+        ephemeris.positions(1.5)
+
+
+def test_nbody_source_replays_the_integration():
+    system = reference_scenario()
+    step = 3600.0
+    ephemeris = Ephemeris.from_nbody(system, 200 * step, step, block_size=16, dtype=np.float64)
+    ephemeris.max_bytes = 2 * ephemeris.block_nbytes()
+    ephemeris.precompute()
+    assert system.time == 0.0  # Le système d'origine n'est pas modifié
+
+    reference = reference_scenario()
+    expected = {}
+    for n in range(201):
+        if n in (5, 100, 200):
+            expected[n] = reference.positions.copy()
+        reference.step(step)
+    # Le bloc de la date 5 a été évincé : il est recalculé depuis le dernier instantané antérieur
+    for n, positions in expected.items():
+        np.testing.assert_allclose(ephemeris.positions(n * step), positions, rtol=1e-12)
+
+
+def test_nbody_snapshots_count_in_the_budget():
+    step = 3600.0
+    ephemeris = Ephemeris.from_nbody(reference_scenario(), 400 * step, step, block_size=16)
+    ephemeris.max_bytes = 3 * ephemeris.block_nbytes()
+    ephemeris.precompute()
+    snapshots = ephemeris.source.nbytes
+    assert snapshots == len(ephemeris.source._snapshots) * 2 * len(ephemeris) * 2 * 8
+    assert ephemeris.nbytes == ephemeris._block_bytes + snapshots
+    assert ephemeris.nbytes <= ephemeris.max_bytes
+    # Les instantanés ont pris la place des autres blocs, puis ont été éclaircis
+    assert len(ephemeris._blocks) == 1
+    assert ephemeris.source._snapshot_times[0] == 0.0
+
+    # Un bloc évincé est recalculé depuis un instantané plus ancien, aux mêmes valeurs
+    reference = reference_scenario()
+    reference.run(30, step)
+    np.testing.assert_allclose(ephemeris.positions(30 * step), reference.positions, rtol=1e-6)
+
+
+def test_nbody_source_accepts_a_system_state():
+    state = reference_state()
+    step = 3600.0
+    ephemeris = Ephemeris.from_nbody(state, 50 * step, step, softening=1e5, dtype=np.float64)
+    system = NBodySystem.from_state(reference_state(), softening=1e5)
+    system.run(50, step)
+    np.testing.assert_allclose(ephemeris.positions(50 * step), system.positions, rtol=1e-12)
+    assert state.position[0, 0] == 0.0  # Le SystemState d'origine n'est pas modifié
+
+
+def test_save_and_load(propagator, tmp_path):
+    ephemeris = Ephemeris.from_kepler(propagator, 0.0, 1.0, 0.01, block_size=16)
+    path = str(tmp_path / "ephemerides")
+    ephemeris.save(path)
+    loaded = Ephemeris.load(path)
+    assert loaded.names == ephemeris.names
+    assert loaded.n_samples == ephemeris.n_samples
+    for t in (0.0, 0.123, 0.5, 1.0):
+        np.testing.assert_array_equal(loaded.positions(t), ephemeris.positions(t))
@@ -0,0 +1,109 @@
+"""
+@file test_integrators.py
+@brief Tests des intégrateurs : ordre de convergence, dérive d'énergie et pas de temps par blocs.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import math
+
+import numpy as np
+import pytest
+
+from integrators import BlockTimestep, DriftMonitor, Leapfrog, SemiImplicitEuler, Yoshida4
+from nbody import G, TIME_STEP, NBodySystem, reference_scenario
+
+
+def _sun_earth(integrator):
+    """
+    @brief Terre sur une orbite circulaire autour du Soleil.
+    """
+    v = math.sqrt(G * 1.989e30 / 1.5e11)
+    return NBodySystem(["Soleil", "Terre"], [(0, 0), (1.5e11, 0)], [(0, 0), (0, v)], [1.989e30, 5.972e24],
+                       integrator=integrator)
+
+
+def _planets(integrator):
+    """
+    @brief Soleil et planètes du scénario de référence, sans les lunes.
+    """
+    full = reference_scenario()
+    return NBodySystem(full.names[:4], full.positions[:4], full.velocities[:4], full.masses[:4],
+                       integrator=integrator)
+
+
+@pytest.mark.parametrize("integrator, order", [(SemiImplicitEuler, 1), (Leapfrog, 2), (Yoshida4, 4)])
+def test_convergence_order(integrator, order):
+    duration = 80 * TIME_STEP
+    reference = _sun_earth(Yoshida4())
+    reference.run(800, duration / 800)
+    errors = []
+    for n_steps in (10, 20, 40):
+        system = _sun_earth(integrator())
+        system.run(n_steps, duration / n_steps)
+        errors.append(np.abs(system.positions - reference.positions).max())
+    # Diviser le pas par deux divise l'erreur par 2^ordre
+    for coarse, fine in zip(errors, errors[1:]):
+        assert math.log2(coarse / fine) == pytest.approx(order, abs=0.1)
+
+
+@pytest.mark.parametrize("integrator, bound", [(Leapfrog, 1e-7), (Yoshida4, 1e-11)])
+def test_symplectic_energy_drift_is_bounded(integrator, bound):
+    drifts = {}
+    for name, scheme in (("euler", SemiImplicitEuler()), ("symplectic", integrator())):
+        system = _planets(scheme)
+        monitor = DriftMonitor(system)
+        for _ in range(20):
+            system.run(365)
+            report = monitor.sample()
+        drifts[name] = report
+    assert drifts["symplectic"]["max_energy_drift"] < bound
+    assert drifts["symplectic"]["max_energy_drift"] < 1e-3 * drifts["euler"]["max_energy_drift"]
+    assert drifts["symplectic"]["max_angular_momentum_drift"] < 1e-12
+
+
+def test_leapfrog_evaluates_forces_once_per_step():
+    system = _planets(Leapfrog())
+    system.run(10)
+    assert system.force_evaluations == 11 * len(system)  # Plus l'évaluation initiale
+
+
+def _offset(system, moon, planet):
+    return system.positions[system.index(moon)] - system.positions[system.index(planet)]
+
+
+def test_block_levels_follow_the_fast_moons():
+    system = reference_scenario()
+    levels = BlockTimestep(eta=0.05).assign_levels(system, TIME_STEP)
+    level = dict(zip(system.names, levels.tolist()))
+    assert level["Phobos"] > level["Deimos"] > level["Jupiter"] == 0
+    assert level["Mars"] == level["Phobos"]  # Promue au niveau de son satellite
+    assert level["Soleil"] == 0  # La promotion n'est pas transitive
+
+
+def test_block_timestep_matches_fixed_step_at_each_level():
+    blocks = reference_scenario(integrator=BlockTimestep(eta=0.05))
+    blocks.run(10)
+    level = dict(zip(blocks.names, blocks.integrator.levels.tolist()))
+    for moon, planet in (("Phobos", "Mars"), ("Deimos", "Mars"), ("Lune", "Terre")):
+        # Chaque lune suit la trajectoire d'un saute-mouton à pas fixe égal à son propre sous-pas
+        fixed = reference_scenario(integrator=Leapfrog())
+        fixed.run(10 << level[moon], TIME_STEP / (1 << level[moon]))
+        error = np.hypot(*(_offset(blocks, moon, planet) - _offset(fixed, moon, planet)))
+        assert error < 1e-6 * np.hypot(*_offset(fixed, moon, planet))
+    # Seuls les corps rapides sont évalués à la cadence de Phobos
+    assert blocks.force_evaluations < (10 * len(blocks)) << level["Phobos"]
+
+
+def test_block_timestep_converges_with_eta():
+    fine = reference_scenario(integrator=Leapfrog())
+    fine.run(10 << 12, TIME_STEP / (1 << 12))
+    errors = []
+    for eta in (0.1, 0.05, 0.025):
+        blocks = reference_scenario(integrator=BlockTimestep(eta=eta))
+        blocks.run(10)
+        errors.append(np.hypot(*(_offset(blocks, "Phobos", "Mars") - _offset(fine, "Phobos", "Mars"))))
+    # Ordre 2 : diviser eta par deux divise l'erreur par quatre
+    for coarse, finer in zip(errors, errors[1:]):
+        assert coarse / finer == pytest.approx(4, rel=0.2)
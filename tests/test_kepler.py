@@ -0,0 +1,113 @@
+"""
+@file test_kepler.py
+@brief Tests du propagateur képlérien, comparé aux positions de l'ancienne fonction update (get_orbit).
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+import pytest
+
+from functions import get_orbit
+from kepler import KeplerPropagator, solve_kepler
+from space_objects import Moon, Planet, Star
+
+
+@pytest.fixture
+def bodies():
+    sun = Star("Soleil", 30, 1.989e30, 1392700, "yellow")
+    planets = [
+        Planet("Mercure", 4, sun, 0.387, 0.2056, 0.241, 4879, "gray"),
+        Planet("Vénus", 6, sun, 0.723, 0.0, 0.615, 12104, "orange"),
+        Planet("Terre", 6, sun, 1.0, 0.0167, 1.0, 12742, "blue"),
+    ]
+    moons = [Moon("Lune", 2, planets[2], 0.05, 13.0, 3474, "gray")]
+    return planets, moons
+
+
+def _legacy_positions(t, planets, moons):
+    """
+    @brief Positions calculées comme l'ancienne functions.update : anomalie vraie t / période.
+    """
+    positions = {}
+    for planet in planets:
+        theta = t / planet.period
+        r = (planet.semi_major_axis * (1 - planet.eccentricity**2)) / (1 + planet.eccentricity * np.cos(theta))
+        positions[planet.name] = np.array([r * np.cos(theta), r * np.sin(theta)])
+    for moon in moons:
+        x, y = positions[moon.planet.name]
+        positions[moon.name] = np.array([x + moon.orbit_radius * np.cos(moon.orbit_speed * t),
+                                         y + moon.orbit_radius * np.sin(moon.orbit_speed * t)])
+    return positions
+
+
+def test_solve_kepler_residual():
+    e = np.array([0.0, 0.2056, 0.6, 0.9, 0.99])
+    M = np.repeat(np.linspace(-10, 10, 101)[:, np.newaxis], len(e), axis=1)
+    E = solve_kepler(M, e)
+    np.testing.assert_allclose(E - e * np.sin(E), np.remainder(M, 2 * np.pi), atol=1e-10)
+
+
+def test_circular_orbits_match_the_previous_update(bodies):
+    planets, moons = bodies
+    propagator = KeplerPropagator(planets[1:2], [])
+    for t in np.linspace(0, 3, 31):
+        expected = _legacy_positions(t, planets[1:2], [])
+        np.testing.assert_allclose(propagator.positions(t)[0], expected["Vénus"], atol=1e-12)
+
+
+def test_apsides_match_the_previous_update(bodies):
+    # Au périhélie et à l'aphélie, anomalies vraie, moyenne et excentrique sont égales
+    planets, moons = bodies
+    propagator = KeplerPropagator(planets, moons)
+    for k in range(4):
+        t = k * np.pi * planets[0].period
+        expected = _legacy_positions(t, planets, moons)
+        assert np.allclose(propagator.positions(t)[0], expected["Mercure"], atol=1e-12)
+
+
+def test_positions_stay_on_the_get_orbit_ellipse(bodies):
+    planets, moons = bodies
+    propagator = KeplerPropagator(planets, moons)
+    times = np.linspace(0, 2, 97)
+    positions = propagator.positions(times)
+    for i, planet in enumerate(planets):
+        x, y = positions[:, i].T
+        # get_orbit donne r en fonction de l'anomalie vraie : les positions sont sur la même ellipse
+        theta = np.arctan2(y, x)
+        a, e = planet.semi_major_axis, planet.eccentricity
+        np.testing.assert_allclose(np.hypot(x, y), a * (1 - e**2) / (1 + e * np.cos(theta)), rtol=1e-10)
+        orbit_x, orbit_y = get_orbit(a, e, num_points=20000)
+        gap = np.hypot(x[:, np.newaxis] - orbit_x, y[:, np.newaxis] - orbit_y).min(axis=1)
+        assert gap.max() < 1e-3 * a
+
+
+def test_moons_keep_the_previous_offset(bodies):
+    planets, moons = bodies
+    propagator = KeplerPropagator(planets, moons)
+    terre, lune = propagator.index("Terre"), propagator.index("Lune")
+    for t in np.linspace(0, 2, 21):
+        positions = propagator.positions(t)
+        expected = _legacy_positions(t, planets, moons)
+        np.testing.assert_allclose(positions[lune] - positions[terre], expected["Lune"] - expected["Terre"],
+                                   atol=1e-12)
+
+
+def test_batch_matches_single_dates(bodies):
+    planets, moons = bodies
+    propagator = KeplerPropagator(planets, moons)
+    times = np.linspace(0, 5, 11)
+    batch = propagator.positions(times)
+    assert batch.shape == (len(times), len(propagator), 2)
+    for t, positions in zip(times, batch):
+        np.testing.assert_array_equal(propagator.positions(t), positions)
+
+
+def test_velocities_are_the_derivative_of_positions(bodies):
+    planets, moons = bodies
+    propagator = KeplerPropagator(planets, moons)
+    h = 1e-6
+    for t in (0.1, 0.7, 1.3):
+        numeric = (propagator.positions(t + h) - propagator.positions(t - h)) / (2 * h)
+        np.testing.assert_allclose(propagator.velocities(t), numeric, rtol=1e-5, atol=1e-6)
@@ -0,0 +1,103 @@
+"""
+@file test_nbody.py
+@brief Tests du moteur N-corps vectorisé : équivalence avec le pas en Python pur et lois de conservation.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+import pytest
+
+from nbody import G, TIME_STEP, NBodySystem, _python_step, random_scenario, reference_scenario, reference_state
+
+
+def _energy(system):
+    """
+    @brief Énergie mécanique totale, calculée indépendamment du moteur.
+    """
+    kinetic = 0.5 * np.sum(system.masses * np.sum(system.velocities ** 2, axis=1))
+    d = system.positions[np.newaxis, :, :] - system.positions[:, np.newaxis, :]
+    r = np.sqrt(np.sum(d ** 2, axis=2) + system.softening ** 2)
+    i, j = np.triu_indices(len(system), k=1)
+    return kinetic - G * np.sum(system.masses[i] * system.masses[j] / r[i, j])
+
+
+def _momentum(system):
+    return np.sum(system.masses[:, np.newaxis] * system.velocities, axis=0)
+
+
+def _angular_momentum(system):
+    x, y = system.positions[:, 0], system.positions[:, 1]
+    return np.sum(system.masses * (x * system.velocities[:, 1] - y * system.velocities[:, 0]))
+
+
+@pytest.mark.parametrize("n", [2, 10, 50])
+def test_step_matches_python_step(n):
+    # Vitesses nulles et pas d'une seconde : les corps ne bougent que de a.dt² (quelques mm),
+    # l'ordre dans lequel _python_step met les corps à jour ne compte donc pas
+    system = random_scenario(n, seed=n)
+    system.velocities[:] = 0.0
+    positions = system.positions.tolist()
+    velocities = system.velocities.tolist()
+    masses = system.masses.tolist()
+
+    _python_step(positions, velocities, masses, 1.0)
+    system.step(1.0)
+    np.testing.assert_allclose(system.velocities, velocities, rtol=1e-9, atol=1e-20)
+    np.testing.assert_allclose(system.positions, positions, rtol=1e-12)
+
+
+def test_reference_scenario_matches_python_step():
+    system = reference_scenario()
+    velocities = system.velocities.copy()
+    system.velocities[:] = 0.0
+    positions = system.positions.tolist()
+    expected = system.velocities.tolist()
+    _python_step(positions, expected, system.masses.tolist(), 1.0)
+    system.step(1.0)
+    # Phobos est à 9 400 km de Mars : le déplacement de Mars pendant le pas compte déjà au millionième
+    np.testing.assert_allclose(system.velocities, expected, rtol=1e-5, atol=1e-20)
+    # Le scénario garde les vitesses initiales de test.py pour les planètes
+    np.testing.assert_array_equal(velocities[:4], [(0, 0), (0, 29780), (0, 24070), (0, 13070)])
+
+
+def test_momentum_is_conserved():
+    system = random_scenario(100, seed=1, softening=1e7)
+    p0 = _momentum(system)
+    system.run(100)
+    scale = np.sum(system.masses * np.hypot(system.velocities[:, 0], system.velocities[:, 1]))
+    assert np.all(np.abs(_momentum(system) - p0) < 1e-12 * scale)
+
+
+def test_energy_and_angular_momentum_stay_bounded():
+    # Soleil et planètes seulement : un pas d'un jour ne résout pas les lunes
+    full = reference_scenario()
+    system = NBodySystem(full.names[:4], full.positions[:4], full.velocities[:4], full.masses[:4])
+    energy0 = _energy(system)
+    angular_momentum0 = _angular_momentum(system)
+    for _ in range(10):
+        system.run(365)
+        assert abs((_energy(system) - energy0) / energy0) < 1e-3
+        assert abs((_angular_momentum(system) - angular_momentum0) / angular_momentum0) < 1e-9
+    assert system.time == pytest.approx(3650 * TIME_STEP)
+
+
+def test_step_reuses_its_buffers():
+    system = random_scenario(20)
+    positions, velocities, accelerations = system.positions, system.velocities, system.accelerations
+    system.run(3)
+    assert system.positions is positions
+    assert system.velocities is velocities
+    assert system.accelerations is accelerations
+
+
+def test_from_state_runs_the_reference_state_in_place():
+    state = reference_state()
+    system = NBodySystem.from_state(state)
+    expected = reference_scenario()
+    system.run(10)
+    expected.run(10)
+    assert np.shares_memory(system.positions, state.position)
+    np.testing.assert_array_equal(state.position, expected.positions)
+    np.testing.assert_array_equal(state.velocity, expected.velocities)
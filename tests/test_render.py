@@ -0,0 +1,50 @@
+"""
+@file test_render.py
+@brief Tests du rendu hors écran : dimensions des images et rendu réparti entre plusieurs processus.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import os
+
+import matplotlib.image as mimage
+import numpy as np
+import pytest
+
+from catalog import load_system
+from render import FrameRenderer, frame_shape, render
+
+
+@pytest.fixture(scope="module")
+def small():
+    sun, systems = load_system()
+    planets, moons, planets_with_moons = systems["small"]
+    return sun, planets, [moon for moon in moons if moon.planet in planets_with_moons]
+
+
+@pytest.mark.parametrize("size, dpi", [(6, 100), (6.1, 97), (4.7, 110), (3.33, 72)])
+def test_frame_shape_matches_the_agg_buffer(small, size, dpi):
+    renderer = FrameRenderer(*small, size=size, dpi=dpi)
+    assert frame_shape(size, dpi) == renderer.shape
+    assert next(renderer.frames(np.zeros(1))).shape[:2] == renderer.shape
+
+
+def test_workers_render_every_frame_in_order(small, tmp_path):
+    output = str(tmp_path / "images")
+    times = np.linspace(0.0, 0.5, 12)
+    count = render(*small, output, t0=0.0, t1=0.5, n_frames=12, workers=2, chunk_size=3, max_pending=2,
+                   size=2, dpi=50)
+    assert count == 12
+    assert sorted(os.listdir(output)) == ["frame_%05d.png" % i for i in range(12)]
+    renderer = FrameRenderer(*small, size=2, dpi=50)
+    for index in (0, 7, 11):
+        expected = next(renderer.frames(times[index:index + 1]))
+        written = mimage.imread(os.path.join(output, "frame_%05d.png" % index))
+        np.testing.assert_array_equal((written * 255).round().astype(np.uint8), expected)
+
+
+def test_renderer_keeps_the_orbits_it_draws(small):
+    renderer = FrameRenderer(*small, size=2, dpi=50)
+    assert renderer.orbits.collection in renderer.ax.collections
+    assert len(renderer.orbits.collection.get_segments()) == len(small[1])
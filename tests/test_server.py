@@ -0,0 +1,183 @@
+"""
+@file test_server.py
+@brief Tests du protocole de diffusion : codage des trames, abonnements et connexions réelles sur la boucle locale.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import asyncio
+import math
+
+import numpy as np
+import pytest
+
+from encounters import EncounterDetector
+from nbody import TIME_STEP, NBodySystem, reference_state
+from server import (MAX_MESSAGE, MESSAGE_HEADER, MSG_FRAME, MSG_JSON, StreamClient, StreamServer, _Subscriber,
+                    make_source, pack_frame, pack_json, read_message, unpack_frame)
+
+
+class _LinearSource:
+    """
+    @brief Source de test : le corps k est en (k, t).
+    """
+    names = ["Soleil", "Terre", "Lune"]
+    unit = "m"
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def __call__(self, elapsed):
+        positions = np.column_stack((np.arange(3.0), np.full(3, elapsed)))
+        return elapsed, positions
+
+
+def _read(data):
+    async def read():
+        reader = asyncio.StreamReader()
+        reader.feed_data(data)
+        reader.feed_eof()
+        return await read_message(reader)
+    return asyncio.run(read())
+
+
+@pytest.mark.parametrize("count", [0, 1, 7, 1000])
+def test_pack_unpack_frame_round_trip(count):
+    positions = np.random.default_rng(count).uniform(-1e12, 1e12, (count, 2))
+    message = pack_frame(2**40 + 3, 1234.5678, positions)
+    length, kind = MESSAGE_HEADER.unpack_from(message)
+    assert kind == MSG_FRAME
+    assert length == len(message) - 4  # Longueur comptée à partir de l'octet de type
+    kind, payload = _read(message)
+    sequence, t, decoded = unpack_frame(payload)
+    assert (sequence, t) == (2**40 + 3, 1234.5678)
+    assert decoded.shape == (count, 2)
+    np.testing.assert_array_equal(decoded, positions.astype(np.float32))
+
+
+def test_json_message_round_trip():
+    kind, payload = _read(pack_json({"names": ["Terre", "Phobos"], "rate": 60.0}))
+    assert kind == MSG_JSON
+    assert payload.decode("utf-8") == '{"names": ["Terre", "Phobos"], "rate": 60.0}'
+
+
+@pytest.mark.parametrize("length", [0, MAX_MESSAGE + 1])
+def test_read_message_rejects_invalid_lengths(length):
+    with pytest.raises(ValueError):
+        _read(MESSAGE_HEADER.pack(length, MSG_JSON) + b"x" * 8)
+
+
+@pytest.mark.parametrize("request_, rate", [({}, 30.0), ({"rate": None}, 30.0), ({"rate": 10}, 10.0),
+                                            ({"rate": 500}, 30.0)])
+def test_subscribe_rate(request_, rate):
+    server = StreamServer(_LinearSource(), rate=30.0)
+    subscriber = _Subscriber(None, 30.0)
+    reply = server._subscribe(subscriber, request_)
+    assert reply == {"subscribed": [0, 1, 2], "rate": rate}
+    assert subscriber.interval == pytest.approx(1.0 / rate)
+
+
+@pytest.mark.parametrize("rate", [0, -1, math.nan, math.inf, "vite"])
+def test_subscribe_rejects_invalid_rates(rate):
+    server = StreamServer(_LinearSource(), rate=30.0)
+    subscriber = _Subscriber(None, 30.0)
+    with pytest.raises(ValueError):
+        server._subscribe(subscriber, {"rate": rate})
+    assert subscriber.interval == pytest.approx(1.0 / 30.0)
+
+
+def test_subscribe_rejects_unknown_bodies():
+    server = StreamServer(_LinearSource())
+    with pytest.raises(ValueError, match="Pluton"):
+        server._subscribe(_Subscriber(None, 60.0), {"bodies": ["Terre", "Pluton"]})
+
+
+class _ResetWriter:
+    def __init__(self):
+        self.closed = False
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        raise ConnectionResetError
+
+    def close(self):
+        self.closed = True
+
+
+def test_send_loop_closes_a_reset_connection():
+    async def scenario():
+        writer = _ResetWriter()
+        subscriber = _Subscriber(writer, 60.0)
+        sender = asyncio.create_task(subscriber.send_loop())
+        subscriber.offer(b"trame")
+        await asyncio.wait_for(sender, 1.0)
+        return writer.closed, sender.exception()
+    assert asyncio.run(scenario()) == (True, None)
+
+
+def test_pending_frame_is_replaced():
+    subscriber = _Subscriber(None, 60.0)
+    subscriber.offer(b"1")
+    subscriber.offer(b"2")
+    assert subscriber.pending == b"2"
+    assert subscriber.dropped == 1
+
+
+def test_clients_receive_their_selection():
+    async def scenario():
+        server = StreamServer(_LinearSource(), rate=50.0)
+        port = await server.start(port=0)
+        try:
+            everything = await StreamClient().connect(port=port)
+            moon = await StreamClient().connect(port=port)
+            await moon.subscribe(rate=20, bodies=["Lune"])
+            frames = {}
+            for name, client in (("tous", everything), ("lune", moon)):
+                received = []
+                async for frame in client.frames():
+                    if len(frame[2]) != len(client.indices):
+                        continue  # Trame partie avant la réponse à l'abonnement
+                    received.append(frame)
+                    if len(received) == 3:
+                        break
+                frames[name] = received
+            await everything.close()
+            await moon.close()
+            # Le serveur retire les abonnés déconnectés
+            for _ in range(50):
+                if not server.subscribers:
+                    break
+                await asyncio.sleep(0.01)
+            return everything.names, moon.indices, frames, len(server.subscribers)
+        finally:
+            await server.stop()
+
+    names, indices, frames, remaining = asyncio.run(scenario())
+    assert names == _LinearSource.names
+    assert indices == [2]
+    for sequence, t, positions in frames["tous"]:
+        np.testing.assert_array_equal(positions, np.array([[0, t], [1, t], [2, t]], dtype=np.float32))
+    sequences = [sequence for sequence, _, _ in frames["lune"]]
+    assert sequences == sorted(sequences)
+    for _, t, positions in frames["lune"]:
+        np.testing.assert_array_equal(positions, np.array([[2, t]], dtype=np.float32))
+    assert remaining == 0
+
+
+def test_nbody_source_runs_the_test_py_step():
+    source = make_source("nbody")
+    state = reference_state()
+    system = NBodySystem.from_state(state, softening=1e5)
+    detector = EncounterDetector(state.diameter_km * 500, hill_factor=0)
+    for _ in range(5):
+        source.simulation.step()
+        detector.step(system, TIME_STEP)
+    assert source.system.softening == 1e5
+    assert source.system.time == pytest.approx(5 * TIME_STEP)
+    np.testing.assert_array_equal(source.system.positions, system.positions)
@@ -0,0 +1,123 @@
+"""
+@file test_spatial.py
+@brief Tests de l'index écran (visibilité, regroupement, désignation) et du découpage des traînées hors champ.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+import pytest
+
+from spatial import ScreenIndex
+from trails import visible_runs
+
+WIDTH, HEIGHT = 640, 480
+
+
+def _screen(n, seed):
+    """
+    @brief Positions écran dont une partie hors de la fenêtre, et rayons des corps.
+    """
+    rng = np.random.default_rng(seed)
+    screen = rng.uniform((-200, -200), (WIDTH + 200, HEIGHT + 200), (n, 2))
+    radii = rng.uniform(0.5, 6.0, n)
+    return screen, radii
+
+
+def _inside(screen, index):
+    m = index.margin
+    columns = np.floor((screen[:, 0] + m) / index.cell_size)
+    rows = np.floor((screen[:, 1] + m) / index.cell_size)
+    return (columns >= 0) & (columns < index.columns) & (rows >= 0) & (rows < index.rows)
+
+
+def _linear_pick(screen, candidates, point, tolerance, radii):
+    if not candidates.any():
+        return -1
+    d = np.hypot(*(screen - point).T)
+    if radii is not None:
+        d = d - radii
+    d[~candidates] = np.inf
+    best = int(np.argmin(d))
+    return best if d[best] <= tolerance else -1
+
+
+@pytest.mark.parametrize("use_radii", [False, True])
+@pytest.mark.parametrize("margin", [0, 10])
+def test_pick_matches_linear_scan(use_radii, margin):
+    screen, radii = _screen(3000, 1)
+    index = ScreenIndex(WIDTH, HEIGHT, cell_size=16, margin=margin)
+    index.update(screen)
+    inside = _inside(screen, index)
+    rng = np.random.default_rng(2)
+    # Points tirés au hasard, sur des corps, et au-delà des bords de la grille
+    points = np.concatenate((rng.uniform((-30, -30), (WIDTH + 30, HEIGHT + 30), (300, 2)),
+                             screen[:100] + rng.normal(0, 3, (100, 2))))
+    for point in points:
+        for tolerance in (0.0, 4.0, 25.0):
+            expected = _linear_pick(screen, inside, point, tolerance, radii if use_radii else None)
+            assert index.pick(point, tolerance, radii if use_radii else None) == expected
+
+
+def test_pick_on_an_empty_index():
+    index = ScreenIndex(WIDTH, HEIGHT)
+    index.update(np.zeros((0, 2)))
+    assert index.pick((10, 10)) == -1
+    assert len(index.visible()) == 0
+
+
+def test_visible_and_cell_counts():
+    screen, _ = _screen(2000, 3)
+    index = ScreenIndex(WIDTH, HEIGHT, cell_size=32, margin=5)
+    index.update(screen)
+    inside = _inside(screen, index)
+    assert sorted(index.visible().tolist()) == np.flatnonzero(inside).tolist()
+    columns = np.floor((screen[inside, 0] + 5) / 32).astype(int)
+    rows = np.floor((screen[inside, 1] + 5) / 32).astype(int)
+    expected = np.bincount(columns * index.rows + rows, minlength=index.n_cells)
+    np.testing.assert_array_equal(index.cell_counts(), expected)
+
+
+def test_incremental_update_matches_a_fresh_index():
+    screen, _ = _screen(2000, 4)
+    moving = ScreenIndex(WIDTH, HEIGHT, margin=8)
+    moving.update(screen)
+    for frame in range(5):
+        screen = screen + np.random.default_rng(frame).normal(0, 4, screen.shape)
+        moving.update(screen)
+    fresh = ScreenIndex(WIDTH, HEIGHT, margin=8)
+    fresh.update(screen)
+    np.testing.assert_array_equal(moving.starts, fresh.starts)
+    np.testing.assert_array_equal(moving.keys_sorted, fresh.keys_sorted)
+    assert sorted(moving.visible().tolist()) == sorted(fresh.visible().tolist())
+
+
+def test_resize_changes_the_covered_area():
+    index = ScreenIndex(100, 100, cell_size=10)
+    screen = np.array([[50.0, 50.0], [150.0, 50.0]])
+    index.update(screen)
+    assert index.visible().tolist() == [0]
+    index.resize(200, 100)
+    index.update(screen)
+    assert sorted(index.visible().tolist()) == [0, 1]
+
+
+def test_clusters_keep_the_heaviest_body():
+    screen = np.array([[5.0, 5.0], [6.0, 6.0], [7.0, 5.0], [50.0, 50.0], [52.0, 51.0], [90.0, 10.0]])
+    weights = np.array([1.0, 3.0, 2.0, 1.0, 0.5, 9.0])
+    index = ScreenIndex(100, 100, cell_size=16)
+    index.update(screen)
+    representatives, counts, hidden = index.clusters(min_count=2, weights=weights)
+    assert sorted(zip(representatives.tolist(), counts.tolist())) == [(1, 3), (3, 2)]
+    assert np.flatnonzero(hidden).tolist() == [0, 2, 4]
+
+
+def test_visible_runs_drop_segments_outside_one_side():
+    points = np.array([[-50, 10], [-20, 10], [-10, 20], [10, 20], [30, 30], [120, 30], [130, 40], [50, 50]])
+    runs = visible_runs(points, 100, 100)
+    assert [run.tolist() for run in runs] == [
+        [[-10, 20], [10, 20], [30, 30], [120, 30]],
+        [[130, 40], [50, 50]],
+    ]
+    assert [run.tolist() for run in visible_runs(points[2:5], 100, 100)] == [points[2:5].tolist()]
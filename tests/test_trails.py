@@ -0,0 +1,69 @@
+"""
+@file test_trails.py
+@brief Tests du tampon circulaire des traînées et de la préparation de leur tracé.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import numpy as np
+
+from trails import TrailBuffer, screen_trail, world_to_screen
+
+
+def _points(n):
+    return np.column_stack((np.arange(n, dtype=float), -np.arange(n, dtype=float)))
+
+
+def _trail(capacity, points):
+    trail = TrailBuffer(capacity)
+    for point in points:
+        trail.append(point)
+    return trail
+
+
+def test_keeps_points_in_order_before_wrapping():
+    trail = _trail(10, _points(4))
+    assert len(trail) == 4
+    np.testing.assert_array_equal(trail.points(), _points(4))
+
+
+def test_keeps_only_the_latest_points_after_wrapping():
+    points = _points(37)
+    trail = _trail(10, points)
+    assert len(trail) == 10
+    np.testing.assert_array_equal(trail.points(), points[-10:])
+    assert trail.points().base is trail._data  # Vue contiguë, sans copie
+
+
+def test_extend_matches_repeated_append():
+    points = _points(53)
+    appended, extended = _trail(16, points), TrailBuffer(16)
+    bounds = (0, 3, 10, 30, 53)  # Lots plus petits et plus grands que la capacité
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        extended.extend(points[begin:end])
+    np.testing.assert_array_equal(extended.points(), appended.points())
+    assert len(extended) == len(appended) == 16
+
+
+def test_clear():
+    trail = _trail(5, _points(3))
+    trail.clear()
+    assert len(trail) == 0
+    assert trail.points().shape == (0, 2)
+
+
+def test_screen_trail_keeps_the_latest_point():
+    trail = _trail(1000, _points(1000) * 1e6)  # Points espacés de ~1.4e6 m
+    scale, zoom = 1e-9, 1.0  # ~0.0014 pixel entre deux points : forte décimation
+    points = screen_trail(trail, scale, zoom, 800, 600, min_pixels=2.0)
+    assert len(points) < 10
+    latest = world_to_screen(trail.points()[-1:], scale, zoom, 800, 600)
+    np.testing.assert_array_equal(points[-1], latest[0])
+
+
+def test_screen_trail_without_decimation():
+    trail = _trail(100, _points(50) * 1e9)
+    points = screen_trail(trail, 1e-9, 1.0, 800, 600, offset=(10, -5))
+    expected = np.column_stack((400 + 10 + np.arange(50), 300 - 5 - np.arange(50)))
+    np.testing.assert_array_equal(points, expected)
@@ -0,0 +1,142 @@
+"""
+@file test_trajectory.py
+@brief Tests de l'enregistrement des trajectoires et de la reprise sur point de contrôle.
+
+@author Pierre JAUFFRES
+@date 2025-02-22
+"""
+
+import os
+
+import numpy as np
+import pytest
+
+from barnes_hut import BarnesHutSolver
+from integrators import BlockTimestep, Leapfrog
+from nbody import TIME_STEP, NBodySystem, random_scenario, reference_scenario, reference_state
+from trajectory import Trajectory, TrajectoryWriter, load_checkpoint, resume, run, save_checkpoint
+
+
+def test_writer_keeps_one_record_per_interval(tmp_path):
+    path = str(tmp_path / "traj")
+    system = reference_scenario()
+    with TrajectoryWriter(path, system.names, interval=3 * TIME_STEP, chunk_size=2) as writer:
+        run(system, 10, writer=writer)
+    trajectory = Trajectory(path)
+    np.testing.assert_allclose(trajectory.times, np.array([0, 3, 6, 9]) * TIME_STEP)
+    reference = reference_scenario()
+    reference.run(9)
+    np.testing.assert_array_equal(trajectory.positions("Terre", t0=9 * TIME_STEP)[0],
+                                  reference.positions[reference.index("Terre")])
+    assert trajectory.positions(["Soleil", "Lune"]).shape == (4, 2, 2)
+
+
+def test_file_is_readable_before_close(tmp_path):
+    path = str(tmp_path / "traj")
+    system = reference_scenario()
+    writer = TrajectoryWriter(path, system.names, chunk_size=4)
+    for _ in range(10):
+        writer.record(system)
+        system.step()
+    # Deux lots complets écrits, deux enregistrements encore en mémoire
+    assert len(Trajectory(path)) == 8
+    writer.close()
+    assert len(Trajectory(path)) == 10
+
+
+def test_reopen_truncates_and_appends(tmp_path):
+    path = str(tmp_path / "traj")
+    system = reference_scenario()
+    expected = []
+    with TrajectoryWriter(path, system.names, interval=TIME_STEP) as writer:
+        for _ in range(10):
+            writer.record(system)
+            expected.append(system.positions.copy())
+            system.step()
+
+    # Reprise après le 6e enregistrement : les 4 suivants sont effacés puis réécrits
+    with TrajectoryWriter(path, system.names, interval=TIME_STEP, records=6) as writer:
+        assert writer.records == 6
+        assert writer.next_time == 6 * TIME_STEP
+        assert not writer.write(5.5 * TIME_STEP, system.positions, system.velocities)
+        replay = reference_scenario()
+        replay.run(6)
+        for _ in range(6):
+            writer.record(replay)
+            replay.step()
+
+    trajectory = Trajectory(path)
+    assert len(trajectory) == 12
+    np.testing.assert_allclose(trajectory.times, np.arange(12) * TIME_STEP)
+    np.testing.assert_array_equal(trajectory.positions()[:10], np.array(expected))
+
+
+def test_resume_is_bit_identical(tmp_path):
+    uninterrupted = reference_scenario(integrator=Leapfrog())
+    run(uninterrupted, 40)
+
+    trajectory = str(tmp_path / "traj")
+    checkpoint = str(tmp_path / "etat.npz")
+    system = reference_scenario(integrator=Leapfrog())
+    writer = TrajectoryWriter(trajectory, system.names, chunk_size=8)
+    run(system, 20, writer=writer, checkpoint=checkpoint, checkpoint_every=10)
+    for _ in range(12):  # Pas faits après le dernier point de contrôle, dont un lot écrit sur disque
+        system.step()
+        writer.record(system)
+    writer._file.close()  # Arrêt brutal : le lot en mémoire est perdu
+
+    system, writer = resume(checkpoint, trajectory)
+    assert system.time == 20 * TIME_STEP
+    assert writer.records == 21
+    with writer:
+        run(system, 20, writer=writer)
+    np.testing.assert_array_equal(system.positions, uninterrupted.positions)
+    np.testing.assert_array_equal(system.velocities, uninterrupted.velocities)
+    np.testing.assert_allclose(Trajectory(trajectory).times, np.arange(41) * TIME_STEP)
+
+
+def test_checkpoint_restores_solver_and_integrator(tmp_path):
+    path = str(tmp_path / "etat.npz")
+    system = reference_scenario(solver=BarnesHutSolver(theta=0.3), integrator=BlockTimestep(eta=0.1))
+    system.step()
+    save_checkpoint(path, system, records=7)
+    restored, records = load_checkpoint(path)
+    assert records == 7
+    assert isinstance(restored.solver, BarnesHutSolver) and restored.solver.theta == 0.3
+    assert isinstance(restored.integrator, BlockTimestep) and restored.integrator.eta == 0.1
+    for _ in range(3):
+        system.step()
+        restored.step()
+    np.testing.assert_array_equal(restored.positions, system.positions)
+
+
+def test_checkpoint_loads_into_a_system_state(tmp_path):
+    path = str(tmp_path / "etat.npz")
+    state = reference_state()
+    system = NBodySystem.from_state(state, softening=1e5)
+    system.run(10)
+    save_checkpoint(path, system)
+    system.run(5)
+
+    fresh = reference_state()
+    restored, _ = load_checkpoint(path, state=fresh)
+    assert np.shares_memory(restored.positions, fresh.position)
+    assert restored.softening == 1e5
+    restored.run(5)
+    np.testing.assert_array_equal(fresh.position, state.position)
+    np.testing.assert_array_equal(fresh.velocity, state.velocity)
+
+
+def test_checkpoint_rejects_a_state_with_other_bodies(tmp_path):
+    path = str(tmp_path / "etat.npz")
+    save_checkpoint(path, random_scenario(7))
+    with pytest.raises(ValueError):
+        load_checkpoint(path, state=reference_state())
+
+
+def test_checkpoint_excludes_solver_work_buffers(tmp_path):
+    path = str(tmp_path / "etat.npz")
+    system = random_scenario(1000)
+    system.step()  # DirectSolver alloue ses tampons (N, N)
+    save_checkpoint(path, system)
+    assert os.path.getsize(path) < 200 * 1024